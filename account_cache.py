@@ -0,0 +1,138 @@
+"""Read-through cache for DynamoDB account items.
+
+aws.DynamoDBManager keeps the Users and Portfolios items it reads here for
+ACCOUNT_CACHE_TTL seconds, keyed by username, and invalidates them on every
+write it makes. Trades in dynamo_trading start from the cached state when
+there is one. Their conditional writes check the cached balance and
+portfolio version, so a stale entry makes the write fail instead of
+corrupting the account; the trade then re-reads and the entry is replaced.
+
+MemoryCache is per process. RedisCache (ACCOUNT_CACHE_URL=redis://...,
+needs the redis package) shares entries between gunicorn workers, so a
+trade in one worker is seen by the next page view in another.
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import redis
+except ImportError:  # optional; only needed for ACCOUNT_CACHE_URL=redis://...
+    redis = None
+
+
+def user_key(username):
+    return f'user:{username}'
+
+
+def portfolio_key(username):
+    return f'portfolio:{username}'
+
+
+class MemoryCache:
+    """Process-local LRU of JSON-like values with a TTL per entry"""
+
+    def __init__(self, ttl=5.0, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._writes = 0  # bumped by every delete(); see mark()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+    def get(self, key):
+        """Cached value or None; values are shared, callers must not mutate them"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self._stats['hits'] += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self._stats['misses'] += 1
+            return None
+
+    def get_many(self, keys):
+        """{key: value} for the keys that are cached"""
+        found = {}
+        for key in keys:
+            value = self.get(key)
+            if value is not None:
+                found[key] = value
+        return found
+
+    def mark(self):
+        """Token for set(since=...): taken before a read, it keeps the read's
+        result out of the cache if a write invalidated anything meanwhile"""
+        with self._lock:
+            return self._writes
+
+    def set(self, key, value, since=None):
+        with self._lock:
+            if since is not None and since != self._writes:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, *keys):
+        with self._lock:
+            self._writes += 1
+            for key in keys:
+                self._entries.pop(key, None)
+            self._stats['invalidations'] += len(keys)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, entries=len(self._entries))
+
+
+class RedisCache:
+    """Entries in Redis, shared by every worker; values are stored as JSON"""
+
+    def __init__(self, client, ttl=5.0, prefix='stocktrading:'):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+        self._stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+    def get(self, key):
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys):
+        keys = list(keys)
+        values = self.client.mget([self.prefix + key for key in keys]) if keys else []
+        found = {key: json.loads(value) for key, value in zip(keys, values) if value is not None}
+        self._stats['hits'] += len(found)
+        self._stats['misses'] += len(keys) - len(found)
+        return found
+
+    def mark(self):
+        return None  # no cross-process write tracking; the TTL bounds a racing stale read
+
+    def set(self, key, value, since=None):
+        self.client.set(self.prefix + key, json.dumps(value), px=max(1, int(self.ttl * 1000)))
+
+    def delete(self, *keys):
+        if keys:
+            self.client.delete(*(self.prefix + key for key in keys))
+            self._stats['invalidations'] += len(keys)
+
+    def stats(self):
+        return dict(self._stats)
+
+
+def open_cache(url, ttl, max_entries=10000):
+    """Cache named by ACCOUNT_CACHE_URL ('memory' or redis://...), or None when ttl is 0"""
+    if ttl <= 0:
+        return None
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        if redis is None:
+            raise RuntimeError('ACCOUNT_CACHE_URL points at Redis but the redis package is not installed')
+        return RedisCache(redis.Redis.from_url(url), ttl=ttl)
+    if url == 'memory':
+        return MemoryCache(ttl=ttl, max_entries=max_entries)
+    raise ValueError(f"Unknown account cache: {url}")
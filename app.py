@@ -1,35 +1,124 @@
-from flask import Flask, render_template, request, redirect, url_for, session, jsonify, flash
+from flask import Flask, Response, render_template, request, redirect, url_for, session, jsonify, flash
 from datetime import datetime
+import csv
+import io
+import itertools
 import json
+import math
 import os
+import time
 from functools import wraps
-import boto3
-import uuid
+from storage import GroupCommitter, open_store, new_user_record
+from trading import BatchError, TradeError, execute_batch, execute_buy, execute_sell
+from orders import OrderDesk
+from auth import DEFAULT_SCHEME, HasherBusy, LoginLimiter, PasswordHasher
+from sessions import ServerSessionInterface, SessionManager, open_session_store
+from valuation import ValuationEngine
+from holdings_matrix import NUMPY_AVAILABLE, HoldingsMatrix
+from prices import PRICE_ENGINE_AVAILABLE, PriceEngine, static_snapshot
+from history import TIMEFRAMES, HistoryStore, bar_labels
+from streaming import HubFull, QuoteHub
+from quote_cache import QuoteCache
+from search import SymbolIndex
+from notifications import CallbackPublisher, NotificationDispatcher, SNSPublisher, StubPublisher
+from aws_clients import get_client
+from money import dollars, format_cents, micros_to_cents, to_cents
+import dynamo_trading
 
 app = Flask(__name__)
 # Load secret from environment for production safety
 app.secret_key = os.environ.get('FLASK_SECRET_KEY', 'your-secret-key-change-this-in-production')
 
+# Sessions are kept server-side (see sessions.py); the cookie holds only an id.
+# SESSION_STORE: 'sqlite' (SESSION_DB_FILE, shared by this node's workers),
+# 'memory' (one process) or a redis:// URL (shared by every node)
+SESSION_STORE = os.environ.get('SESSION_STORE', 'sqlite')
+SESSION_DB_FILE = os.environ.get('SESSION_DB_FILE', 'sessions.db')
+SESSION_TTL_SECONDS = float(os.environ.get('SESSION_TTL_SECONDS', '86400'))  # since last use
+SESSION_CACHE_SECONDS = float(os.environ.get('SESSION_CACHE_SECONDS', '5'))  # revocations reach other workers within this
+session_manager = SessionManager(open_session_store(SESSION_STORE, SESSION_DB_FILE),
+                                 ttl=SESSION_TTL_SECONDS, cache_seconds=SESSION_CACHE_SECONDS)
+app.session_interface = ServerSessionInterface(session_manager)
+
 # Toggle using DynamoDB for persistence
 USE_DYNAMODB = os.environ.get('USE_DYNAMODB', 'false').lower() == 'true'
 
-# Import AWS manager if DynamoDB mode enabled (aws_manager created in aws.py)
-try:
-    from aws import aws_manager
-except Exception:
-    aws_manager = None
-
-# AWS SNS Configuration (optional - set up only if you have AWS credentials)
-try:
-    sns_client = boto3.client('sns', region_name='us-east-1')
-    SNS_TOPIC_ARN = 'arn:aws:sns:us-east-1:YOUR_ACCOUNT_ID:stock-trading-notifications'
-    SNS_ENABLED = False  # Set to True when configured
-except:
-    SNS_ENABLED = False
-    sns_client = None
-
-# Data storage (in production, use a database)
-DATA_FILE = 'trading_data.json'
+# Import AWS manager only if DynamoDB mode enabled (aws_manager created in aws.py);
+# local mode never imports boto3
+aws_manager = None
+if USE_DYNAMODB:
+    try:
+        from aws import aws_manager
+    except Exception as e:
+        print(f"AWS manager unavailable, using local storage: {e}")
+
+# AWS SNS Configuration (optional - set up only if you have AWS credentials).
+# The client is created on the first notification, not at import.
+SNS_ENABLED = os.environ.get('SNS_ENABLED', 'false').lower() == 'true'
+SNS_TOPIC_ARN = os.environ.get('SNS_TOPIC_ARN', 'arn:aws:sns:us-east-1:YOUR_ACCOUNT_ID:stock-trading-notifications')
+
+# Notifications are queued and published by background threads, so a slow SNS
+# never delays a trade. Without SNS, a stub publisher keeps them in memory.
+NOTIFY_QUEUE_SIZE = int(os.environ.get('NOTIFY_QUEUE_SIZE', '10000'))
+NOTIFY_WORKERS = int(os.environ.get('NOTIFY_WORKERS', '2'))
+NOTIFY_SPOOL_FILE = os.environ.get('NOTIFY_SPOOL_FILE') or None  # overflow file (NDJSON)
+
+if USE_DYNAMODB and aws_manager:
+    notification_publisher = CallbackPublisher(
+        lambda m: aws_manager.sns.send_trade_notification(m['username'], *m['trade']) if 'trade' in m
+        else aws_manager.sns.send_notification(m['username'], m['subject'], m['message']))
+elif SNS_ENABLED:
+    notification_publisher = SNSPublisher(lambda: get_client('sns'), SNS_TOPIC_ARN)
+else:
+    notification_publisher = StubPublisher()
+notifier = NotificationDispatcher(notification_publisher, max_queue=NOTIFY_QUEUE_SIZE,
+                                  workers=NOTIFY_WORKERS, spool_path=NOTIFY_SPOOL_FILE)
+
+# Data storage: 'sqlite' keeps one row per user in SQLITE_FILE; 'json' (the
+# default, kept for existing installs) is the legacy small-scale store that
+# rewrites all of DATA_FILE's accounts on every trade
+# (migrate with: python storage.py migrate trading_data.json trading_data.db)
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'json').lower()
+DATA_FILE = os.environ.get('DATA_FILE', 'trading_data.json')
+SQLITE_FILE = os.environ.get('SQLITE_FILE', 'trading_data.db')
+USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', '1024'))  # JSON backend only
+
+# Group commit: trades arriving within this window share one durable write (0 disables)
+GROUP_COMMIT_WINDOW_MS = float(os.environ.get('GROUP_COMMIT_WINDOW_MS', '0'))
+
+store = open_store(STORAGE_BACKEND, SQLITE_FILE if STORAGE_BACKEND == 'sqlite' else DATA_FILE,
+                   cache_size=USER_CACHE_SIZE)
+if GROUP_COMMIT_WINDOW_MS > 0:
+    store = GroupCommitter(store, window=GROUP_COMMIT_WINDOW_MS / 1000)
+
+# Passwords are hashed with PASSWORD_HASH (argon2 if installed, else scrypt;
+# or pbkdf2) in HASH_WORKERS processes (0 hashes in the request thread); old
+# plaintext or weaker hashes are replaced on the next login (see auth.py)
+PASSWORD_HASH = os.environ.get('PASSWORD_HASH', DEFAULT_SCHEME)
+HASH_WORKERS = int(os.environ.get('HASH_WORKERS', '2'))
+HASH_MAX_PENDING = int(os.environ.get('HASH_MAX_PENDING', '0')) or None  # default 4 per worker
+password_hasher = PasswordHasher(PASSWORD_HASH, workers=HASH_WORKERS, max_pending=HASH_MAX_PENDING)
+
+# Login attempts allowed per minute (and in a burst) per username and per client IP
+login_limiter = LoginLimiter(
+    user_per_minute=float(os.environ.get('LOGIN_USER_PER_MINUTE', '5')),
+    user_burst=int(os.environ.get('LOGIN_USER_BURST', '5')),
+    ip_per_minute=float(os.environ.get('LOGIN_IP_PER_MINUTE', '60')),
+    ip_burst=int(os.environ.get('LOGIN_IP_BURST', '20')))
+
+# Comma-separated usernames allowed to call /api/admin/* endpoints
+ADMIN_USERS = {name.strip() for name in os.environ.get('ADMIN_USERS', '').split(',') if name.strip()}
+
+# Holdings are reloaded into the revaluation matrix at most this often (seconds)
+HOLDINGS_MATRIX_MAX_AGE = float(os.environ.get('HOLDINGS_MATRIX_MAX_AGE', '30'))
+
+# Transaction history pagination
+TRANSACTIONS_PAGE_SIZE = 50
+MAX_TRANSACTIONS_PAGE_SIZE = 500
+
+# Transaction exports are streamed; rows are sent in chunks of this many
+EXPORT_FORMATS = ('csv', 'ndjson')
+EXPORT_CHUNK_ROWS = 500
 
 
 # Simulated stock data
@@ -44,29 +133,97 @@ STOCK_DATABASE = {
     'NVIDIA': {'name': 'NVIDIA Corp.', 'price': 875.29, 'change': 12.45},
 }
 
+# More instruments: a JSON file in the same format, {"SYMBOL": {"name", "price", "change"}}
+INSTRUMENTS_FILE = os.environ.get('INSTRUMENTS_FILE')
+if INSTRUMENTS_FILE:
+    with open(INSTRUMENTS_FILE) as f:
+        STOCK_DATABASE.update((symbol.upper(), data) for symbol, data in json.load(f).items())
+
+# Type-ahead search over symbols and company names (see search.py)
+symbol_index = SymbolIndex(STOCK_DATABASE)
+SEARCH_LIMIT = 10
+MAX_SEARCH_LIMIT = 50
+
+# Live prices: every symbol follows a random walk from its STOCK_DATABASE price,
+# advanced every PRICE_TICK_SECONDS (0 keeps the reference prices static)
+PRICE_TICK_SECONDS = float(os.environ.get('PRICE_TICK_SECONDS', '1'))
+PRICE_SEED = int(os.environ.get('PRICE_SEED', '0'))
+
+if PRICE_ENGINE_AVAILABLE and PRICE_TICK_SECONDS > 0:
+    price_engine = PriceEngine(STOCK_DATABASE, tick_seconds=PRICE_TICK_SECONDS, seed=PRICE_SEED)
+else:
+    price_engine = None
+_static_prices = static_snapshot(STOCK_DATABASE)
+
+def current_prices():
+    """Latest price snapshot; read it once per request for consistent prices"""
+    return price_engine.current() if price_engine else _static_prices
+
+# Per-user portfolio aggregates, updated on trades and price changes
+valuation = ValuationEngine(current_prices().quotes())
+# Precomputed OHLC bars for the history charts (backfilled on the first tick;
+# until then a chart gets the bar in progress only)
+history_store = HistoryStore(price_engine) if price_engine else None
+if price_engine:
+    price_engine.subscribe(lambda snapshot: valuation.update_prices(snapshot.prices()))
+    price_engine.subscribe(history_store.on_tick)
+
+# Streaming quotes: each open stream holds a worker thread, so cap them per
+# worker (run gunicorn with --worker-class gthread --threads N)
+STREAM_MAX_SUBSCRIBERS = int(os.environ.get('STREAM_MAX_SUBSCRIBERS', '500'))
+quote_hub = QuoteHub(current_prices(), max_subscribers=STREAM_MAX_SUBSCRIBERS)
+if price_engine:
+    price_engine.subscribe(quote_hub.publish)
+# /api/stocks and /api/stock/<symbol> bodies, encoded (and compressed) once per tick
+quote_cache = QuoteCache()
+
+# Order books: limit and market orders matched between users and settled into
+# the local store (see orders.py). Books live in this process, so serve the
+# /api/orders endpoints from one worker.
+order_desk = OrderDesk(store, on_fill=valuation.apply_fill)
+ORDER_BOOK_DEPTH = 10
+MAX_ORDER_BOOK_DEPTH = 100
+
+# Most orders accepted by one /api/orders/batch call
+MAX_BATCH_ORDERS = int(os.environ.get('MAX_BATCH_ORDERS', '50'))
+
+# Money is kept in int cents (avg prices in micro-dollars); these format it for display
+@app.template_filter('cents')
+def cents_filter(cents):
+    return format_cents(cents)
+
+@app.template_filter('micros')
+def micros_filter(micros):
+    return format_cents(micros_to_cents(micros))
+
+def transaction_json(transaction):
+    """A stored transaction with its amounts in dollars, as the JSON API returns it"""
+    result = {k: v for k, v in transaction.items() if k not in ('price_cents', 'total_cents')}
+    result['price'] = dollars(transaction['price_cents'])
+    result['total'] = dollars(transaction['total_cents'])
+    return result
+
+@app.before_request
+def ensure_price_ticker():
+    """Start this worker's price ticker (threads do not survive a gunicorn fork)"""
+    if price_engine:
+        price_engine.current()
+
 def load_data():
-    """Load user data from JSON file"""
-    if os.path.exists(DATA_FILE):
-        with open(DATA_FILE, 'r') as f:
-            return json.load(f)
-    return {}
+    """Load all user data from the configured store"""
+    return store.load_all()
 
 def save_data(data):
-    """Save user data to JSON file"""
-    with open(DATA_FILE, 'w') as f:
-        json.dump(data, f, indent=2)
+    """Replace all user data in the configured store"""
+    store.save_all(data)
 
-def send_notification(username, subject, message):
-    """Send SNS notification"""
-    if SNS_ENABLED and sns_client:
-        try:
-            sns_client.publish(
-                TopicArn=SNS_TOPIC_ARN,
-                Subject=subject,
-                Message=f"User: {username}\n\n{message}"
-            )
-        except Exception as e:
-            print(f"Error sending SNS notification: {e}")
+def send_notification(username, subject, message, trade=None):
+    """Queue a notification; trade is (type, symbol, quantity, price_cents) for aws_manager.sns"""
+    message = {'username': username, 'subject': subject, 'message': message}
+    if trade is not None:
+        message['trade'] = list(trade)
+    if not notifier.submit(message):
+        print(f"Notification queue full, dropped notification for {username}")
 
 def login_required(f):
     """Decorator for routes that require authentication"""
@@ -77,6 +234,17 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def admin_required(f):
+    """Decorator for API routes restricted to ADMIN_USERS"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if 'username' not in session:
+            return redirect(url_for('login'))
+        if session['username'] not in ADMIN_USERS:
+            return jsonify({'error': 'Admin access required'}), 403
+        return f(*args, **kwargs)
+    return decorated_function
+
 def init_user(username):
     """Initialize a new user with default portfolio"""
     if USE_DYNAMODB and aws_manager:
@@ -88,17 +256,33 @@ def init_user(username):
             user = aws_manager.dynamodb.get_user(username)
         return user
 
-    data = load_data()
-    if username not in data:
-        data[username] = {
-            'password': '',
-            'balance': 10000.00,  # Virtual currency allocation
-            'portfolio': {},  # {symbol: {'shares': int, 'avg_price': float}}
-            'transactions': [],  # Transaction history
-            'created_at': datetime.now().isoformat()
-        }
-        save_data(data)
-    return data[username]
+    user = store.get_user(username)
+    if user is None:
+        store.create_user(username, new_user_record())
+        user = store.get_user(username)
+    return user
+
+def account_store():
+    """DynamoDB when enabled, else the local store; both serve get_transactions_page()"""
+    return aws_manager.dynamodb if USE_DYNAMODB and aws_manager else store
+
+def load_account(username):
+    """Balance and portfolio of a user ({} if unknown); one BatchGetItem in DynamoDB mode"""
+    if USE_DYNAMODB and aws_manager:
+        return aws_manager.dynamodb.get_account(username) or {}
+    return store.get_user(username) or {}
+
+def save_password_hash(username, expected, password_hash):
+    """Store an upgraded password hash, unless the password changed since it was read"""
+    if USE_DYNAMODB and aws_manager:
+        aws_manager.dynamodb.update_password(username, password_hash, expected)
+        return
+
+    def upgrade(record):
+        if record['password'] == expected:
+            record['password'] = password_hash
+        return None, []
+    store.mutate_user(username, upgrade)
 
 @app.route('/')
 def index():
@@ -120,33 +304,30 @@ def signup():
         if password != confirm_password:
             flash('Passwords do not match!', 'error')
             return redirect(url_for('signup'))
-        
+
+        # Signups hash a password too, so they draw on the client's login budget
+        wait = login_limiter.ips.take(request.remote_addr or '')
+        if wait:
+            flash(f'Too many attempts. Try again in {math.ceil(wait)} seconds.', 'error')
+            return render_template('signup.html'), 429, {'Retry-After': str(math.ceil(wait))}
+        try:
+            password = password_hasher.hash(password)
+        except HasherBusy:
+            flash('The server is busy, please try again.', 'error')
+            return render_template('signup.html'), 503, {'Retry-After': '1'}
+
         if USE_DYNAMODB and aws_manager:
-            # Check in DynamoDB
-            existing = aws_manager.dynamodb.get_user(username)
-            if existing:
+            if not aws_manager.dynamodb.create_user(username, password):
                 flash('Username already exists!', 'error')
                 return redirect(url_for('signup'))
-            # Note: password should be hashed in production
-            aws_manager.dynamodb.create_user(username, password)
             flash('Account created successfully! Please log in.', 'success')
             return redirect(url_for('login'))
 
-        data = load_data()
-        if username in data:
+        # Create new user
+        if not store.create_user(username, new_user_record(password)):
             flash('Username already exists!', 'error')
             return redirect(url_for('signup'))
         
-        # Create new user
-        data[username] = {
-            'password': password,  # In production, hash this!
-            'balance': 10000.00,
-            'portfolio': {},
-            'transactions': [],
-            'created_at': datetime.now().isoformat()
-        }
-        save_data(data)
-        
         flash('Account created successfully! Please log in.', 'success')
         return redirect(url_for('login'))
     
@@ -157,21 +338,32 @@ def login():
     if request.method == 'POST':
         username = request.form.get('username', '').strip()
         password = request.form.get('password', '')
+
+        # Throttle before hashing, so a flood of guesses costs no CPU
+        wait = login_limiter.check(username, request.remote_addr or '')
+        if wait:
+            flash(f'Too many login attempts. Try again in {math.ceil(wait)} seconds.', 'error')
+            return render_template('login.html'), 429, {'Retry-After': str(math.ceil(wait))}
+
         if USE_DYNAMODB and aws_manager:
-            user = aws_manager.dynamodb.get_user(username)
-            if user and user.get('password') == password:
-                session['username'] = username
-                flash('Login successful!', 'success')
-                return redirect(url_for('dashboard'))
-            flash('Invalid username or password!', 'error')
-            return render_template('login.html')
-
-        data = load_data()
-        if username in data and data[username]['password'] == password:
+            user = aws_manager.dynamodb.get_user(username, ['password'])
+        else:
+            user = store.get_user(username)
+        stored = user.get('password') if user else None
+        try:
+            ok, upgraded = password_hasher.verify(stored, password)
+        except HasherBusy:
+            flash('The server is busy, please try again.', 'error')
+            return render_template('login.html'), 503, {'Retry-After': '1'}
+
+        if ok:
+            if upgraded:
+                save_password_hash(username, stored, upgraded)
             session['username'] = username
+            session.regenerate()
             flash('Login successful!', 'success')
             return redirect(url_for('dashboard'))
-        
+
         flash('Invalid username or password!', 'error')
     
     return render_template('login.html')
@@ -179,6 +371,7 @@ def login():
 @app.route('/logout')
 def logout():
     session.pop('username', None)
+    session.regenerate()
     flash('You have been logged out.', 'info')
     return redirect(url_for('login'))
 
@@ -186,143 +379,144 @@ def logout():
 @login_required
 def dashboard():
     username = session['username']
-    data = load_data()
-    user_data = data.get(username, {})
-    
-    # Calculate portfolio value
-    portfolio_value = 0
-    portfolio_details = []
+    user_data = load_account(username)
     
-    for symbol, holdings in user_data.get('portfolio', {}).items():
-        if symbol in STOCK_DATABASE:
-            current_price = STOCK_DATABASE[symbol]['price']
-            shares = holdings['shares']
-            position_value = current_price * shares
-            portfolio_value += position_value
-            
-            portfolio_details.append({
-                'symbol': symbol,
-                'name': STOCK_DATABASE[symbol]['name'],
-                'shares': shares,
-                'avg_price': holdings['avg_price'],
-                'current_price': current_price,
-                'position_value': position_value,
-                'gain_loss': position_value - (holdings['avg_price'] * shares)
-            })
+    # Precomputed portfolio value
+    portfolio_details, portfolio_value, _ = valuation.summary(username, user_data.get('portfolio', {}))
     
-    total_value = user_data.get('balance', 0) + portfolio_value
+    total_value = user_data.get('balance_cents', 0) + portfolio_value
+    recent_transactions, _ = account_store().get_transactions_page(username, limit=10)
     
     return render_template('dashboard.html', 
                          username=username,
-                         balance=user_data.get('balance', 0),
+                         balance=user_data.get('balance_cents', 0),
                          portfolio=portfolio_details,
                          portfolio_value=portfolio_value,
                          total_value=total_value,
-                         transactions=user_data.get('transactions', [])[-10:])  # Last 10 transactions
+                         transactions=recent_transactions[::-1])  # Last 10, oldest first
+
+def quote_max_age(snapshot):
+    """Seconds until the next price tick, for Cache-Control"""
+    return int(max(0, snapshot.timestamp + PRICE_TICK_SECONDS - time.time())) if price_engine else 60
+
+def cached_json(cached, max_age):
+    """Response for a quote_cache body: 304 on a matching ETag, else gzip/brotli if the client accepts it"""
+    body, etag, coding = cached.body, cached.etag, None
+    for candidate in ('br', 'gzip'):
+        if request.accept_encodings[candidate]:
+            variant = cached.encoded(candidate)
+            if variant:
+                (body, etag), coding = variant, candidate
+                break
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    else:
+        response = app.response_class(body, mimetype='application/json')
+        if coding:
+            response.content_encoding = coding
+    response.set_etag(etag)
+    response.vary.add('Accept-Encoding')
+    response.cache_control.private = True
+    response.cache_control.max_age = max_age
+    return response
 
 @app.route('/api/stocks')
 @login_required
 def get_stocks():
-    """API endpoint to get available stocks"""
-    stocks = []
-    for symbol, data in STOCK_DATABASE.items():
-        stocks.append({
-            'symbol': symbol,
-            'name': data['name'],
-            'price': data['price'],
-            'change': data['change']
-        })
-    return jsonify(stocks)
+    """API endpoint to get available stocks (?symbols=AAPL,MSFT for some of them)"""
+    snapshot = current_prices()
+    symbols = list(dict.fromkeys(s for s in request.args.get('symbols', '').upper().split(',') if s))
+    unknown = [s for s in symbols if s not in snapshot]
+    if unknown:
+        return jsonify({'error': f"Unknown symbols: {', '.join(unknown)}"}), 400
+    return cached_json(quote_cache.stocks(snapshot, symbols), quote_max_age(snapshot))
+
+@app.route('/api/search')
+@login_required
+def search_stocks():
+    """Type-ahead: stocks whose symbol or company name starts with ?q=, best match first"""
+    query = request.args.get('q', '')[:64]
+    limit = max(1, min(request.args.get('limit', SEARCH_LIMIT, type=int), MAX_SEARCH_LIMIT))
+    snapshot = current_prices()
+    results = []
+    for symbol in symbol_index.search(query, limit):
+        quote = snapshot.quote(symbol)
+        results.append({'symbol': symbol, 'name': quote['name'], 'price': quote['price'], 'change': quote['change']})
+    return jsonify({'query': query, 'results': results})
 
 @app.route('/trade')
 @login_required
 def trade():
     """Stock trading interface"""
-    return render_template('trade.html', stocks=STOCK_DATABASE)
+    return render_template('trade.html')
 
 @app.route('/api/stock/<symbol>')
 @login_required
 def get_stock_details(symbol):
     """Get details for a specific stock"""
     symbol = symbol.upper()
-    if symbol in STOCK_DATABASE:
-        stock = STOCK_DATABASE[symbol]
-        return jsonify({
-            'symbol': symbol,
-            'name': stock['name'],
-            'price': stock['price'],
-            'change': stock['change'],
-            'found': True
-        })
+    snapshot = current_prices()
+    if symbol in snapshot:
+        return cached_json(quote_cache.stock(snapshot, symbol), quote_max_age(snapshot))
     return jsonify({'found': False, 'error': 'Stock not found'}), 404
 
 @app.route('/api/stock/<symbol>/history')
 @login_required
 def get_stock_history(symbol):
-    """Get historical price data for a stock with different timeframes"""
-    import random
-    from datetime import timedelta
-    
+    """Get OHLC price history for a stock (timeframe: 5m, 1d, 1w, 1m, 1y or 5y)"""
     symbol = symbol.upper()
-    if symbol not in STOCK_DATABASE:
+    snapshot = current_prices()
+    if symbol not in snapshot:
         return jsonify({'error': 'Stock not found'}), 404
-    
-    # Get timeframe from query parameter (default: 1m for 1 month)
+
     timeframe = request.args.get('timeframe', '1m')
-    
-    # Validate timeframe
-    if timeframe not in ['5m', '1w', '1m']:
+    if timeframe not in TIMEFRAMES:
         timeframe = '1m'
-    
-    current_price = STOCK_DATABASE[symbol]['price']
-    base_price = current_price
-    labels = []
-    prices = []
-    
-    if timeframe == '5m':
-        # 5 minutes: 12 data points (1 hour)
-        num_points = 12
-        for i in range(num_points, 0, -1):
-            minutes = i * 5
-            time_str = f"{minutes//60:02d}:{minutes%60:02d}"
-            # Very small volatility for intraday (±0.5%)
-            price_change = random.uniform(-0.5, 0.5)
-            current_price = current_price * (1 + price_change / 100)
-            current_price = max(base_price * 0.995, min(current_price, base_price * 1.005))
-            prices.append(round(current_price, 2))
-            labels.append(time_str)
-    
-    elif timeframe == '1w':
-        # 1 week: 7 daily data points
-        num_points = 7
-        for i in range(num_points, 0, -1):
-            date = (datetime.now() - timedelta(days=i)).strftime('%a %m/%d')
-            # Moderate volatility (±1%)
-            daily_change = random.uniform(-1.0, 1.0)
-            current_price = current_price * (1 + daily_change / 100)
-            current_price = max(base_price * 0.93, min(current_price, base_price * 1.07))
-            prices.append(round(current_price, 2))
-            labels.append(date)
-    
-    else:  # 1m (1 month)
-        # 1 month: 30 daily data points
-        num_points = 30
-        for i in range(num_points, 0, -1):
-            date = (datetime.now() - timedelta(days=i)).strftime('%m/%d')
-            # Standard volatility (±1.5%)
-            daily_change = random.uniform(-1.5, 1.5)
-            current_price = current_price * (1 + daily_change / 100)
-            current_price = max(base_price * 0.85, min(current_price, base_price * 1.15))
-            prices.append(round(current_price, 2))
-            labels.append(date)
-    
-    return jsonify({
-        'symbol': symbol,
-        'labels': labels,
-        'prices': prices,
-        'current_price': STOCK_DATABASE[symbol]['price'],
-        'change': STOCK_DATABASE[symbol]['change']
-    })
+
+    # Every worker derives the same bars from the same tick, so the tick
+    # version identifies the response; it changes when the live bar moves
+    complete = history_store.ready(snapshot) if history_store else True
+    etag = f'{symbol}-{timeframe}-{snapshot.version}' + ('' if complete else '-partial')
+    max_age = quote_max_age(snapshot)
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    else:
+        if history_store:
+            times, bars = history_store.series(symbol, timeframe, snapshot)
+        else:
+            times, bars = [int(time.time())], [[snapshot.price(symbol)] * 4]  # static prices: one point
+        response = jsonify({
+            'symbol': symbol,
+            'timeframe': timeframe,
+            'labels': bar_labels(times, timeframe),
+            'timestamps': times,
+            'ohlc': bars,
+            'prices': [bar[3] for bar in bars],
+            'complete': complete,  # False while the history is still being backfilled
+            'current_price': snapshot.price(symbol),
+            'change': snapshot.quote(symbol)['change']
+        })
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.max_age = max_age
+    return response
+
+@app.route('/api/stream/quotes')
+@login_required
+def stream_quotes():
+    """Server-Sent Events stream of live quotes (?symbols=AAPL,MSFT; default all)"""
+    snapshot = current_prices()
+    symbols = [s for s in request.args.get('symbols', '').upper().split(',') if s]
+    unknown = [s for s in symbols if s not in snapshot]
+    if unknown:
+        return jsonify({'error': f"Unknown symbols: {', '.join(unknown)}"}), 400
+
+    try:
+        stream = quote_hub.subscribe(symbols or None)
+    except HubFull:
+        return jsonify({'error': 'Too many open streams, try again later'}), 503, {'Retry-After': '5'}
+    return Response(stream, mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 @app.route('/api/buy', methods=['POST'])
 @login_required
@@ -332,110 +526,42 @@ def buy_stock():
     symbol = request.json.get('symbol', '').upper()
     quantity = int(request.json.get('quantity', 0))
 
-    if symbol not in STOCK_DATABASE:
+    snapshot = current_prices()
+    if symbol not in snapshot:
         return jsonify({'success': False, 'error': 'Stock not found'}), 400
 
     if quantity <= 0:
         return jsonify({'success': False, 'error': 'Quantity must be positive'}), 400
 
-    stock_price = STOCK_DATABASE[symbol]['price']
-    total_cost = stock_price * quantity
+    price_cents = to_cents(snapshot.price(symbol))
+    total_cost = price_cents * quantity
 
-    # DynamoDB-backed flow
+    # DynamoDB-backed flow: one transactional write (see dynamo_trading.py)
     if USE_DYNAMODB and aws_manager:
-        # Get user and balance
-        user = aws_manager.dynamodb.get_user(username) or {}
-        balance = float(user.get('balance', 0))
-
-        if total_cost > balance:
-            return jsonify({'success': False, 'error': 'Insufficient balance'}), 400
-
-        new_balance = balance - total_cost
-        # Update balance in DynamoDB
-        aws_manager.dynamodb.update_user_balance(username, new_balance)
-
-        # Update portfolio
-        portfolio_item = aws_manager.dynamodb.get_portfolio(username) or {}
-        holdings = portfolio_item.get('holdings', {})
-
-        # Normalize holdings (may contain Decimal)
-        normalized = {}
-        for sym, val in holdings.items():
-            normalized[sym] = {
-                'shares': int(val.get('shares', 0)),
-                'avg_price': float(val.get('avg_price', 0)),
-                'current_price': float(val.get('current_price', STOCK_DATABASE.get(sym, {}).get('price', 0)))
-            }
-
-        if symbol in normalized:
-            old_shares = normalized[symbol]['shares']
-            old_avg = normalized[symbol]['avg_price']
-            new_shares = old_shares + quantity
-            new_avg = (old_avg * old_shares + stock_price * quantity) / new_shares
-            normalized[symbol]['shares'] = new_shares
-            normalized[symbol]['avg_price'] = new_avg
-            normalized[symbol]['current_price'] = stock_price
-        else:
-            normalized[symbol] = {'shares': quantity, 'avg_price': stock_price, 'current_price': stock_price}
-
-        aws_manager.dynamodb.update_portfolio(username, normalized)
-
-        # Record transaction in DynamoDB
-        tx_id = aws_manager.dynamodb.add_transaction(username, 'BUY', symbol, quantity, stock_price, total_cost)
-
-        # Send SNS notification if configured
         try:
-            aws_manager.sns.send_trade_notification(username, 'BUY', symbol, quantity, stock_price)
-        except Exception:
-            pass
-
-        return jsonify({'success': True, 'message': f'Successfully bought {quantity} shares of {symbol}', 'transaction_id': tx_id, 'new_balance': new_balance})
-
-    # Local JSON flow (fallback)
-    data = load_data()
-    user_data = data[username]
-
-    balance = user_data.get('balance', 0)
-    if total_cost > balance:
-        return jsonify({'success': False, 'error': 'Insufficient balance'}), 400
-
-    # Update balance
-    user_data['balance'] -= total_cost
-
-    # Update portfolio
-    if 'portfolio' not in user_data:
-        user_data['portfolio'] = {}
-
-    if symbol in user_data['portfolio']:
-        old_shares = user_data['portfolio'][symbol]['shares']
-        old_avg_price = user_data['portfolio'][symbol]['avg_price']
-        new_shares = old_shares + quantity
-        new_avg_price = (old_avg_price * old_shares + stock_price * quantity) / new_shares
-        user_data['portfolio'][symbol]['shares'] = new_shares
-        user_data['portfolio'][symbol]['avg_price'] = new_avg_price
-    else:
-        user_data['portfolio'][symbol] = {'shares': quantity, 'avg_price': stock_price}
+            transaction, new_balance = dynamo_trading.execute_buy(get_client('dynamodb'), username, symbol, quantity, price_cents,
+                                                                      cache=aws_manager.dynamodb.cache)
+        except TradeError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
 
-    # Record transaction
-    transaction = {
-        'id': str(uuid.uuid4()),
-        'type': 'BUY',
-        'symbol': symbol,
-        'quantity': quantity,
-        'price': stock_price,
-        'total': total_cost,
-        'timestamp': datetime.now().isoformat(),
-        'status': 'CONFIRMED'
-    }
-    user_data['transactions'].append(transaction)
+        # Queue the trade notification
+        message = f"Buy Order Confirmed!\n\nSymbol: {symbol}\nQuantity: {quantity}\nPrice: ${format_cents(price_cents)}\nTotal: ${format_cents(total_cost)}"
+        send_notification(username, "Stock Purchase Confirmed", message, trade=('BUY', symbol, quantity, price_cents))
+
+        return jsonify({'success': True, 'message': f'Successfully bought {quantity} shares of {symbol}', 'transaction_id': transaction['id'], 'new_balance': dollars(new_balance)})
 
-    save_data(data)
+    # Local store flow (fallback): check, update and record atomically
+    try:
+        transaction, new_balance = execute_buy(store, username, symbol, quantity, price_cents)
+    except TradeError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    valuation.apply_fill(username, 'BUY', symbol, quantity, price_cents)
 
     # Send notification
-    message = f"Buy Order Confirmed!\n\nSymbol: {symbol}\nQuantity: {quantity}\nPrice: ${stock_price}\nTotal: ${total_cost:.2f}"
-    send_notification(username, "Stock Purchase Confirmed", message)
+    message = f"Buy Order Confirmed!\n\nSymbol: {symbol}\nQuantity: {quantity}\nPrice: ${format_cents(price_cents)}\nTotal: ${format_cents(total_cost)}"
+    send_notification(username, "Stock Purchase Confirmed", message, trade=('BUY', symbol, quantity, price_cents))
 
-    return jsonify({'success': True, 'message': f'Successfully bought {quantity} shares of {symbol}', 'transaction_id': transaction['id'], 'new_balance': user_data['balance']})
+    return jsonify({'success': True, 'message': f'Successfully bought {quantity} shares of {symbol}', 'transaction_id': transaction['id'], 'new_balance': dollars(new_balance)})
 
 @app.route('/api/sell', methods=['POST'])
 @login_required
@@ -445,139 +571,403 @@ def sell_stock():
     symbol = request.json.get('symbol', '').upper()
     quantity = int(request.json.get('quantity', 0))
 
-    if symbol not in STOCK_DATABASE:
+    snapshot = current_prices()
+    if symbol not in snapshot:
         return jsonify({'success': False, 'error': 'Stock not found'}), 400
 
     if quantity <= 0:
         return jsonify({'success': False, 'error': 'Quantity must be positive'}), 400
 
-    # DynamoDB-backed flow
+    price_cents = to_cents(snapshot.price(symbol))
+
+    # DynamoDB-backed flow: one transactional write (see dynamo_trading.py)
     if USE_DYNAMODB and aws_manager:
-        portfolio_item = aws_manager.dynamodb.get_portfolio(username) or {}
-        holdings = portfolio_item.get('holdings', {})
+        try:
+            transaction, new_balance = dynamo_trading.execute_sell(get_client('dynamodb'), username, symbol, quantity, price_cents,
+                                                                       cache=aws_manager.dynamodb.cache)
+        except TradeError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        total_proceeds = transaction['total_cents']
 
-        # Normalize holdings
-        normalized = {}
-        for sym, val in holdings.items():
-            normalized[sym] = {
-                'shares': int(val.get('shares', 0)),
-                'avg_price': float(val.get('avg_price', 0)),
-                'current_price': float(val.get('current_price', STOCK_DATABASE.get(sym, {}).get('price', 0)))
-            }
+        message = f"Sell Order Confirmed!\n\nSymbol: {symbol}\nQuantity: {quantity}\nPrice: ${format_cents(price_cents)}\nTotal Proceeds: ${format_cents(total_proceeds)}"
+        send_notification(username, "Stock Sale Confirmed", message, trade=('SELL', symbol, quantity, price_cents))
 
-        if symbol not in normalized or normalized[symbol]['shares'] < quantity:
-            owned = normalized.get(symbol, {}).get('shares', 0)
-            return jsonify({'success': False, 'error': f'Insufficient shares. You own {owned}'}), 400
+        return jsonify({'success': True, 'message': f'Successfully sold {quantity} shares of {symbol}', 'transaction_id': transaction['id'], 'new_balance': dollars(new_balance)})
 
-        stock_price = STOCK_DATABASE[symbol]['price']
-        total_proceeds = stock_price * quantity
+    # Local store flow: check, update and record atomically
+    try:
+        transaction, new_balance = execute_sell(store, username, symbol, quantity, price_cents)
+    except TradeError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    valuation.apply_fill(username, 'SELL', symbol, quantity, price_cents)
+    total_proceeds = transaction['total_cents']
 
-        # Update balance
-        user = aws_manager.dynamodb.get_user(username) or {}
-        balance = float(user.get('balance', 0))
-        new_balance = balance + total_proceeds
-        aws_manager.dynamodb.update_user_balance(username, new_balance)
+    # Send notification
+    message = f"Sell Order Confirmed!\n\nSymbol: {symbol}\nQuantity: {quantity}\nPrice: ${format_cents(price_cents)}\nTotal Proceeds: ${format_cents(total_proceeds)}"
+    send_notification(username, "Stock Sale Confirmed", message, trade=('SELL', symbol, quantity, price_cents))
 
-        # Update holdings
-        normalized[symbol]['shares'] -= quantity
-        if normalized[symbol]['shares'] == 0:
-            del normalized[symbol]
+    return jsonify({'success': True, 'message': f'Successfully sold {quantity} shares of {symbol}', 'transaction_id': transaction['id'], 'new_balance': dollars(new_balance)})
 
-        aws_manager.dynamodb.update_portfolio(username, normalized)
+def order_json(order, fills=()):
+    """An order and the fills it just took part in, amounts in dollars"""
+    if not order.remaining:
+        status = 'FILLED'
+    elif order.price is None:
+        status = 'CANCELLED' if order.remaining == order.quantity else 'PARTIALLY_FILLED'
+    else:
+        status = 'OPEN' if order.remaining == order.quantity else 'PARTIALLY_FILLED'
+    return {
+        'order_id': order.id,
+        'side': order.side,
+        'symbol': order.symbol,
+        'type': 'MARKET' if order.price is None else 'LIMIT',
+        'price': None if order.price is None else dollars(order.price),
+        'quantity': order.quantity,
+        'remaining': order.remaining,
+        'status': status,
+        'fills': [{'price': dollars(f.price), 'quantity': f.quantity} for f in fills]
+    }
 
-        # Record transaction
-        tx_id = aws_manager.dynamodb.add_transaction(username, 'SELL', symbol, quantity, stock_price, total_proceeds)
+def notify_fills(fills):
+    """One notification per order that traded, for the taker and every resting order it met"""
+    traded = {}
+    for fill in fills:
+        for order in (fill.taker, fill.maker):
+            traded.setdefault(order.id, (order, []))[1].append(fill)
+    for order, order_fills in traded.values():
+        quantity = sum(f.quantity for f in order_fills)
+        total = sum(f.price * f.quantity for f in order_fills)
+        verb = 'Bought' if order.side == 'BUY' else 'Sold'
+        left = 'Cancelled' if order.price is None else 'Remaining'  # market orders never rest
+        message = f"Order {order.id} filled\n\n{verb} {quantity} {order.symbol} for ${format_cents(total)}\n{left}: {order.remaining}"
+        send_notification(order.username, "Order Filled", message)
+
+@app.route('/api/orders', methods=['GET', 'POST'])
+@login_required
+def orders_api():
+    """List your open orders (GET) or place a limit or market order (POST)"""
+    if USE_DYNAMODB and aws_manager:
+        return jsonify({'success': False, 'error': 'Order book trading needs the local store'}), 400
+    username = session['username']
+    if request.method == 'GET':
+        open_orders = (store.get_user(username) or {}).get('orders', {})
+        return jsonify({'orders': [
+            {'order_id': order_id, 'side': o['side'], 'symbol': o['symbol'], 'price': dollars(o['price_cents']),
+             'quantity': o['quantity'], 'remaining': o['remaining'], 'created_at': o['created_at']}
+            for order_id, o in sorted(open_orders.items(), key=lambda item: item[1]['created_at'])
+        ]})
 
+    symbol = request.json.get('symbol', '').upper()
+    side = request.json.get('side', '').upper()
+    order_type = request.json.get('type', 'LIMIT').upper()
+    try:
+        quantity = int(request.json.get('quantity', 0))
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'error': 'Quantity must be a whole number'}), 400
+
+    if symbol not in current_prices():
+        return jsonify({'success': False, 'error': 'Stock not found'}), 400
+    if side not in ('BUY', 'SELL'):
+        return jsonify({'success': False, 'error': 'Side must be BUY or SELL'}), 400
+    if quantity <= 0:
+        return jsonify({'success': False, 'error': 'Quantity must be positive'}), 400
+    if order_type == 'LIMIT':
         try:
-            aws_manager.sns.send_trade_notification(username, 'SELL', symbol, quantity, stock_price)
-        except Exception:
-            pass
-
-        return jsonify({'success': True, 'message': f'Successfully sold {quantity} shares of {symbol}', 'transaction_id': tx_id, 'new_balance': new_balance})
-
-    # Local JSON flow
-    data = load_data()
-    user_data = data[username]
-
-    if symbol not in user_data.get('portfolio', {}):
-        return jsonify({'success': False, 'error': 'You do not own this stock'}), 400
-
-    owned_shares = user_data['portfolio'][symbol]['shares']
-    if quantity > owned_shares:
-        return jsonify({'success': False, 'error': f'Insufficient shares. You own {owned_shares}'}), 400
-
-    stock_price = STOCK_DATABASE[symbol]['price']
-    total_proceeds = stock_price * quantity
-
-    # Update balance
-    user_data['balance'] += total_proceeds
+            price_cents = to_cents(request.json.get('price') or 0)
+        except (TypeError, ValueError, OverflowError):
+            return jsonify({'success': False, 'error': 'Limit price must be a number'}), 400
+        if price_cents <= 0:
+            return jsonify({'success': False, 'error': 'Limit price must be positive'}), 400
+    elif order_type == 'MARKET':
+        price_cents = None
+    else:
+        return jsonify({'success': False, 'error': 'Order type must be LIMIT or MARKET'}), 400
 
-    # Update portfolio
-    user_data['portfolio'][symbol]['shares'] -= quantity
-    if user_data['portfolio'][symbol]['shares'] == 0:
-        del user_data['portfolio'][symbol]
+    try:
+        order, fills = order_desk.place(username, side, symbol, quantity, price_cents)
+    except TradeError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    notify_fills(fills)
+    return jsonify({'success': True, 'order': order_json(order, fills)})
 
-    # Record transaction
-    transaction = {
-        'id': str(uuid.uuid4()),
-        'type': 'SELL',
+@app.route('/api/orders/<order_id>', methods=['DELETE'])
+@login_required
+def cancel_order(order_id):
+    """Cancel one of your resting orders and release its reserved balance or shares"""
+    if USE_DYNAMODB and aws_manager:
+        return jsonify({'success': False, 'error': 'Order book trading needs the local store'}), 400
+    try:
+        entry = order_desk.cancel(session['username'], order_id)
+    except TradeError as e:
+        return jsonify({'success': False, 'error': str(e)}), 404
+    return jsonify({'success': True, 'order_id': order_id, 'cancelled_quantity': entry['remaining']})
+
+@app.route('/api/book/<symbol>')
+@login_required
+def get_order_book(symbol):
+    """Aggregated bid and ask levels of a symbol's order book, best first"""
+    symbol = symbol.upper()
+    if symbol not in current_prices():
+        return jsonify({'error': 'Stock not found'}), 404
+    levels = max(1, min(request.args.get('depth', ORDER_BOOK_DEPTH, type=int), MAX_ORDER_BOOK_DEPTH))
+    depth = order_desk.depth(symbol, levels)
+    return jsonify({
         'symbol': symbol,
-        'quantity': quantity,
-        'price': stock_price,
-        'total': total_proceeds,
-        'timestamp': datetime.now().isoformat(),
-        'status': 'CONFIRMED'
-    }
-    user_data['transactions'].append(transaction)
-
-    save_data(data)
+        'bids': [{'price': dollars(price), 'quantity': quantity} for price, quantity in depth['bids']],
+        'asks': [{'price': dollars(price), 'quantity': quantity} for price, quantity in depth['asks']]
+    })
 
-    # Send notification
-    message = f"Sell Order Confirmed!\n\nSymbol: {symbol}\nQuantity: {quantity}\nPrice: ${stock_price}\nTotal Proceeds: ${total_proceeds:.2f}"
-    send_notification(username, "Stock Sale Confirmed", message)
+@app.route('/api/orders/batch', methods=['POST'])
+@login_required
+def batch_orders():
+    """Execute a list of buys and sells at current prices, all or nothing"""
+    username = session['username']
+    body = request.get_json(silent=True)
+    orders = body.get('orders') if isinstance(body, dict) else None
+    if not isinstance(orders, list) or not orders:
+        return jsonify({'success': False, 'error': 'orders must be a non-empty list'}), 400
+    if len(orders) > MAX_BATCH_ORDERS:
+        return jsonify({'success': False, 'error': f'At most {MAX_BATCH_ORDERS} orders per batch'}), 400
+
+    snapshot = current_prices()
+    trades, results, error = [], [], None
+    for order in orders:
+        if not isinstance(order, dict):
+            results.append({'error': 'Order must be an object'})
+            error = error or results[-1]['error']
+            continue
+        symbol = str(order.get('symbol', '')).upper()
+        side = str(order.get('side', '')).upper()
+        try:
+            quantity = int(order.get('quantity', 0))
+        except (TypeError, ValueError):
+            quantity = None
+        result = {'side': side, 'symbol': symbol, 'quantity': order.get('quantity') if quantity is None else quantity}
+        if symbol not in snapshot:
+            result['error'] = 'Stock not found'
+        elif side not in ('BUY', 'SELL'):
+            result['error'] = 'Side must be BUY or SELL'
+        elif quantity is None:
+            result['error'] = 'Quantity must be a whole number'
+        elif quantity <= 0:
+            result['error'] = 'Quantity must be positive'
+        else:
+            trades.append((side, symbol, quantity, to_cents(snapshot.price(symbol))))
+        error = error or result.get('error')
+        results.append(result)
 
-    return jsonify({'success': True, 'message': f'Successfully sold {quantity} shares of {symbol}', 'transaction_id': transaction['id'], 'new_balance': user_data['balance']})
+    if error is None:
+        try:
+            if USE_DYNAMODB and aws_manager:
+                transactions, new_balance = dynamo_trading.execute_batch(get_client('dynamodb'), username, trades,
+                                                                         cache=aws_manager.dynamodb.cache)
+            else:
+                transactions, new_balance = execute_batch(store, username, trades)
+        except BatchError as e:
+            results[e.index]['error'] = error = str(e)
+        except TradeError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+    if error is not None:
+        for result in results:
+            result['status'] = 'REJECTED' if 'error' in result else 'NOT_EXECUTED'
+        return jsonify({'success': False, 'error': error, 'results': results}), 400
+
+    lines = []
+    for result, transaction in zip(results, transactions):
+        if not (USE_DYNAMODB and aws_manager):
+            valuation.apply_fill(username, transaction['type'], transaction['symbol'],
+                                 transaction['quantity'], transaction['price_cents'])
+        result.update(status='EXECUTED', transaction_id=transaction['id'],
+                      price=dollars(transaction['price_cents']), total=dollars(transaction['total_cents']))
+        lines.append(f"{transaction['type']} {transaction['quantity']} {transaction['symbol']} "
+                     f"@ ${format_cents(transaction['price_cents'])} = ${format_cents(transaction['total_cents'])}")
+    message = f"Batch of {len(transactions)} orders executed\n\n" + "\n".join(lines) + f"\n\nBalance: ${format_cents(new_balance)}"
+    send_notification(username, "Batch Orders Confirmed", message)
+    return jsonify({'success': True, 'results': results, 'new_balance': dollars(new_balance)})
 
 @app.route('/portfolio')
 @login_required
 def portfolio():
     """Portfolio management page"""
     username = session['username']
-    data = load_data()
-    user_data = data.get(username, {})
+    user_data = load_account(username)
     
-    portfolio_details = []
-    for symbol, holdings in user_data.get('portfolio', {}).items():
-        if symbol in STOCK_DATABASE:
-            current_price = STOCK_DATABASE[symbol]['price']
-            shares = holdings['shares']
-            position_value = current_price * shares
-            
-            portfolio_details.append({
-                'symbol': symbol,
-                'name': STOCK_DATABASE[symbol]['name'],
-                'shares': shares,
-                'avg_price': holdings['avg_price'],
-                'current_price': current_price,
-                'position_value': position_value,
-                'gain_loss': position_value - (holdings['avg_price'] * shares),
-                'gain_loss_percent': ((current_price - holdings['avg_price']) / holdings['avg_price'] * 100) if holdings['avg_price'] > 0 else 0
-            })
+    portfolio_details, market_value, cost_basis = valuation.summary(username, user_data.get('portfolio', {}))
     
-    return render_template('portfolio.html', portfolio=portfolio_details)
+    return render_template('portfolio.html', portfolio=portfolio_details,
+                           total_value=market_value, total_gain=market_value - cost_basis)
+
+_matrix_cache = {'matrix': None, 'built_at': 0.0}
+
+def _holdings_matrix(rebuild=False):
+    """Return the all-accounts holdings matrix, rebuilt at most every HOLDINGS_MATRIX_MAX_AGE seconds"""
+    now = time.monotonic()
+    if rebuild or _matrix_cache['matrix'] is None or now - _matrix_cache['built_at'] > HOLDINGS_MATRIX_MAX_AGE:
+        _matrix_cache['matrix'] = HoldingsMatrix.from_accounts(store.iter_accounts(), list(STOCK_DATABASE))
+        _matrix_cache['built_at'] = now
+    return _matrix_cache['matrix']
+
+@app.route('/api/admin/notifications')
+@admin_required
+def notification_metrics():
+    """Notification queue depth and delivery counters for this worker"""
+    return jsonify(notifier.metrics())
+
+@app.route('/api/sessions/revoke', methods=['POST'])
+@login_required
+def revoke_my_sessions():
+    """Log out every session of the current user, this one included"""
+    revoked = session_manager.revoke_user(session['username'])
+    session.clear()
+    return jsonify({'success': True, 'revoked': revoked})
+
+@app.route('/api/admin/users/<username>/sessions/revoke', methods=['POST'])
+@admin_required
+def revoke_user_sessions(username):
+    """Log a user out everywhere"""
+    return jsonify({'success': True, 'username': username, 'revoked': session_manager.revoke_user(username)})
+
+@app.route('/api/admin/revalue', methods=['POST'])
+@admin_required
+def revalue_all_accounts():
+    """Revalue every account in one vectorized pass and return totals and a leaderboard.
+
+    Optional JSON body: {"prices": {"AAPL": 190.0}, "limit": 10, "rebuild": true}.
+    "prices" revalues at hypothetical prices; "rebuild" reloads holdings now
+    instead of reusing a matrix up to HOLDINGS_MATRIX_MAX_AGE seconds old.
+    """
+    if not NUMPY_AVAILABLE:
+        return jsonify({'error': 'Bulk revaluation requires numpy'}), 503
+    if USE_DYNAMODB and aws_manager:
+        return jsonify({'error': 'Bulk revaluation needs the local store'}), 400
+
+    body = request.get_json(silent=True) or {}
+    if not isinstance(body, dict) or not isinstance(body.get('prices') or {}, dict):
+        return jsonify({'error': 'Body must be {"prices": {symbol: price}, "limit": n, "rebuild": bool}'}), 400
+    prices = dict(current_prices().prices())
+    for symbol, price in (body.get('prices') or {}).items():
+        try:
+            price = float(price)
+        except (TypeError, ValueError):
+            price = math.nan
+        if not math.isfinite(price) or price <= 0:
+            return jsonify({'error': f'Price for {symbol} must be a positive number'}), 400
+        if symbol.upper() in prices:
+            prices[symbol.upper()] = price
+    try:
+        limit = max(1, min(int(body.get('limit', 10)), 1000))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'limit must be a whole number'}), 400
+
+    matrix = _holdings_matrix(rebuild=bool(body.get('rebuild')))
+    result = matrix.revalue(prices)
+    return jsonify({
+        'users': len(matrix.usernames),
+        'prices': prices,
+        'total_market_value': dollars(int(result['market_value'].sum())),
+        'total_cost_basis': dollars(int(result['cost_basis'].sum())),
+        'total_unrealized_pnl': dollars(int(result['unrealized_pnl'].sum())),
+        'leaderboard': [{'username': name, 'total_value': dollars(value)}
+                        for name, value in matrix.leaderboard(result['total_value'], limit)]
+    })
 
 @app.route('/transactions')
 @login_required
 def transactions():
     """Transaction history page"""
     username = session['username']
-    data = load_data()
-    user_data = data.get(username, {})
-    
-    transactions = user_data.get('transactions', [])
-    transactions.reverse()  # Show newest first
+    cursor = request.args.get('cursor')
+    try:
+        transactions, next_cursor = account_store().get_transactions_page(username, cursor, TRANSACTIONS_PAGE_SIZE)
+    except ValueError:
+        return redirect(url_for('transactions'))
     
-    return render_template('transactions.html', transactions=transactions)
+    return render_template('transactions.html', transactions=transactions,
+                           next_cursor=next_cursor, is_first_page=cursor is None)
+
+@app.route('/api/transactions')
+@login_required
+def get_transactions_api():
+    """Newest-first transaction history, one page per call"""
+    username = session['username']
+    cursor = request.args.get('cursor') or None
+    limit = max(1, min(request.args.get('limit', TRANSACTIONS_PAGE_SIZE, type=int), MAX_TRANSACTIONS_PAGE_SIZE))
+    try:
+        transactions, next_cursor = account_store().get_transactions_page(username, cursor, limit)
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor'}), 400
+    return jsonify({'transactions': [transaction_json(t) for t in transactions], 'next_cursor': next_cursor})
+
+def export_rows(rows, fmt, with_username):
+    """Encode (cursor, username, transaction) rows as CSV or NDJSON text, EXPORT_CHUNK_ROWS at a time"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    if fmt == 'csv':
+        writer.writerow((['username'] if with_username else [])
+                        + ['id', 'type', 'symbol', 'quantity', 'price', 'total', 'timestamp', 'status', 'cursor'])
+    for count, (cursor, username, tx) in enumerate(rows, 1):
+        if fmt == 'csv':
+            writer.writerow(([username] if with_username else [])
+                            + [tx['id'], tx['type'], tx['symbol'], tx['quantity'], format_cents(tx['price_cents']),
+                               format_cents(tx['total_cents']), tx['timestamp'], tx['status'], cursor])
+        else:
+            row = transaction_json(tx)
+            if with_username:
+                row['username'] = username
+            row['cursor'] = cursor
+            buffer.write(json.dumps(row, separators=(',', ':')) + '\n')
+        if count % EXPORT_CHUNK_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def export_transactions(username):
+    """Streamed download of username's transactions (None: every user's), oldest first.
+
+    ?format=csv|ndjson, ?from= and ?to= (ISO dates or times, to is exclusive),
+    ?limit= to stop after that many rows and ?cursor= to resume after a row:
+    every row carries its cursor, so an interrupted download continues from
+    the last row received.
+    """
+    fmt = request.args.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': f"format must be one of: {', '.join(EXPORT_FORMATS)}"}), 400
+    try:
+        start, end = (datetime.fromisoformat(request.args[name]).isoformat() if request.args.get(name) else None
+                      for name in ('from', 'to'))
+    except ValueError:
+        return jsonify({'error': 'from and to must be ISO dates, e.g. 2024-01-31 or 2024-01-31T09:30:00'}), 400
+    limit = request.args.get('limit', type=int)
+
+    rows = account_store().iter_transactions(username, start, end, request.args.get('cursor') or None)
+    try:
+        first = next(rows, None)  # a bad cursor fails here, before the response starts
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor'}), 400
+    rows = itertools.chain([first], rows) if first is not None else iter(())
+    if limit is not None:
+        rows = itertools.islice(rows, max(0, limit))
+
+    response = Response(export_rows(rows, fmt, username is None),
+                        mimetype='text/csv' if fmt == 'csv' else 'application/x-ndjson')
+    response.headers.set('Content-Disposition', 'attachment',
+                         filename=f"transactions-{username or 'all'}.{fmt}")
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/api/transactions/export')
+@login_required
+def export_transactions_api():
+    """Download your transaction history as CSV or NDJSON (see export_transactions)"""
+    return export_transactions(session['username'])
+
+@app.route('/api/admin/transactions/export')
+@admin_required
+def admin_export_transactions():
+    """Every user's transactions, or ?username='s, streamed straight from the store"""
+    return export_transactions(request.args.get('username') or None)
 
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
@@ -0,0 +1,230 @@
+"""Password hashing and login throttling.
+
+Passwords are stored as self-describing hash strings:
+
+  $argon2id$v=19$m=...             argon2id (needs `pip install argon2-cffi`)
+  scrypt$<n>$<r>$<p>$<salt>$<hash> hashlib.scrypt
+  pbkdf2_sha256$<iters>$<salt>$<hash>
+
+Anything else is a plaintext password saved by older versions of the app.
+It still verifies, and the caller stores the hash that verify() returns in
+its place; the same happens to hashes made with another scheme or weaker
+parameters than the configured ones, so upgrades need no migration.
+
+Hashing is deliberately slow and CPU-bound, so PasswordHasher runs it in a
+process pool: request threads wait without holding the GIL, and at most
+`max_pending` hashes run or queue at once (more raises HasherBusy instead of
+stacking up). LoginLimiter keeps token buckets per username and per client
+IP and turns a credential-stuffing flood away before any hashing is done.
+Both live in the worker process: limits apply per worker.
+"""
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+try:
+    import argon2
+    ARGON2_AVAILABLE = True
+except ImportError:
+    ARGON2_AVAILABLE = False
+
+DEFAULT_SCHEME = 'argon2' if ARGON2_AVAILABLE else 'scrypt'
+
+SCRYPT_N = 2 ** 15
+SCRYPT_R = 8
+SCRYPT_P = 1
+PBKDF2_ITERATIONS = 600_000
+
+
+class HasherBusy(Exception):
+    """Too many password hashes are already running or queued"""
+
+
+def _b64(data):
+    return base64.b64encode(data).decode('ascii').rstrip('=')
+
+
+def _unb64(text):
+    return base64.b64decode(text + '=' * (-len(text) % 4))
+
+
+def _scrypt(password, salt, n, r, p):
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p, maxmem=256 * n * r, dklen=32)
+
+
+def _pbkdf2(password, salt, iterations):
+    return hashlib.pbkdf2_hmac('sha256', password.encode(), salt, iterations)
+
+
+def scheme_of(stored):
+    """'argon2', 'scrypt', 'pbkdf2' or 'plaintext'"""
+    if stored.startswith('$argon2'):
+        return 'argon2'
+    if stored.startswith('scrypt$') and stored.count('$') == 5:
+        return 'scrypt'
+    if stored.startswith('pbkdf2_sha256$') and stored.count('$') == 3:
+        return 'pbkdf2'
+    return 'plaintext'
+
+
+def hash_password(password, scheme=DEFAULT_SCHEME):
+    """Hash string for password with the current parameters of scheme"""
+    if scheme == 'argon2':
+        if not ARGON2_AVAILABLE:
+            raise RuntimeError('argon2 hashing needs: pip install argon2-cffi')
+        return argon2.PasswordHasher().hash(password)
+    salt = secrets.token_bytes(16)
+    if scheme == 'scrypt':
+        digest = _scrypt(password, salt, SCRYPT_N, SCRYPT_R, SCRYPT_P)
+        return f'scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${_b64(salt)}${_b64(digest)}'
+    if scheme == 'pbkdf2':
+        return f'pbkdf2_sha256${PBKDF2_ITERATIONS}${_b64(salt)}${_b64(_pbkdf2(password, salt, PBKDF2_ITERATIONS))}'
+    raise ValueError(f'Unknown password hash scheme: {scheme}')
+
+
+def needs_rehash(stored, scheme=DEFAULT_SCHEME):
+    """True if stored is plaintext, another scheme, or made with other parameters than scheme's current ones"""
+    found = scheme_of(stored)
+    if found != scheme:
+        return True
+    if found == 'argon2':
+        return argon2.PasswordHasher().check_needs_rehash(stored)
+    if found == 'scrypt':
+        return stored.split('$')[1:4] != [str(SCRYPT_N), str(SCRYPT_R), str(SCRYPT_P)]
+    return stored.split('$')[1] != str(PBKDF2_ITERATIONS)
+
+
+def check_password(stored, password):
+    """True if password matches stored (a hash string or a legacy plaintext password)"""
+    found = scheme_of(stored)
+    if found == 'argon2':
+        if not ARGON2_AVAILABLE:
+            raise RuntimeError('argon2 hashes need: pip install argon2-cffi')
+        try:
+            return argon2.PasswordHasher().verify(stored, password)
+        except (argon2.exceptions.VerificationError, argon2.exceptions.InvalidHash):
+            return False
+    if found == 'scrypt':
+        _, n, r, p, salt, digest = stored.split('$')
+        return hmac.compare_digest(_scrypt(password, _unb64(salt), int(n), int(r), int(p)), _unb64(digest))
+    if found == 'pbkdf2':
+        _, iterations, salt, digest = stored.split('$')
+        return hmac.compare_digest(_pbkdf2(password, _unb64(salt), int(iterations)), _unb64(digest))
+    return bool(stored) and hmac.compare_digest(stored.encode(), password.encode())  # '' is a placeholder
+
+
+def verify_and_upgrade(stored, password, scheme=DEFAULT_SCHEME):
+    """(matches, new hash string or None); runs in a pool process"""
+    if not check_password(stored, password):
+        return False, None
+    return True, hash_password(password, scheme) if needs_rehash(stored, scheme) else None
+
+
+class PasswordHasher:
+    """Runs hash_password/verify_and_upgrade in a process pool of `workers` processes.
+
+    workers=0 hashes in the calling thread. The pool is started on first use
+    in each process, so it is never inherited across a gunicorn fork.
+    """
+
+    def __init__(self, scheme=DEFAULT_SCHEME, workers=2, max_pending=None):
+        self.scheme = scheme
+        self.workers = workers
+        self._slots = threading.BoundedSemaphore(max_pending or max(1, workers) * 4)
+        self._lock = threading.Lock()
+        self._pool = None
+        self._pid = None
+        self._dummy = None
+
+    def _executor(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pool, self._pid = ProcessPoolExecutor(max_workers=self.workers), os.getpid()
+            return self._pool
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HasherBusy()
+        try:
+            if not self.workers:
+                return fn(*args)
+            pool = self._executor()
+            try:
+                return pool.submit(fn, *args).result()
+            except BrokenProcessPool:
+                with self._lock:
+                    if self._pool is pool:
+                        self._pid = None  # a worker died: start a fresh pool next time
+                raise
+        finally:
+            self._slots.release()
+
+    def close(self):
+        """Shut the pool down; it is started again if used"""
+        with self._lock:
+            if self._pool is not None and self._pid == os.getpid():
+                self._pool.shutdown()
+            self._pool = self._pid = None
+
+    def hash(self, password):
+        """Hash string for a new password"""
+        return self._run(hash_password, password, self.scheme)
+
+    def verify(self, stored, password):
+        """(matches, upgraded hash to store or None); stored=None (no such user) costs the same and fails"""
+        if stored is None:
+            if self._dummy is None:
+                self._dummy = self.hash(secrets.token_urlsafe(16))
+            self._run(check_password, self._dummy, password)
+            return False, None
+        return self._run(verify_and_upgrade, stored, password, self.scheme)
+
+
+class TokenBuckets:
+    """One token bucket per key: up to `burst` tokens, refilled at `rate` tokens per second"""
+
+    def __init__(self, rate, burst, max_keys=100_000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets = {}  # key -> (tokens, updated_at)
+        self._lock = threading.Lock()
+
+    def take(self, key, now=None):
+        """Take a token for key; returns 0 on success, else the seconds until one is available"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens < 1:
+                self._buckets[key] = (tokens, now)
+                return (1 - tokens) / self.rate
+            self._buckets[key] = (tokens - 1, now)
+            if len(self._buckets) > self.max_keys:
+                self._prune(now)
+            return 0
+
+    def _prune(self, now):
+        """Forget buckets that have refilled; they behave exactly like new ones"""
+        full = [key for key, (tokens, updated) in self._buckets.items()
+                if tokens + (now - updated) * self.rate >= self.burst]
+        for key in full:
+            del self._buckets[key]
+
+
+class LoginLimiter:
+    """Login attempts allowed per username and per client IP, each as per-minute token buckets"""
+
+    def __init__(self, user_per_minute=5, user_burst=5, ip_per_minute=60, ip_burst=20):
+        self.users = TokenBuckets(user_per_minute / 60, user_burst)
+        self.ips = TokenBuckets(ip_per_minute / 60, ip_burst)
+
+    def check(self, username, ip):
+        """0 if the attempt may proceed, else seconds to wait; the IP is checked first"""
+        return self.ips.take(ip) or self.users.take(username.lower())
@@ -1,585 +1,459 @@
-
-from flask import Flask, render_template, request, redirect, url_for, session, jsonify, flash
-from datetime import datetime
-import json
+"""DynamoDB and SNS access for USE_DYNAMODB mode.
+
+`aws_manager.dynamodb` reads and writes the StockTrading* tables (see
+AWS_DEPLOYMENT_GUIDE.md), `aws_manager.sns` publishes trade notifications
+and `aws_manager.health_check()` reports whether both are reachable:
+
+    python3 -c "from aws import aws_manager; print(aws_manager.health_check())"
+
+Calls go through the shared low-level clients of aws_clients, so importing
+this module does not touch the network. Reads ask only for the attributes
+they use (ProjectionExpression). Several users, or a user together with
+their portfolio, are fetched with one BatchGetItem, and history pages are
+Query calls that follow LastEvaluatedKey. Items read are kept in a
+read-through cache (account_cache.py) for ACCOUNT_CACHE_TTL seconds and
+invalidated by every write made here. Password hashes are never cached;
+the login reads them from DynamoDB.
+
+Balances and amounts are stored as exact decimal numbers in dollars and
+read back as int cents (balance_cents, price_cents, total_cents), the
+same units the local stores use (see money.py).
+"""
 import os
-from functools import wraps
-import boto3
-import uuid
-
-app = Flask(__name__)
-# Load secret from environment for production safety
-app.secret_key = os.environ.get('FLASK_SECRET_KEY', 'your-secret-key-change-this-in-production')
-
-# Toggle using DynamoDB for persistence
-USE_DYNAMODB = os.environ.get('USE_DYNAMODB', 'false').lower() == 'true'
-
-# Import AWS manager if DynamoDB mode enabled (aws_manager created in aws.py)
-try:
-    from aws import aws_manager
-except Exception:
-    aws_manager = None
-
-# AWS SNS Configuration (optional - set up only if you have AWS credentials)
-try:
-    sns_client = boto3.client('sns', region_name='us-east-1')
-    SNS_TOPIC_ARN = 'arn:aws:sns:us-east-1:086227530655:aws_capstone_topic'
-    SNS_ENABLED = False  # Set to True when configured
-except:
-    SNS_ENABLED = False
-    sns_client = None
-
-# Data storage (in production, use a database)
-DATA_FILE = 'trading_data.json'
-
-
-# Simulated stock data
-STOCK_DATABASE = {
-    'AAPL': {'name': 'Apple Inc.', 'price': 182.45, 'change': 2.35},
-    'GOOGL': {'name': 'Alphabet Inc.', 'price': 140.82, 'change': -1.15},
-    'MSFT': {'name': 'Microsoft Corp.', 'price': 380.61, 'change': 3.22},
-    'AMZN': {'name': 'Amazon.com Inc.', 'price': 181.92, 'change': -0.88},
-    'TSLA': {'name': 'Tesla Inc.', 'price': 238.45, 'change': 5.67},
-    'META': {'name': 'Meta Platforms', 'price': 485.72, 'change': 8.34},
-    'NFLX': {'name': 'Netflix Inc.', 'price': 247.18, 'change': -2.10},
-    'NVIDIA': {'name': 'NVIDIA Corp.', 'price': 875.29, 'change': 12.45},
-}
-
-def load_data():
-    """Load user data from JSON file"""
-    if os.path.exists(DATA_FILE):
-        with open(DATA_FILE, 'r') as f:
-            return json.load(f)
-    return {}
-
-def save_data(data):
-    """Save user data to JSON file"""
-    with open(DATA_FILE, 'w') as f:
-        json.dump(data, f, indent=2)
-
-def send_notification(username, subject, message):
-    """Send SNS notification"""
-    if SNS_ENABLED and sns_client:
-        try:
-            sns_client.publish(
-                TopicArn=SNS_TOPIC_ARN,
-                Subject=subject,
-                Message=f"User: {username}\n\n{message}"
-            )
-        except Exception as e:
-            print(f"Error sending SNS notification: {e}")
-
-def login_required(f):
-    """Decorator for routes that require authentication"""
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
-        if 'username' not in session:
-            return redirect(url_for('login'))
-        return f(*args, **kwargs)
-    return decorated_function
-
-def init_user(username):
-    """Initialize a new user with default portfolio"""
-    if USE_DYNAMODB and aws_manager:
-        # Ensure user exists in DynamoDB
-        user = aws_manager.dynamodb.get_user(username)
-        if not user:
-            # create with empty password placeholder; signup should set real password
-            aws_manager.dynamodb.create_user(username, '')
-            user = aws_manager.dynamodb.get_user(username)
-        return user
-
-    data = load_data()
-    if username not in data:
-        data[username] = {
-            'password': '',
-            'balance': 10000.00,  # Virtual currency allocation
-            'portfolio': {},  # {symbol: {'shares': int, 'avg_price': float}}
-            'transactions': [],  # Transaction history
-            'created_at': datetime.now().isoformat()
-        }
-        save_data(data)
-    return data[username]
-
-@app.route('/')
-def index():
-    if 'username' in session:
-        return redirect(url_for('dashboard'))
-    return redirect(url_for('login'))
-
-@app.route('/signup', methods=['GET', 'POST'])
-def signup():
-    if request.method == 'POST':
-        username = request.form.get('username', '').strip()
-        password = request.form.get('password', '')
-        confirm_password = request.form.get('confirm_password', '')
-        
-        if not username or not password:
-            flash('Username and password are required!', 'error')
-            return redirect(url_for('signup'))
-        
-        if password != confirm_password:
-            flash('Passwords do not match!', 'error')
-            return redirect(url_for('signup'))
-        
-        if USE_DYNAMODB and aws_manager:
-            # Check in DynamoDB
-            existing = aws_manager.dynamodb.get_user(username)
-            if existing:
-                flash('Username already exists!', 'error')
-                return redirect(url_for('signup'))
-            # Note: password should be hashed in production
-            aws_manager.dynamodb.create_user(username, password)
-            flash('Account created successfully! Please log in.', 'success')
-            return redirect(url_for('login'))
-
-        data = load_data()
-        if username in data:
-            flash('Username already exists!', 'error')
-            return redirect(url_for('signup'))
-        
-        # Create new user
-        data[username] = {
-            'password': password,  # In production, hash this!
-            'balance': 10000.00,
-            'portfolio': {},
-            'transactions': [],
-            'created_at': datetime.now().isoformat()
-        }
-        save_data(data)
-        
-        flash('Account created successfully! Please log in.', 'success')
-        return redirect(url_for('login'))
-    
-    return render_template('signup.html')
-
-@app.route('/login', methods=['GET', 'POST'])
-def login():
-    if request.method == 'POST':
-        username = request.form.get('username', '').strip()
-        password = request.form.get('password', '')
-        if USE_DYNAMODB and aws_manager:
-            user = aws_manager.dynamodb.get_user(username)
-            if user and user.get('password') == password:
-                session['username'] = username
-                flash('Login successful!', 'success')
-                return redirect(url_for('dashboard'))
-            flash('Invalid username or password!', 'error')
-            return render_template('login.html')
-
-        data = load_data()
-        if username in data and data[username]['password'] == password:
-            session['username'] = username
-            flash('Login successful!', 'success')
-            return redirect(url_for('dashboard'))
-        
-        flash('Invalid username or password!', 'error')
-    
-    return render_template('login.html')
-
-@app.route('/logout')
-def logout():
-    session.pop('username', None)
-    flash('You have been logged out.', 'info')
-    return redirect(url_for('login'))
-
-@app.route('/dashboard')
-@login_required
-def dashboard():
-    username = session['username']
-    data = load_data()
-    user_data = data.get(username, {})
-    
-    # Calculate portfolio value
-    portfolio_value = 0
-    portfolio_details = []
-    
-    for symbol, holdings in user_data.get('portfolio', {}).items():
-        if symbol in STOCK_DATABASE:
-            current_price = STOCK_DATABASE[symbol]['price']
-            shares = holdings['shares']
-            position_value = current_price * shares
-            portfolio_value += position_value
-            
-            portfolio_details.append({
-                'symbol': symbol,
-                'name': STOCK_DATABASE[symbol]['name'],
-                'shares': shares,
-                'avg_price': holdings['avg_price'],
-                'current_price': current_price,
-                'position_value': position_value,
-                'gain_loss': position_value - (holdings['avg_price'] * shares)
-            })
-    
-    total_value = user_data.get('balance', 0) + portfolio_value
-    
-    return render_template('dashboard.html', 
-                         username=username,
-                         balance=user_data.get('balance', 0),
-                         portfolio=portfolio_details,
-                         portfolio_value=portfolio_value,
-                         total_value=total_value,
-                         transactions=user_data.get('transactions', [])[-10:])  # Last 10 transactions
-
-@app.route('/api/stocks')
-@login_required
-def get_stocks():
-    """API endpoint to get available stocks"""
-    stocks = []
-    for symbol, data in STOCK_DATABASE.items():
-        stocks.append({
-            'symbol': symbol,
-            'name': data['name'],
-            'price': data['price'],
-            'change': data['change']
-        })
-    return jsonify(stocks)
-
-@app.route('/trade')
-@login_required
-def trade():
-    """Stock trading interface"""
-    return render_template('trade.html', stocks=STOCK_DATABASE)
-
-@app.route('/api/stock/<symbol>')
-@login_required
-def get_stock_details(symbol):
-    """Get details for a specific stock"""
-    symbol = symbol.upper()
-    if symbol in STOCK_DATABASE:
-        stock = STOCK_DATABASE[symbol]
-        return jsonify({
-            'symbol': symbol,
-            'name': stock['name'],
-            'price': stock['price'],
-            'change': stock['change'],
-            'found': True
-        })
-    return jsonify({'found': False, 'error': 'Stock not found'}), 404
-
-@app.route('/api/stock/<symbol>/history')
-@login_required
-def get_stock_history(symbol):
-    """Get historical price data for a stock with different timeframes"""
-    import random
-    from datetime import timedelta
-    
-    symbol = symbol.upper()
-    if symbol not in STOCK_DATABASE:
-        return jsonify({'error': 'Stock not found'}), 404
-    
-    # Get timeframe from query parameter (default: 1m for 1 month)
-    timeframe = request.args.get('timeframe', '1m')
-    
-    # Validate timeframe
-    if timeframe not in ['5m', '1w', '1m']:
-        timeframe = '1m'
-    
-    current_price = STOCK_DATABASE[symbol]['price']
-    base_price = current_price
-    labels = []
-    prices = []
-    
-    if timeframe == '5m':
-        # 5 minutes: 12 data points (1 hour)
-        num_points = 12
-        for i in range(num_points, 0, -1):
-            minutes = i * 5
-            time_str = f"{minutes//60:02d}:{minutes%60:02d}"
-            # Very small volatility for intraday (±0.5%)
-            price_change = random.uniform(-0.5, 0.5)
-            current_price = current_price * (1 + price_change / 100)
-            current_price = max(base_price * 0.995, min(current_price, base_price * 1.005))
-            prices.append(round(current_price, 2))
-            labels.append(time_str)
-    
-    elif timeframe == '1w':
-        # 1 week: 7 daily data points
-        num_points = 7
-        for i in range(num_points, 0, -1):
-            date = (datetime.now() - timedelta(days=i)).strftime('%a %m/%d')
-            # Moderate volatility (±1%)
-            daily_change = random.uniform(-1.0, 1.0)
-            current_price = current_price * (1 + daily_change / 100)
-            current_price = max(base_price * 0.93, min(current_price, base_price * 1.07))
-            prices.append(round(current_price, 2))
-            labels.append(date)
-    
-    else:  # 1m (1 month)
-        # 1 month: 30 daily data points
-        num_points = 30
-        for i in range(num_points, 0, -1):
-            date = (datetime.now() - timedelta(days=i)).strftime('%m/%d')
-            # Standard volatility (±1.5%)
-            daily_change = random.uniform(-1.5, 1.5)
-            current_price = current_price * (1 + daily_change / 100)
-            current_price = max(base_price * 0.85, min(current_price, base_price * 1.15))
-            prices.append(round(current_price, 2))
-            labels.append(date)
-    
-    return jsonify({
-        'symbol': symbol,
-        'labels': labels,
-        'prices': prices,
-        'current_price': STOCK_DATABASE[symbol]['price'],
-        'change': STOCK_DATABASE[symbol]['change']
-    })
-
-@app.route('/api/buy', methods=['POST'])
-@login_required
-def buy_stock():
-    """Execute a buy order"""
-    username = session['username']
-    symbol = request.json.get('symbol', '').upper()
-    quantity = int(request.json.get('quantity', 0))
-
-    if symbol not in STOCK_DATABASE:
-        return jsonify({'success': False, 'error': 'Stock not found'}), 400
-
-    if quantity <= 0:
-        return jsonify({'success': False, 'error': 'Quantity must be positive'}), 400
-
-    stock_price = STOCK_DATABASE[symbol]['price']
-    total_cost = stock_price * quantity
-
-    # DynamoDB-backed flow
-    if USE_DYNAMODB and aws_manager:
-        # Get user and balance
-        user = aws_manager.dynamodb.get_user(username) or {}
-        balance = float(user.get('balance', 0))
-
-        if total_cost > balance:
-            return jsonify({'success': False, 'error': 'Insufficient balance'}), 400
-
-        new_balance = balance - total_cost
-        # Update balance in DynamoDB
-        aws_manager.dynamodb.update_user_balance(username, new_balance)
-
-        # Update portfolio
-        portfolio_item = aws_manager.dynamodb.get_portfolio(username) or {}
-        holdings = portfolio_item.get('holdings', {})
-
-        # Normalize holdings (may contain Decimal)
-        normalized = {}
-        for sym, val in holdings.items():
-            normalized[sym] = {
-                'shares': int(val.get('shares', 0)),
-                'avg_price': float(val.get('avg_price', 0)),
-                'current_price': float(val.get('current_price', STOCK_DATABASE.get(sym, {}).get('price', 0)))
-            }
-
-        if symbol in normalized:
-            old_shares = normalized[symbol]['shares']
-            old_avg = normalized[symbol]['avg_price']
-            new_shares = old_shares + quantity
-            new_avg = (old_avg * old_shares + stock_price * quantity) / new_shares
-            normalized[symbol]['shares'] = new_shares
-            normalized[symbol]['avg_price'] = new_avg
-            normalized[symbol]['current_price'] = stock_price
-        else:
-            normalized[symbol] = {'shares': quantity, 'avg_price': stock_price, 'current_price': stock_price}
+import random
+import time
+from datetime import datetime
 
-        aws_manager.dynamodb.update_portfolio(username, normalized)
+from account_cache import open_cache, portfolio_key, user_key
+from aws_clients import PORTFOLIOS_TABLE, TRANSACTIONS_TABLE, USERS_TABLE, get_client
+from dynamo_trading import transaction_item
+from holdings_codec import Position, decode_holdings, encode_holdings, holdings_record
+from money import CENTS, format_cents, format_fixed, to_cents
+from trading import make_transaction
+
+SNS_TOPIC_ARN = os.environ.get('SNS_TOPIC_ARN', '')
+STARTING_BALANCE_CENTS = 10000 * CENTS
+
+# Read-through cache of Users/Portfolios items; ACCOUNT_CACHE_TTL=0 turns it off
+ACCOUNT_CACHE_URL = os.environ.get('ACCOUNT_CACHE_URL', 'memory')
+ACCOUNT_CACHE_TTL = float(os.environ.get('ACCOUNT_CACHE_TTL', '5'))
+ACCOUNT_CACHE_SIZE = int(os.environ.get('ACCOUNT_CACHE_SIZE', '10000'))
+
+BATCH_GET_LIMIT = 100  # keys per BatchGetItem request
+TRANSACTION_FIELDS = ('id', 'type', 'symbol', 'quantity', 'price', 'total', 'timestamp', 'status')
+USER_FIELDS = ['username', 'balance', 'created_at']
+PORTFOLIO_FIELDS = ['username', 'holdings', 'version']
+CACHE_KEYS = {USERS_TABLE: user_key, PORTFOLIOS_TABLE: portfolio_key}
+
+
+def encode(value):
+    """Python value -> DynamoDB attribute value"""
+    if isinstance(value, bool):
+        return {'BOOL': value}
+    if isinstance(value, (int, float)):
+        return {'N': str(value)}
+    if isinstance(value, dict):
+        return {'M': {k: encode(v) for k, v in value.items()}}
+    if isinstance(value, (list, tuple)):
+        return {'L': [encode(v) for v in value]}
+    if value is None:
+        return {'NULL': True}
+    return {'S': str(value)}
+
+
+def decode(attr):
+    """DynamoDB attribute value -> Python value; numbers become int or float"""
+    kind, value = next(iter(attr.items()))
+    if kind == 'N':
+        return int(value) if value.lstrip('-').isdigit() else float(value)
+    if kind == 'M':
+        return {k: decode(v) for k, v in value.items()}
+    if kind == 'L':
+        return [decode(v) for v in value]
+    if kind == 'NULL':
+        return None
+    return value  # S, BOOL
+
+
+def decode_item(item):
+    return {k: decode(v) for k, v in item.items()}
+
+
+def _projection(attributes):
+    """ProjectionExpression kwargs for a list of top-level attribute names"""
+    if not attributes:
+        return {}
+    names = {f'#a{i}': name for i, name in enumerate(attributes)}
+    return {'ProjectionExpression': ', '.join(names), 'ExpressionAttributeNames': names}
+
+
+def decode_user(item):
+    """Users item with the balance as exact int cents ('balance_cents')"""
+    user = {k: decode(v) for k, v in item.items() if k != 'balance'}
+    if 'balance' in item:
+        user['balance_cents'] = to_cents(item['balance']['N'])
+    return user
+
+
+def decode_portfolio(item):
+    """Portfolios item with holdings as {symbol: Position} (legacy current_price fields are dropped)"""
+    portfolio = {k: decode(v) for k, v in item.items() if k != 'holdings'}
+    portfolio['holdings'] = decode_holdings(item['holdings']) if 'holdings' in item else {}
+    return portfolio
+
+
+def _holdings(portfolio):
+    """{symbol: {'shares', 'avg_micros'}} from a decoded (possibly cached) Portfolios item"""
+    # cached positions come back from JSON as [shares, avg_micros] lists
+    return holdings_record({symbol: Position(*p) for symbol, p in (portfolio or {}).get('holdings', {}).items()})
+
+
+class DynamoDBManager:
+    """Users, portfolios and transactions in DynamoDB"""
+
+    def __init__(self, client=None, cache=None):
+        self._client = client
+        self.cache = cache
+
+    @property
+    def client(self):
+        return self._client or get_client('dynamodb')
+
+    # -- users ---------------------------------------------------------------
+
+    def get_user(self, username, attributes=None):
+        """Users item as a dict (balance as 'balance_cents'), or None; attributes limits what is returned"""
+        return self.get_users([username], attributes).get(username)
+
+    def get_users(self, usernames, attributes=None):
+        """{username: Users item} for many users via BatchGetItem; missing users are left out.
+
+        With a cache, items come without the password hash unless it is named
+        in attributes, which reads it from DynamoDB.
+        """
+        if self.cache is not None and attributes and 'password' in attributes:
+            found = self._batch_get({USERS_TABLE: (usernames, attributes)})[USERS_TABLE]
+            users = {user['username']: user for user in found}
+        else:
+            # with a cache, whole items are read and cached (they are small) and filtered here
+            users = self._read({USERS_TABLE: (usernames, None if self.cache else attributes)})[USERS_TABLE]
+        if attributes:
+            wanted = ['balance_cents' if name == 'balance' else name for name in attributes]
+            return {name: {k: user[k] for k in wanted if k in user} for name, user in users.items()}
+        return {name: dict(user) for name, user in users.items()}
 
-        # Record transaction in DynamoDB
-        tx_id = aws_manager.dynamodb.add_transaction(username, 'BUY', symbol, quantity, stock_price, total_cost)
+    def create_user(self, username, password, balance_cents=STARTING_BALANCE_CENTS):
+        """Insert a user; returns False if the username is taken"""
+        from botocore.exceptions import ClientError
 
-        # Send SNS notification if configured
         try:
-            aws_manager.sns.send_trade_notification(username, 'BUY', symbol, quantity, stock_price)
-        except Exception:
-            pass
-
-        return jsonify({'success': True, 'message': f'Successfully bought {quantity} shares of {symbol}', 'transaction_id': tx_id, 'new_balance': new_balance})
-
-    # Local JSON flow (fallback)
-    data = load_data()
-    user_data = data[username]
-
-    balance = user_data.get('balance', 0)
-    if total_cost > balance:
-        return jsonify({'success': False, 'error': 'Insufficient balance'}), 400
-
-    # Update balance
-    user_data['balance'] -= total_cost
-
-    # Update portfolio
-    if 'portfolio' not in user_data:
-        user_data['portfolio'] = {}
-
-    if symbol in user_data['portfolio']:
-        old_shares = user_data['portfolio'][symbol]['shares']
-        old_avg_price = user_data['portfolio'][symbol]['avg_price']
-        new_shares = old_shares + quantity
-        new_avg_price = (old_avg_price * old_shares + stock_price * quantity) / new_shares
-        user_data['portfolio'][symbol]['shares'] = new_shares
-        user_data['portfolio'][symbol]['avg_price'] = new_avg_price
-    else:
-        user_data['portfolio'][symbol] = {'shares': quantity, 'avg_price': stock_price}
-
-    # Record transaction
-    transaction = {
-        'id': str(uuid.uuid4()),
-        'type': 'BUY',
-        'symbol': symbol,
-        'quantity': quantity,
-        'price': stock_price,
-        'total': total_cost,
-        'timestamp': datetime.now().isoformat(),
-        'status': 'CONFIRMED'
-    }
-    user_data['transactions'].append(transaction)
-
-    save_data(data)
-
-    # Send notification
-    message = f"Buy Order Confirmed!\n\nSymbol: {symbol}\nQuantity: {quantity}\nPrice: ${stock_price}\nTotal: ${total_cost:.2f}"
-    send_notification(username, "Stock Purchase Confirmed", message)
-
-    return jsonify({'success': True, 'message': f'Successfully bought {quantity} shares of {symbol}', 'transaction_id': transaction['id'], 'new_balance': user_data['balance']})
-
-@app.route('/api/sell', methods=['POST'])
-@login_required
-def sell_stock():
-    """Execute a sell order"""
-    username = session['username']
-    symbol = request.json.get('symbol', '').upper()
-    quantity = int(request.json.get('quantity', 0))
-
-    if symbol not in STOCK_DATABASE:
-        return jsonify({'success': False, 'error': 'Stock not found'}), 400
-
-    if quantity <= 0:
-        return jsonify({'success': False, 'error': 'Quantity must be positive'}), 400
-
-    # DynamoDB-backed flow
-    if USE_DYNAMODB and aws_manager:
-        portfolio_item = aws_manager.dynamodb.get_portfolio(username) or {}
-        holdings = portfolio_item.get('holdings', {})
-
-        # Normalize holdings
-        normalized = {}
-        for sym, val in holdings.items():
-            normalized[sym] = {
-                'shares': int(val.get('shares', 0)),
-                'avg_price': float(val.get('avg_price', 0)),
-                'current_price': float(val.get('current_price', STOCK_DATABASE.get(sym, {}).get('price', 0)))
-            }
-
-        if symbol not in normalized or normalized[symbol]['shares'] < quantity:
-            owned = normalized.get(symbol, {}).get('shares', 0)
-            return jsonify({'success': False, 'error': f'Insufficient shares. You own {owned}'}), 400
-
-        stock_price = STOCK_DATABASE[symbol]['price']
-        total_proceeds = stock_price * quantity
-
-        # Update balance
-        user = aws_manager.dynamodb.get_user(username) or {}
-        balance = float(user.get('balance', 0))
-        new_balance = balance + total_proceeds
-        aws_manager.dynamodb.update_user_balance(username, new_balance)
-
-        # Update holdings
-        normalized[symbol]['shares'] -= quantity
-        if normalized[symbol]['shares'] == 0:
-            del normalized[symbol]
-
-        aws_manager.dynamodb.update_portfolio(username, normalized)
-
-        # Record transaction
-        tx_id = aws_manager.dynamodb.add_transaction(username, 'SELL', symbol, quantity, stock_price, total_proceeds)
+            self.client.put_item(
+                TableName=USERS_TABLE,
+                Item={'username': {'S': username}, 'password': {'S': password},
+                      'balance': {'N': format_fixed(balance_cents, CENTS)},
+                      'created_at': {'S': datetime.now().isoformat()}},
+                ConditionExpression='attribute_not_exists(username)')
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                return False
+            raise
+        finally:
+            self._invalidate(user_key(username))
+        return True
+
+    def update_password(self, username, password, expected):
+        """Replace the stored password (hash) if it is still `expected`; returns False if it changed"""
+        from botocore.exceptions import ClientError
 
         try:
-            aws_manager.sns.send_trade_notification(username, 'SELL', symbol, quantity, stock_price)
-        except Exception:
-            pass
-
-        return jsonify({'success': True, 'message': f'Successfully sold {quantity} shares of {symbol}', 'transaction_id': tx_id, 'new_balance': new_balance})
-
-    # Local JSON flow
-    data = load_data()
-    user_data = data[username]
-
-    if symbol not in user_data.get('portfolio', {}):
-        return jsonify({'success': False, 'error': 'You do not own this stock'}), 400
-
-    owned_shares = user_data['portfolio'][symbol]['shares']
-    if quantity > owned_shares:
-        return jsonify({'success': False, 'error': f'Insufficient shares. You own {owned_shares}'}), 400
-
-    stock_price = STOCK_DATABASE[symbol]['price']
-    total_proceeds = stock_price * quantity
-
-    # Update balance
-    user_data['balance'] += total_proceeds
-
-    # Update portfolio
-    user_data['portfolio'][symbol]['shares'] -= quantity
-    if user_data['portfolio'][symbol]['shares'] == 0:
-        del user_data['portfolio'][symbol]
-
-    # Record transaction
-    transaction = {
-        'id': str(uuid.uuid4()),
-        'type': 'SELL',
-        'symbol': symbol,
-        'quantity': quantity,
-        'price': stock_price,
-        'total': total_proceeds,
-        'timestamp': datetime.now().isoformat(),
-        'status': 'CONFIRMED'
-    }
-    user_data['transactions'].append(transaction)
-
-    save_data(data)
-
-    # Send notification
-    message = f"Sell Order Confirmed!\n\nSymbol: {symbol}\nQuantity: {quantity}\nPrice: ${stock_price}\nTotal Proceeds: ${total_proceeds:.2f}"
-    send_notification(username, "Stock Sale Confirmed", message)
-
-    return jsonify({'success': True, 'message': f'Successfully sold {quantity} shares of {symbol}', 'transaction_id': transaction['id'], 'new_balance': user_data['balance']})
-
-@app.route('/portfolio')
-@login_required
-def portfolio():
-    """Portfolio management page"""
-    username = session['username']
-    data = load_data()
-    user_data = data.get(username, {})
-    
-    portfolio_details = []
-    for symbol, holdings in user_data.get('portfolio', {}).items():
-        if symbol in STOCK_DATABASE:
-            current_price = STOCK_DATABASE[symbol]['price']
-            shares = holdings['shares']
-            position_value = current_price * shares
-            
-            portfolio_details.append({
-                'symbol': symbol,
-                'name': STOCK_DATABASE[symbol]['name'],
-                'shares': shares,
-                'avg_price': holdings['avg_price'],
-                'current_price': current_price,
-                'position_value': position_value,
-                'gain_loss': position_value - (holdings['avg_price'] * shares),
-                'gain_loss_percent': ((current_price - holdings['avg_price']) / holdings['avg_price'] * 100) if holdings['avg_price'] > 0 else 0
-            })
-    
-    return render_template('portfolio.html', portfolio=portfolio_details)
-
-@app.route('/transactions')
-@login_required
-def transactions():
-    """Transaction history page"""
-    username = session['username']
-    data = load_data()
-    user_data = data.get(username, {})
-    
-    transactions = user_data.get('transactions', [])
-    transactions.reverse()  # Show newest first
-    
-    return render_template('transactions.html', transactions=transactions)
-
-if __name__ == '__main__':
-    app.run(debug=True, port=5000)
+            self.client.update_item(TableName=USERS_TABLE, Key={'username': {'S': username}},
+                                    UpdateExpression='SET password = :p', ConditionExpression='password = :old',
+                                    ExpressionAttributeValues={':p': {'S': password}, ':old': {'S': expected}})
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                return False
+            raise
+        finally:
+            self._invalidate(user_key(username))
+        return True
+
+    def update_user_balance(self, username, balance_cents):
+        """Overwrite a user's balance (trades use dynamo_trading instead)"""
+        self.client.update_item(TableName=USERS_TABLE, Key={'username': {'S': username}},
+                                UpdateExpression='SET balance = :b',
+                                ExpressionAttributeValues={':b': {'N': format_fixed(balance_cents, CENTS)}})
+        self._invalidate(user_key(username))
+
+    # -- portfolios ----------------------------------------------------------
+
+    def get_portfolio(self, username):
+        """Portfolios item ({'username', 'holdings', 'version'}), or None"""
+        portfolio = self._read({PORTFOLIOS_TABLE: ([username], PORTFOLIO_FIELDS)})[PORTFOLIOS_TABLE].get(username)
+        if not portfolio or portfolio.get('missing'):
+            return None
+        return dict(portfolio, holdings=_holdings(portfolio))
+
+    def update_portfolio(self, username, holdings):
+        """Replace a user's {symbol: {'shares', 'avg_micros'}} holdings, bumping the version dynamo_trading checks"""
+        holdings = {symbol: Position.from_record(record) for symbol, record in holdings.items()}
+        self.client.update_item(
+            TableName=PORTFOLIOS_TABLE, Key={'username': {'S': username}},
+            UpdateExpression='SET holdings = :h, #v = if_not_exists(#v, :zero) + :one',
+            ExpressionAttributeNames={'#v': 'version'},
+            ExpressionAttributeValues={':h': encode_holdings(holdings), ':zero': encode(0), ':one': encode(1)})
+        self._invalidate(portfolio_key(username))
+
+    def get_account(self, username):
+        """User with balance and portfolio in one BatchGetItem, shaped like storage records"""
+        return self.get_accounts([username]).get(username)
+
+    def get_accounts(self, usernames):
+        """{username: {'balance_cents', 'portfolio', 'created_at'}} for many users"""
+        found = self._read({USERS_TABLE: (usernames, None if self.cache else USER_FIELDS),
+                            PORTFOLIOS_TABLE: (usernames, PORTFOLIO_FIELDS)})
+        portfolios = found[PORTFOLIOS_TABLE]
+        return {name: {'balance_cents': user.get('balance_cents', 0),
+                       'portfolio': _holdings(portfolios.get(name)),
+                       'created_at': user.get('created_at', '')}
+                for name, user in found[USERS_TABLE].items()}
+
+    # -- transactions --------------------------------------------------------
+
+    def add_transaction(self, username, trade_type, symbol, quantity, price_cents, total_cents):
+        """Record a transaction outside a trade; returns its id"""
+        transaction = make_transaction(trade_type, symbol, quantity, price_cents, total_cents)
+        self.client.put_item(TableName=TRANSACTIONS_TABLE, Item=transaction_item(username, transaction))
+        return transaction['id']
+
+    def get_transactions_page(self, username, cursor=None, limit=50):
+        """Return (transactions newest first, next_cursor), same contract as the local stores"""
+        kwargs = dict(TableName=TRANSACTIONS_TABLE, KeyConditionExpression='#a0 = :u',
+                      ExpressionAttributeValues={':u': {'S': username}}, ScanIndexForward=False,
+                      **_projection(['username', 'transaction_id', *TRANSACTION_FIELDS]))
+        if cursor is not None:
+            # the cursor is the sort key of the last row of the previous page
+            kwargs['ExclusiveStartKey'] = {'username': {'S': username}, 'transaction_id': {'S': cursor}}
+
+        transactions = []
+        while len(transactions) < limit:
+            response = self.client.query(Limit=limit - len(transactions), **kwargs)
+            transactions.extend(response['Items'])
+            last = response.get('LastEvaluatedKey')
+            if not last:
+                return [self._transaction(t) for t in transactions], None
+            kwargs['ExclusiveStartKey'] = last
+        return [self._transaction(t) for t in transactions], transactions[-1]['transaction_id']['S']
+
+    def get_transactions(self, username):
+        """A user's whole history, newest first, following every page"""
+        transactions, cursor = [], None
+        while True:
+            page, cursor = self.get_transactions_page(username, cursor, limit=1000)
+            transactions.extend(page)
+            if cursor is None:
+                return transactions
+
+    def iter_transactions(self, username=None, start=None, end=None, cursor=None):
+        """Yield (cursor, username, transaction) for one user (oldest first, a Query) or everyone (a Scan).
+
+        Same contract as the local stores' iter_transactions: start <= timestamp < end,
+        and each row's cursor resumes just after it. One page is held at a time.
+        """
+        kwargs = dict(TableName=TRANSACTIONS_TABLE, **_projection(['username', 'transaction_id', *TRANSACTION_FIELDS]))
+        aliases = {name: alias for alias, name in kwargs['ExpressionAttributeNames'].items()}
+        values = {}
+        if username is not None:
+            # transaction_id is '<timestamp>#<id>', so the time range is a sort-key range
+            condition = f"{aliases['username']} = :u"
+            values[':u'] = {'S': username}
+            if start is not None and end is not None:
+                condition += f" AND {aliases['transaction_id']} BETWEEN :s AND :e"
+            elif start is not None:
+                condition += f" AND {aliases['transaction_id']} >= :s"
+            elif end is not None:
+                condition += f" AND {aliases['transaction_id']} < :e"
+            kwargs['KeyConditionExpression'] = condition
+            if cursor is not None:
+                kwargs['ExclusiveStartKey'] = {'username': {'S': username}, 'transaction_id': {'S': cursor}}
+        else:
+            filters = []
+            if start is not None:
+                filters.append(f"{aliases['timestamp']} >= :s")
+            if end is not None:
+                filters.append(f"{aliases['timestamp']} < :e")
+            if filters:
+                kwargs['FilterExpression'] = ' AND '.join(filters)
+            if cursor is not None:
+                transaction_id, _, name = cursor.partition('|')
+                if not name:
+                    raise ValueError(f'Invalid cursor {cursor}')
+                kwargs['ExclusiveStartKey'] = {'username': {'S': name}, 'transaction_id': {'S': transaction_id}}
+        if start is not None:
+            values[':s'] = {'S': start}
+        if end is not None:
+            values[':e'] = {'S': end}
+        if values:
+            kwargs['ExpressionAttributeValues'] = values
+        call = self.client.query if username is not None else self.client.scan
+
+        while True:
+            response = call(**kwargs)
+            for item in response['Items']:
+                name, transaction_id = item['username']['S'], item['transaction_id']['S']
+                # a cursor carries the item's key; a Scan needs the username too ('|' never occurs in an id)
+                yield (transaction_id if username is not None else f'{transaction_id}|{name}',
+                       name, self._transaction(item))
+            if 'LastEvaluatedKey' not in response:
+                return
+            kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    @staticmethod
+    def _transaction(item):
+        """Transactions item -> record shaped like the local stores' (amounts in cents)"""
+        transaction = {}
+        for field in TRANSACTION_FIELDS:
+            attr = item.get(field)
+            if field in ('price', 'total'):
+                transaction[f'{field}_cents'] = to_cents(attr['N']) if attr else None
+            else:
+                transaction[field] = decode(attr) if attr else None
+        if transaction['id'] is None:  # rows written before transaction_id carried the timestamp
+            transaction['id'] = item['transaction_id']['S']
+        return transaction
+
+    # -- caching and batching ------------------------------------------------
+
+    def _read(self, requests):
+        """{table: {username: item}} for {table: (usernames, attributes)}.
+
+        Read-through: cached items are used as they are and all misses, in
+        any table, are fetched with one BatchGetItem and cached. Users
+        without a Portfolios item get a {'missing': True} placeholder, so
+        accounts that never traded are not re-read on every view.
+        """
+        if self.cache is None:
+            found = self._batch_get(requests)
+            return {table: {item['username']: item for item in items} for table, items in found.items()}
+
+        result, misses = {}, {}
+        for table, (usernames, attributes) in requests.items():
+            key = CACHE_KEYS[table]
+            usernames = list(dict.fromkeys(usernames))
+            cached = self.cache.get_many(key(name) for name in usernames)
+            result[table] = {name: cached[key(name)] for name in usernames if key(name) in cached}
+            missing = [name for name in usernames if name not in result[table]]
+            if missing:
+                misses[table] = (missing, attributes)
+        if not misses:
+            return result
+
+        since = self.cache.mark()
+        fetched = self._batch_get(misses)
+        for table, (usernames, _) in misses.items():
+            items = {item['username']: item for item in fetched[table]}
+            for name in usernames:
+                item = items.get(name)
+                if item is None and table == PORTFOLIOS_TABLE:
+                    item = {'username': name, 'holdings': {}, 'missing': True}
+                elif item is not None and table == USERS_TABLE:
+                    item.pop('password', None)  # the cache may be a shared Redis; see get_users
+                if item is not None:
+                    self.cache.set(CACHE_KEYS[table](name), item, since)
+                    if not item.get('missing'):
+                        result[table][name] = item
+        return result
+
+    def _invalidate(self, *keys):
+        if self.cache is not None:
+            self.cache.delete(*keys)
+
+    def _batch_get(self, requests, max_attempts=8):
+        """{table: [items]} for {table: (usernames, attributes)}, 100 keys per call, retrying unprocessed keys"""
+        pending = []
+        for table, (usernames, attributes) in requests.items():
+            spec = _projection(sorted(set(attributes) | {'username'})) if attributes else {}
+            pending.extend((table, spec, username) for username in dict.fromkeys(usernames))
+        found = {table: [] for table in requests}
+
+        attempt = 0
+        while pending:
+            chunk, pending = pending[:BATCH_GET_LIMIT], pending[BATCH_GET_LIMIT:]
+            request_items = {}
+            for table, spec, username in chunk:
+                request_items.setdefault(table, dict(spec, Keys=[]))['Keys'].append({'username': {'S': username}})
+            response = self.client.batch_get_item(RequestItems=request_items)
+            for table, items in response.get('Responses', {}).items():
+                decode_table = {PORTFOLIOS_TABLE: decode_portfolio, USERS_TABLE: decode_user}.get(table, decode_item)
+                found[table].extend(decode_table(item) for item in items)
+
+            unprocessed = response.get('UnprocessedKeys') or {}
+            if unprocessed:
+                # throttled keys go back to the front, after a jittered backoff
+                attempt += 1
+                if attempt >= max_attempts:
+                    raise RuntimeError(f'BatchGetItem left keys unprocessed after {attempt} attempts')
+                retry = [(table, {k: v for k, v in request.items() if k != 'Keys'}, key['username']['S'])
+                         for table, request in unprocessed.items() for key in request['Keys']]
+                pending = retry + pending
+                time.sleep(random.uniform(0, min(1.0, 0.05 * 2 ** attempt)))
+        return found
+
+
+class SNSManager:
+    """Trade notifications on one SNS topic"""
+
+    def __init__(self, topic_arn=SNS_TOPIC_ARN, client=None):
+        self.topic_arn = topic_arn
+        self._client = client
+
+    @property
+    def client(self):
+        return self._client or get_client('sns')
+
+    def send_notification(self, username, subject, message):
+        """Publish one message; raises on failure so the dispatcher can retry"""
+        if not self.topic_arn:
+            return None
+        response = self.client.publish(TopicArn=self.topic_arn, Subject=subject[:100],
+                                       Message=f"User: {username}\n\n{message}")
+        return response.get('MessageId')
+
+    def send_trade_notification(self, username, trade_type, symbol, quantity, price_cents):
+        price, total = format_cents(price_cents), format_cents(price_cents * quantity)
+        if trade_type == 'BUY':
+            subject = "Stock Purchase Confirmed"
+            message = f"Buy Order Confirmed!\n\nSymbol: {symbol}\nQuantity: {quantity}\nPrice: ${price}\nTotal: ${total}"
+        else:
+            subject = "Stock Sale Confirmed"
+            message = f"Sell Order Confirmed!\n\nSymbol: {symbol}\nQuantity: {quantity}\nPrice: ${price}\nTotal Proceeds: ${total}"
+        return self.send_notification(username, subject, message)
+
+
+class AWSManager:
+    """Entry point used by app.py: .dynamodb, .sns and health_check()"""
+
+    def __init__(self):
+        self.dynamodb = DynamoDBManager(cache=open_cache(ACCOUNT_CACHE_URL, ACCOUNT_CACHE_TTL, ACCOUNT_CACHE_SIZE))
+        self.sns = SNSManager()
+
+    def health_check(self):
+        """Status of each table and of the SNS topic; 'healthy' is False if any check failed"""
+        checks = {}
+        for table in (USERS_TABLE, PORTFOLIOS_TABLE, TRANSACTIONS_TABLE):
+            try:
+                checks[table] = get_client('dynamodb').describe_table(TableName=table)['Table']['TableStatus']
+            except Exception as e:
+                checks[table] = f'error: {e}'
+        if self.sns.topic_arn:
+            try:
+                get_client('sns').get_topic_attributes(TopicArn=self.sns.topic_arn)
+                checks['sns'] = 'OK'
+            except Exception as e:
+                checks['sns'] = f'error: {e}'
+        else:
+            checks['sns'] = 'not configured'
+        healthy = all(status in ('ACTIVE', 'OK', 'not configured') for status in checks.values())
+        return {'healthy': healthy, **checks}
+
 
+aws_manager = AWSManager()
@@ -0,0 +1,60 @@
+"""Lazily created, shared AWS clients.
+
+Importing boto3 and building a client costs hundreds of milliseconds, which
+every gunicorn worker used to pay at boot even in local mode. Here boto3 is
+imported on the first get_client() call, and each service gets one client
+per process. boto3 clients are thread-safe, so all request threads share it
+and its connection pool, which is sized for them with max_pool_connections.
+"""
+import os
+import threading
+
+AWS_REGION = os.environ.get('AWS_REGION', 'us-east-1')
+AWS_MAX_POOL_CONNECTIONS = int(os.environ.get('AWS_MAX_POOL_CONNECTIONS', '50'))
+
+# DynamoDB tables (see AWS_DEPLOYMENT_GUIDE.md for their key schemas)
+USERS_TABLE = os.environ.get('DYNAMODB_USERS_TABLE', 'StockTradingUsers')
+PORTFOLIOS_TABLE = os.environ.get('DYNAMODB_PORTFOLIOS_TABLE', 'StockTradingPortfolios')
+TRANSACTIONS_TABLE = os.environ.get('DYNAMODB_TRANSACTIONS_TABLE', 'StockTradingTransactions')
+
+
+def endpoint_url(service):
+    """Endpoint override for local stand-ins, e.g. AWS_ENDPOINT_URL_DYNAMODB=http://localhost:8000"""
+    return os.environ.get(f'AWS_ENDPOINT_URL_{service.upper()}') or os.environ.get('AWS_ENDPOINT_URL') or None
+
+
+_lock = threading.Lock()
+_pid = None
+_session = None
+_clients = {}
+
+
+def get_client(service, region=None):
+    """Shared boto3 client for a service, created on first use"""
+    key = (service, region or AWS_REGION)
+    if _pid == os.getpid():
+        client = _clients.get(key)
+        if client is not None:
+            return client
+    return _create_client(key)
+
+
+def _create_client(key):
+    global _pid, _session, _clients
+    with _lock:
+        if _pid != os.getpid():
+            # connection pools must not be shared with a parent process after fork
+            _pid, _session, _clients = os.getpid(), None, {}
+        client = _clients.get(key)
+        if client is None:
+            import boto3
+            from botocore.config import Config
+
+            if _session is None:
+                _session = boto3.session.Session()  # sessions are not thread-safe; used only under _lock
+            config = Config(max_pool_connections=AWS_MAX_POOL_CONNECTIONS,
+                            connect_timeout=3, read_timeout=10,
+                            retries={'max_attempts': 3, 'mode': 'standard'})
+            client = _session.client(key[0], region_name=key[1], config=config, endpoint_url=endpoint_url(key[0]))
+            _clients[key] = client
+        return client
@@ -0,0 +1,104 @@
+"""Account reads with and without the read-through cache.
+
+Replays a workload on a few hot accounts: each step is a page view
+(get_account) or, with probability --trade-ratio, a trade. It counts the
+DynamoDB calls that read items and reports per-operation latency, first
+with the cache off and then with it on. Uses moto or DynamoDB Local,
+exactly like bench_dynamodb_trade.py, and --rtt to simulate the network.
+
+    python benchmarks/bench_account_cache.py --ops 2000 --accounts 20 --rtt 5
+"""
+import argparse
+import random
+import sys
+import time
+
+from bench_dynamodb_trade import CountingClient, aws_clients, create_tables, delete_tables, seed_user
+
+import aws  # noqa: E402
+import dynamo_trading  # noqa: E402
+from account_cache import MemoryCache  # noqa: E402
+
+READ_CALLS = {'get_item', 'batch_get_item', 'transact_get_items', 'query'}
+
+
+class ReadCountingClient(CountingClient):
+    """Also counts the calls that consume read capacity"""
+
+    def __init__(self, client, rtt=0.0):
+        super().__init__(client, rtt)
+        self.reads = 0
+
+    def __getattr__(self, name):
+        if name in READ_CALLS:
+            self.reads += 1
+        return super().__getattr__(name)
+
+
+def replay(client, cache, args, seed):
+    counting = ReadCountingClient(client, args.rtt / 1000)
+    manager = aws.DynamoDBManager(client=counting, cache=cache)
+    rng = random.Random(seed)
+    accounts = [f'hot-{seed}-{i}' for i in range(args.accounts)]
+    for username in accounts:
+        seed_user(client, username, 10 ** 7)
+
+    views, trades = [], []
+    for _ in range(args.ops):
+        username = rng.choice(accounts)
+        started = time.perf_counter()
+        if rng.random() < args.trade_ratio:
+            dynamo_trading.execute_buy(counting, username, rng.choice('ABCDEFGH'), 1, 1000, cache=cache)
+            trades.append(time.perf_counter() - started)
+        else:
+            manager.get_account(username)
+            views.append(time.perf_counter() - started)
+    return counting, sorted(views), sorted(trades)
+
+
+def _pct(timings, q):
+    return timings[min(len(timings) - 1, int(len(timings) * q))] * 1000 if timings else float('nan')
+
+
+def run(args):
+    client = aws_clients.get_client('dynamodb')
+    create_tables(client)
+    try:
+        print(f"{args.ops} ops on {args.accounts} accounts, {args.trade_ratio:.0%} trades, rtt {args.rtt}ms")
+        print(f"{'cache':8}{'reads':>8}{'calls':>8}{'view p50':>10}{'view p99':>10}{'trade p50':>11}{'trade p99':>11}")
+        for label, cache in (('off', None), ('on', MemoryCache(ttl=args.ttl))):
+            counting, views, trades = replay(client, cache, args, seed=len(label))
+            print(f"{label:8}{counting.reads:>8}{counting.calls:>8}"
+                  f"{_pct(views, 0.5):>8.2f}ms{_pct(views, 0.99):>8.2f}ms"
+                  f"{_pct(trades, 0.5):>9.2f}ms{_pct(trades, 0.99):>9.2f}ms")
+            if cache is not None:
+                print(f"cache: {cache.stats()}")
+    finally:
+        delete_tables(client)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--ops', type=int, default=1000)
+    parser.add_argument('--accounts', type=int, default=20)
+    parser.add_argument('--trade-ratio', type=float, default=0.2)
+    parser.add_argument('--ttl', type=float, default=5.0, help='cache TTL in seconds')
+    parser.add_argument('--rtt', type=float, default=0.0, help='simulated round trip per call, in ms')
+    args = parser.parse_args()
+
+    if aws_clients.endpoint_url('dynamodb'):
+        run(args)
+        return
+    try:
+        from moto import mock_aws
+    except ImportError:
+        try:
+            from moto import mock_dynamodb as mock_aws  # moto < 5
+        except ImportError:
+            sys.exit("Set AWS_ENDPOINT_URL_DYNAMODB to a DynamoDB Local endpoint or pip install 'moto[dynamodb]'")
+    with mock_aws():
+        run(args)
+
+
+if __name__ == '__main__':
+    main()
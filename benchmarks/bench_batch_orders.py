@@ -0,0 +1,64 @@
+"""Rebalancing throughput: N single /api/buy calls vs one /api/orders/batch.
+
+Imports the Flask app against a fresh local store, logs in one user and
+buys --size symbols' worth of shares --rounds times, first with one /api/buy
+request per order, then with one /api/orders/batch request per round. Every
+single call pays its own request handling, store write and notification; a
+batch pays them once. Reports orders per second for both.
+
+    python benchmarks/bench_batch_orders.py --backend sqlite --size 20 --rounds 50
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--backend', choices=['json', 'sqlite'], default='json')
+    parser.add_argument('--size', type=int, default=8, help='orders per rebalance')
+    parser.add_argument('--rounds', type=int, default=50)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench-batch-')
+    os.environ['STORAGE_BACKEND'] = args.backend
+    os.environ['DATA_FILE'] = os.path.join(workdir, 'trading_data.json')
+    os.environ['SQLITE_FILE'] = os.path.join(workdir, 'trading_data.db')
+    os.environ['SESSION_DB_FILE'] = os.path.join(workdir, 'sessions.db')
+    os.environ['PRICE_TICK_SECONDS'] = '0'
+    os.environ['MAX_BATCH_ORDERS'] = str(max(args.size, 50))
+    sys.path.insert(0, ROOT)
+    import app as trading_app
+    from storage import new_user_record
+
+    trading_app.store.create_user('rebalancer', dict(new_user_record(), balance_cents=10 ** 12))
+    client = trading_app.app.test_client()
+    with client.session_transaction() as sess:
+        sess['username'] = 'rebalancer'
+    symbols = list(trading_app.STOCK_DATABASE)
+    orders = [{'symbol': symbols[i % len(symbols)], 'side': 'BUY', 'quantity': 1} for i in range(args.size)]
+
+    started = time.perf_counter()
+    for _ in range(args.rounds):
+        for order in orders:
+            assert client.post('/api/buy', json=order).get_json()['success']
+    single = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for _ in range(args.rounds):
+        assert client.post('/api/orders/batch', json={'orders': orders}).get_json()['success']
+    batched = time.perf_counter() - started
+
+    total = args.size * args.rounds
+    print(f"{args.backend}: {args.rounds} rebalances of {args.size} orders")
+    print(f"{'single calls':14}{total / single:>10,.0f} orders/s")
+    print(f"{'batch':14}{total / batched:>10,.0f} orders/s   ({single / batched:.1f}x)")
+    trading_app.notifier.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""Stress test: parallel buys/sells against one account from many processes.
+
+Each worker process imports the Flask app (like a gunicorn worker), logs in as
+the same user and fires BUY 2 / SELL 1 pairs at /api/buy and /api/sell. At the
+end the account must match the transaction log exactly, i.e. no trade was lost
+to a last-writer-wins race.
+
+    python benchmarks/bench_concurrent_trades.py --backend json --workers 8 --pairs 50
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+USERNAME = 'stress'
+SYMBOL = 'AAPL'
+
+
+def _worker(pairs, ready, go, results):
+    sys.path.insert(0, ROOT)
+    import app as trading_app
+
+    client = trading_app.app.test_client()
+    with client.session_transaction() as sess:
+        sess['username'] = USERNAME
+
+    ready.put(os.getpid())
+    go.wait()
+    ok = failed = 0
+    for _ in range(pairs):
+        for path, quantity in (('/api/buy', 2), ('/api/sell', 1)):
+            response = client.post(path, json={'symbol': SYMBOL, 'quantity': quantity})
+            if response.status_code == 200 and response.get_json().get('success'):
+                ok += 1
+            else:
+                failed += 1
+    results.put((ok, failed))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--backend', choices=['json', 'sqlite'], default='json')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--pairs', type=int, default=50, help='buy/sell pairs per worker')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench-trades-')
+    os.environ['STORAGE_BACKEND'] = args.backend
+    os.environ['DATA_FILE'] = os.path.join(workdir, 'trading_data.json')
+    os.environ['SQLITE_FILE'] = os.path.join(workdir, 'trading_data.db')
+    os.environ['SESSION_DB_FILE'] = os.path.join(workdir, 'sessions.db')
+
+    sys.path.insert(0, ROOT)
+    from storage import open_store, new_user_record
+
+    path = os.environ['SQLITE_FILE'] if args.backend == 'sqlite' else os.environ['DATA_FILE']
+    store = open_store(args.backend, path)
+    start_balance = 1_000_000_000  # cents
+    record = new_user_record('x')
+    record['balance_cents'] = start_balance
+    store.create_user(USERNAME, record)
+
+    ctx = multiprocessing.get_context('spawn')
+    ready, go, results = ctx.Queue(), ctx.Event(), ctx.Queue()
+    procs = [ctx.Process(target=_worker, args=(args.pairs, ready, go, results)) for _ in range(args.workers)]
+    for proc in procs:
+        proc.start()
+    for _ in procs:  # exclude interpreter start-up and imports from the timing
+        ready.get()
+    started = time.perf_counter()
+    go.set()
+    counts = [results.get() for _ in procs]
+    for proc in procs:
+        proc.join()
+    elapsed = time.perf_counter() - started
+
+    ok = sum(c[0] for c in counts)
+    failed = sum(c[1] for c in counts)
+
+    store = open_store(args.backend, path)
+    user = store.get_user(USERNAME)
+    transactions = store.get_transactions(USERNAME)
+    spent = sum(tx['total_cents'] for tx in transactions if tx['type'] == 'BUY')
+    received = sum(tx['total_cents'] for tx in transactions if tx['type'] == 'SELL')
+    expected_shares = sum(tx['quantity'] if tx['type'] == 'BUY' else -tx['quantity'] for tx in transactions)
+    shares = user['portfolio'].get(SYMBOL, {}).get('shares', 0)
+
+    print(f"backend={args.backend} workers={args.workers} trades={ok + failed} "
+          f"ok={ok} failed={failed} elapsed={elapsed:.2f}s -> {ok / elapsed:.1f} trades/sec")
+
+    assert failed == 0, f"{failed} trades were rejected"
+    assert len(transactions) == ok, f"lost transactions: {ok} confirmed, {len(transactions)} recorded"
+    assert shares == expected_shares == args.workers * args.pairs, (shares, expected_shares)
+    assert user['balance_cents'] == start_balance - spent + received, user['balance_cents']
+    print("final balance and shares are exact")
+
+    shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
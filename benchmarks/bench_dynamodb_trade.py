@@ -0,0 +1,194 @@
+"""DynamoDB trade path: legacy five-call flow vs one transactional write.
+
+Runs against DynamoDB Local when AWS_ENDPOINT_URL_DYNAMODB is set, e.g.
+
+    docker run -p 8000:8000 amazon/dynamodb-local
+    AWS_ENDPOINT_URL_DYNAMODB=http://localhost:8000 python benchmarks/bench_dynamodb_trade.py
+
+and otherwise in-process against moto (pip install 'moto[dynamodb]').
+Tables are created with unique names and deleted afterwards. moto answers
+in-process, so --rtt adds a simulated network round trip to every call;
+note that moto deep-copies every table on each transact_write_items, so
+its transactional timings grow with --trades (DynamoDB itself does not).
+Against DynamoDB Local it also runs a double-spend check: many threads
+try to buy at once with only enough balance for some of them (moto is not
+thread-safe, so the check is skipped there).
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+import uuid
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+suffix = uuid.uuid4().hex[:8]
+os.environ.setdefault('AWS_ACCESS_KEY_ID', 'bench')
+os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'bench')
+os.environ['DYNAMODB_USERS_TABLE'] = f'BenchUsers-{suffix}'
+os.environ['DYNAMODB_PORTFOLIOS_TABLE'] = f'BenchPortfolios-{suffix}'
+os.environ['DYNAMODB_TRANSACTIONS_TABLE'] = f'BenchTransactions-{suffix}'
+
+import aws_clients  # noqa: E402
+import dynamo_trading  # noqa: E402
+from money import to_cents  # noqa: E402
+from trading import TradeError  # noqa: E402
+
+TABLES = {
+    aws_clients.USERS_TABLE: [('username', 'HASH')],
+    aws_clients.PORTFOLIOS_TABLE: [('username', 'HASH')],
+    aws_clients.TRANSACTIONS_TABLE: [('username', 'HASH'), ('transaction_id', 'RANGE')],
+}
+
+
+class CountingClient:
+    """Wraps a client, counts API calls and adds `rtt` seconds to each"""
+
+    def __init__(self, client, rtt=0.0):
+        self.client = client
+        self.rtt = rtt
+        self.calls = 0
+
+    def __getattr__(self, name):
+        method = getattr(self.client, name)
+
+        def call(*args, **kwargs):
+            self.calls += 1
+            if self.rtt:
+                time.sleep(self.rtt)
+            return method(*args, **kwargs)
+        return call
+
+
+def create_tables(client):
+    for name, keys in TABLES.items():
+        client.create_table(
+            TableName=name, BillingMode='PAY_PER_REQUEST',
+            KeySchema=[{'AttributeName': attr, 'KeyType': kind} for attr, kind in keys],
+            AttributeDefinitions=[{'AttributeName': attr, 'AttributeType': 'S'} for attr, _ in keys])
+    for name in TABLES:
+        client.get_waiter('table_exists').wait(TableName=name)
+
+
+def delete_tables(client):
+    for name in TABLES:
+        client.delete_table(TableName=name)
+
+
+def seed_user(client, username, balance):
+    client.put_item(TableName=aws_clients.USERS_TABLE,
+                    Item={'username': {'S': username}, 'balance': {'N': str(balance)}})
+
+
+def legacy_buy(client, username, symbol, quantity, price):
+    """The flow app.py used before: get, update balance, get, put portfolio, put transaction"""
+    total = price * quantity
+    user = client.get_item(TableName=aws_clients.USERS_TABLE, Key={'username': {'S': username}})['Item']
+    balance = float(user['balance']['N'])
+    if total > balance:
+        raise TradeError('Insufficient balance')
+    client.update_item(TableName=aws_clients.USERS_TABLE, Key={'username': {'S': username}},
+                       UpdateExpression='SET balance = :b',
+                       ExpressionAttributeValues={':b': {'N': str(balance - total)}})
+    item = client.get_item(TableName=aws_clients.PORTFOLIOS_TABLE, Key={'username': {'S': username}}).get('Item', {})
+    holdings = item.get('holdings', {'M': {}})['M']
+    held = holdings.get(symbol)
+    shares = int(held['M']['shares']['N']) if held else 0
+    avg = float(held['M']['avg_price']['N']) if held else 0.0
+    new_avg = (avg * shares + price * quantity) / (shares + quantity)
+    holdings[symbol] = {'M': {'shares': {'N': str(shares + quantity)}, 'avg_price': {'N': str(new_avg)}}}
+    client.put_item(TableName=aws_clients.PORTFOLIOS_TABLE,
+                    Item={'username': {'S': username}, 'holdings': {'M': holdings}})
+    client.put_item(TableName=aws_clients.TRANSACTIONS_TABLE, Item={
+        'username': {'S': username}, 'transaction_id': {'S': uuid.uuid4().hex},
+        'type': {'S': 'BUY'}, 'symbol': {'S': symbol}, 'quantity': {'N': str(quantity)},
+        'price': {'N': str(price)}, 'total': {'N': str(total)}})
+
+
+def transactional_buy(client, username, symbol, quantity, price):
+    dynamo_trading.execute_buy(client, username, symbol, quantity, to_cents(price))
+
+
+def time_trades(client, buy, trades, rtt):
+    counting = CountingClient(client, rtt)
+    username = f'bench-{uuid.uuid4().hex[:6]}'
+    seed_user(client, username, 10 ** 9)
+    timings = []
+    for i in range(trades):
+        started = time.perf_counter()
+        buy(counting, username, f'SYM{i % 10}', 1, 100.0)
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    return statistics.median(timings), timings[int(len(timings) * 0.99)], counting.calls / trades
+
+
+def double_spend(client, buy, threads, price):
+    """Start `threads` concurrent buys with balance for half of them; returns (succeeded, final balance)"""
+    username = f'race-{uuid.uuid4().hex[:6]}'
+    affordable = threads // 2
+    seed_user(client, username, price * affordable)
+    barrier = threading.Barrier(threads)
+    results = []
+
+    def attempt(i):
+        barrier.wait()
+        try:
+            buy(client, username, 'RACE', 1, price)
+            results.append(True)
+        except Exception:
+            results.append(False)
+
+    workers = [threading.Thread(target=attempt, args=(i,)) for i in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    item = client.get_item(TableName=aws_clients.USERS_TABLE, Key={'username': {'S': username}})['Item']
+    return sum(results), affordable, float(item['balance']['N'])
+
+
+def run(args, concurrent):
+    client = aws_clients.get_client('dynamodb')
+    create_tables(client)
+    try:
+        print(f"{'flow':16}{'p50':>10}{'p99':>10}{'calls/trade':>13}")
+        for label, buy in (('legacy', legacy_buy), ('transactional', transactional_buy)):
+            p50, p99, calls = time_trades(client, buy, args.trades, args.rtt / 1000)
+            print(f"{label:16}{p50 * 1000:>8.2f}ms{p99 * 1000:>8.2f}ms{calls:>13.1f}")
+
+        if not concurrent:
+            return
+        print(f"\ndouble spend: {args.threads} concurrent buys, balance for half of them")
+        for label, buy in (('legacy', legacy_buy), ('transactional', transactional_buy)):
+            succeeded, affordable, balance = double_spend(client, buy, args.threads, 100.0)
+            print(f"{label:16}{succeeded:>4} filled (max {affordable}), final balance {balance:.2f}")
+    finally:
+        delete_tables(client)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--trades', type=int, default=50)
+    parser.add_argument('--threads', type=int, default=20)
+    parser.add_argument('--rtt', type=float, default=0.0, help='simulated round trip per call, in ms')
+    args = parser.parse_args()
+
+    if aws_clients.endpoint_url('dynamodb'):
+        run(args, concurrent=True)
+        return
+    try:
+        from moto import mock_aws
+    except ImportError:
+        try:
+            from moto import mock_dynamodb as mock_aws  # moto < 5
+        except ImportError:
+            sys.exit("Set AWS_ENDPOINT_URL_DYNAMODB to a DynamoDB Local endpoint or pip install 'moto[dynamodb]'")
+    with mock_aws():
+        run(args, concurrent=False)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""Trade throughput: one durable write per trade vs. group commit.
+
+Runs the trade engine directly (no HTTP) from 1, 8 and 64 client threads,
+each trading on its own account, first with a plain store and then with a
+GroupCommitter in front of it.
+
+    python benchmarks/bench_group_commit.py --backend json --trades 1600 --window-ms 5
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage import GroupCommitter, open_store, new_user_record  # noqa: E402
+from trading import execute_buy  # noqa: E402
+
+
+def run(store, clients, trades):
+    per_client = max(1, trades // clients)
+    usernames = [f'client{i}' for i in range(clients)]
+    for username in usernames:
+        store.create_user(username, new_user_record('x'))
+
+    barrier = threading.Barrier(clients + 1)
+
+    def client(username):
+        barrier.wait()
+        for _ in range(per_client):
+            execute_buy(store, username, 'AAPL', 1, 100)
+
+    threads = [threading.Thread(target=client, args=(u,)) for u in usernames]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    for username in usernames:
+        assert len(store.get_transactions(username)) == per_client
+    return per_client * clients / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--backend', choices=['json', 'sqlite'], default='json')
+    parser.add_argument('--trades', type=int, default=1600, help='total trades per run')
+    parser.add_argument('--window-ms', type=float, default=5.0)
+    args = parser.parse_args()
+
+    print(f"backend={args.backend} trades/run={args.trades} window={args.window_ms}ms")
+    print(f"{'clients':>8} {'per-trade':>14} {'group commit':>14} {'speedup':>8}")
+    for clients in (1, 8, 64):
+        rates = []
+        for grouped in (False, True):
+            workdir = tempfile.mkdtemp(prefix='bench-group-')
+            path = os.path.join(workdir, 'trading_data.db' if args.backend == 'sqlite' else 'trading_data.json')
+            store = open_store(args.backend, path)
+            if grouped:
+                store = GroupCommitter(store, window=args.window_ms / 1000)
+            rates.append(run(store, clients, args.trades))
+            shutil.rmtree(workdir, ignore_errors=True)
+        print(f"{clients:>8} {rates[0]:>10.1f} t/s {rates[1]:>10.1f} t/s {rates[1] / rates[0]:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
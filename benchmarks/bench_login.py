@@ -0,0 +1,111 @@
+"""Legitimate logins per second while a credential-stuffing attack runs.
+
+Runs the login path of app.py against an in-memory user table: LoginLimiter
+first, then PasswordHasher.verify() in a process pool. --legit threads log
+in as many different users, each from its own IP, with the right password.
+--attackers threads guess wrong passwords for --victims accounts from a
+botnet of --attack-ips addresses, one request per --rtt. Each scenario runs
+for --seconds, once without the limiter and once with it, and reports
+legitimate logins/s and latency, and how the attack attempts were handled:
+hashed (CPU spent on the attacker), throttled before hashing, or turned
+away because the hash pool was full.
+
+    python benchmarks/bench_login.py --scheme scrypt --workers 2 --seconds 10
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from auth import DEFAULT_SCHEME, HasherBusy, LoginLimiter, PasswordHasher, hash_password  # noqa: E402
+
+
+def run(users, hasher, limiter, args):
+    stop = threading.Event()
+    lock = threading.Lock()
+    stats = {'ok': 0, 'legit_throttled': 0, 'legit_busy': 0, 'hashed': 0, 'throttled': 0, 'busy': 0}
+    latencies = []
+
+    def attempt(username, ip, password):
+        if limiter and limiter.check(username, ip):
+            return 'throttled'
+        try:
+            ok, _ = hasher.verify(users.get(username), password)
+        except HasherBusy:
+            return 'busy'
+        return 'ok' if ok else 'hashed'
+
+    def legit(offset):
+        i = offset
+        while not stop.is_set():
+            username = f'user{i % args.users}'
+            started = time.perf_counter()
+            outcome = attempt(username, f'10.0.{i % args.users // 256}.{i % 256}', 'correct horse')
+            with lock:
+                if outcome == 'ok':
+                    stats['ok'] += 1
+                    latencies.append(time.perf_counter() - started)
+                else:
+                    stats['legit_' + ('busy' if outcome == 'busy' else 'throttled')] += 1
+            i += args.legit
+            if outcome != 'ok':
+                time.sleep(0.05)  # a person retries after a moment
+
+    def attack(seed):
+        rng = random.Random(seed)
+        while not stop.is_set():
+            outcome = attempt(f'user{rng.randrange(args.victims)}', f'203.0.113.{rng.randrange(args.attack_ips)}',
+                              f'guess{rng.random()}')
+            with lock:
+                stats[outcome] += 1
+            time.sleep(args.rtt)  # a remote client waits for each answer
+
+    threads = [threading.Thread(target=legit, args=(n,)) for n in range(args.legit)]
+    threads += [threading.Thread(target=attack, args=(n,)) for n in range(args.attackers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    latencies.sort()
+    return stats, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scheme', default=DEFAULT_SCHEME, choices=['argon2', 'scrypt', 'pbkdf2'])
+    parser.add_argument('--workers', type=int, default=2, help='hashing processes')
+    parser.add_argument('--users', type=int, default=5000, help='legitimate accounts')
+    parser.add_argument('--legit', type=int, default=4, help='legitimate login threads')
+    parser.add_argument('--attackers', type=int, default=32, help='attacking threads')
+    parser.add_argument('--victims', type=int, default=100, help='accounts under attack')
+    parser.add_argument('--attack-ips', type=int, default=50)
+    parser.add_argument('--rtt', type=float, default=0.001, help='seconds an attacker waits between requests')
+    parser.add_argument('--seconds', type=float, default=10)
+    args = parser.parse_args()
+
+    stored = hash_password('correct horse', args.scheme)  # one hash; only the pool's throughput matters
+    users = {f'user{i}': stored for i in range(args.users)}
+    print(f"{args.scheme}, {args.workers} hash processes, {args.legit} legitimate vs {args.attackers} attacking "
+          f"threads ({args.victims} victims, {args.attack_ips} IPs), {args.seconds:.0f}s each")
+    print(f"{'limiter':9}{'logins/s':>10}{'p50 ms':>9}{'p99 ms':>9}{'refused':>9}"
+          f"{'attack hashed':>15}{'throttled':>11}{'busy':>9}")
+    for label, limiter in (('off', None), ('on', LoginLimiter())):
+        hasher = PasswordHasher(args.scheme, workers=args.workers)
+        hasher.verify(stored, 'warm up the pool')
+        stats, latencies = run(users, hasher, limiter, args)
+        p50 = latencies[len(latencies) // 2] * 1000 if latencies else float('nan')
+        p99 = latencies[int(len(latencies) * 0.99)] * 1000 if latencies else float('nan')
+        print(f"{label:9}{stats['ok'] / args.seconds:>10.1f}{p50:>9.0f}{p99:>9.0f}"
+              f"{stats['legit_throttled'] + stats['legit_busy']:>9}"
+              f"{stats['hashed']:>15,}{stats['throttled']:>11,}{stats['busy']:>9,}")
+        hasher.close()
+
+
+if __name__ == '__main__':
+    main()
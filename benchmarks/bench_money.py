@@ -0,0 +1,141 @@
+"""Trade math throughput: float dollars vs Decimal vs int cents.
+
+Replays the same random stream of --trades buys and sells (cent prices,
+1-100 shares) against one account three ways: the old float arithmetic,
+Decimal quantized to cents and micro-dollars, and the integer units
+trading.py now uses. Each pass updates the balance, the position's shares
+and average price, and a running sum of transaction totals. It reports
+trades per second and how far each balance ends up from the exact result
+and from the sum of its own transactions.
+
+    python benchmarks/bench_money.py --trades 1000000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from decimal import ROUND_HALF_UP, Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from money import format_cents  # noqa: E402
+from trading import update_position  # noqa: E402
+
+SYMBOLS = ['AAPL', 'GOOGL', 'MSFT', 'AMZN', 'TSLA', 'META', 'NFLX', 'NVIDIA']
+START_CENTS = 10 ** 9
+
+
+def trade_stream(trades, seed=3):
+    """[(type, symbol, quantity, price_cents)], selling only what is held"""
+    rng = random.Random(seed)
+    held = dict.fromkeys(SYMBOLS, 0)
+    stream = []
+    for _ in range(trades):
+        symbol = rng.choice(SYMBOLS)
+        if held[symbol] and rng.random() < 0.5:
+            quantity = rng.randint(1, held[symbol])
+            held[symbol] -= quantity
+            stream.append(('SELL', symbol, quantity, rng.randint(1_000, 90_000)))
+        else:
+            quantity = rng.randint(1, 100)
+            held[symbol] += quantity
+            stream.append(('BUY', symbol, quantity, rng.randint(1_000, 90_000)))
+    return stream
+
+
+def run_float(stream):
+    """The arithmetic app.py used before: dollars as floats"""
+    balance, portfolio, spent = START_CENTS / 100, {}, 0.0
+    for trade_type, symbol, quantity, price_cents in stream:
+        price = price_cents / 100
+        total = price * quantity
+        if trade_type == 'BUY':
+            balance -= total
+            spent += total
+            holding = portfolio.get(symbol)
+            if holding:
+                shares = holding['shares'] + quantity
+                holding['avg_price'] = (holding['avg_price'] * holding['shares'] + price * quantity) / shares
+                holding['shares'] = shares
+            else:
+                portfolio[symbol] = {'shares': quantity, 'avg_price': price}
+        else:
+            balance += total
+            spent -= total
+            holding = portfolio[symbol]
+            holding['shares'] -= quantity
+            if not holding['shares']:
+                del portfolio[symbol]
+    return balance, START_CENTS / 100 - spent
+
+
+def run_decimal(stream):
+    """Decimal dollars, quantized to cents (totals) and micro-dollars (averages)"""
+    cent, micro = Decimal('0.01'), Decimal('0.000001')
+    start = Decimal(START_CENTS) / 100
+    balance, portfolio, spent = start, {}, Decimal(0)
+    for trade_type, symbol, quantity, price_cents in stream:
+        price = Decimal(price_cents) / 100
+        total = (price * quantity).quantize(cent)
+        if trade_type == 'BUY':
+            balance -= total
+            spent += total
+            holding = portfolio.get(symbol)
+            if holding:
+                shares = holding['shares'] + quantity
+                avg = (holding['avg_price'] * holding['shares'] + price * quantity) / shares
+                holding['avg_price'] = avg.quantize(micro, rounding=ROUND_HALF_UP)
+                holding['shares'] = shares
+            else:
+                portfolio[symbol] = {'shares': quantity, 'avg_price': price}
+        else:
+            balance += total
+            spent -= total
+            holding = portfolio[symbol]
+            holding['shares'] -= quantity
+            if not holding['shares']:
+                del portfolio[symbol]
+    return balance, start - spent
+
+
+def run_cents(stream):
+    """trading.py's units: int cents, avg_micros through trading.update_position()"""
+    balance, portfolio, spent = START_CENTS, {}, 0
+    for trade_type, symbol, quantity, price_cents in stream:
+        total = price_cents * quantity
+        if trade_type == 'BUY':
+            balance -= total
+            spent += total
+        else:
+            balance += total
+            spent -= total
+        update_position(portfolio, trade_type, symbol, quantity, price_cents)
+    return balance, START_CENTS - spent
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--trades', type=int, default=1_000_000)
+    parser.add_argument('--repeat', type=int, default=3, help='best of N runs')
+    args = parser.parse_args()
+
+    stream = trade_stream(args.trades)
+    exact = START_CENTS - sum(p * q if t == 'BUY' else -p * q for t, _, q, p in stream)
+    print(f"{args.trades} trades, exact final balance ${format_cents(exact)}")
+    print(f"{'model':10}{'trades/s':>14}{'vs exact':>16}{'vs own ledger':>16}")
+    for label, run, to_cents in (('float', run_float, lambda v: v * 100),
+                                 ('Decimal', run_decimal, lambda v: v * 100),
+                                 ('int cents', run_cents, lambda v: v)):
+        best = float('inf')
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            balance, ledger = run(stream)
+            best = min(best, time.perf_counter() - started)
+        error = float(to_cents(balance)) - exact
+        drift = float(to_cents(balance) - to_cents(ledger))
+        print(f"{label:10}{args.trades / best:>14,.0f}{error:>+15.6f}c{drift:>+15.6f}c")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""Matching engine throughput, single-threaded.
+
+Replays a random stream of --orders order-book messages against a fresh
+MatchingEngine: limit orders priced a few cents either side of a drifting
+mid price (so most cross and fill against resting orders, the rest build up
+the book), a share of market orders, and cancels of random resting orders.
+Reports messages per second and what the stream did to the book. This times
+the engine alone; settling fills into accounts is one store commit per
+order (see orders.py) and is measured by bench_group_commit.py.
+
+    python benchmarks/bench_order_book.py --orders 1000000 --symbols 8
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from matching import BUY, SELL, MatchingEngine, Order  # noqa: E402
+
+
+def message_stream(count, symbols, market_share, cancel_share, spread, seed=7):
+    """[('order', Order) | ('cancel', order_id)]; cancels name an earlier limit order"""
+    rng = random.Random(seed)
+    mids = [10_000] * len(symbols)  # cents
+    placed = []
+    stream = []
+    for i in range(count):
+        roll = rng.random()
+        if placed and roll < cancel_share:
+            stream.append(('cancel', placed[rng.randrange(len(placed))]))
+            continue
+        s = rng.randrange(len(symbols))
+        mids[s] = max(spread + 1, mids[s] + rng.randint(-1, 1))
+        side = BUY if rng.random() < 0.5 else SELL
+        quantity = rng.randint(1, 100)
+        if roll < cancel_share + market_share:
+            price = None
+        else:
+            price = mids[s] + rng.randint(-spread, spread)
+            placed.append(i)
+        stream.append(('order', Order(i, 'trader%d' % rng.randrange(1000), side, symbols[s], quantity, price)))
+    return stream
+
+
+def run(stream):
+    engine = MatchingEngine()
+    submit, cancel = engine.submit, engine.cancel
+    fills = traded = 0
+    started = time.perf_counter()
+    for kind, payload in stream:
+        if kind == 'order':
+            result = submit(payload)
+            if result:
+                fills += len(result)
+                traded += sum(f.quantity for f in result)
+        else:
+            cancel(payload)
+    return time.perf_counter() - started, fills, traded, len(engine.orders)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--orders', type=int, default=1_000_000, help='messages in the stream')
+    parser.add_argument('--symbols', type=int, default=8)
+    parser.add_argument('--market', type=float, default=0.1, help='share of market orders')
+    parser.add_argument('--cancel', type=float, default=0.2, help='share of cancels')
+    parser.add_argument('--spread', type=int, default=25, help='limit prices within +-N cents of the mid')
+    parser.add_argument('--repeat', type=int, default=3, help='best of N runs')
+    args = parser.parse_args()
+
+    symbols = ['SYM%d' % i for i in range(args.symbols)]
+    best = None
+    for _ in range(args.repeat):
+        # Orders are mutated by matching, so every run gets a fresh stream
+        stream = message_stream(args.orders, symbols, args.market, args.cancel, args.spread)
+        result = run(stream)
+        if best is None or result[0] < best[0]:
+            best = result
+    elapsed, fills, traded, resting = best
+    print(f"{args.orders:,} messages over {args.symbols} symbols "
+          f"({args.market:.0%} market, {args.cancel:.0%} cancel) in {elapsed:.2f}s")
+    print(f"{args.orders / elapsed:,.0f} messages/s, {fills:,} fills, {traded:,} shares traded, "
+          f"{resting:,} orders resting at the end")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""Price engine throughput: tick cost, mid-session catch-up and read latency.
+
+For each universe size in --symbols, times advance() one tick at a time
+(the achievable tick rate), a cold start at the end of a session (what a
+worker forked mid-day pays), and snapshot reads from --readers threads
+while the engine ticks as fast as it can.
+
+    python benchmarks/bench_price_engine.py --symbols 1000 10000
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from prices import PriceEngine  # noqa: E402
+
+
+def universe(size):
+    return {f'SYM{i}': {'name': f'Symbol {i}', 'price': 10.0 + (i % 990), 'change': 0.0} for i in range(size)}
+
+
+def tick_rate(engine, ticks):
+    start = engine.current().timestamp
+    started = time.perf_counter()
+    for i in range(1, ticks + 1):
+        engine.advance(start + i * engine.tick_seconds)
+    elapsed = time.perf_counter() - started
+    return elapsed / ticks
+
+
+def catch_up(stocks, tick_seconds):
+    engine = PriceEngine(stocks, tick_seconds=tick_seconds)
+    session_end = (engine.position(time.time())[0] + 1) * engine.session_seconds - tick_seconds
+    engine._position, engine._levels, engine._paths = None, {}, {}  # as a freshly started worker
+    started = time.perf_counter()
+    engine.advance(session_end)
+    return time.perf_counter() - started, engine.ticks_per_session
+
+
+def read_latency(engine, readers, duration):
+    stop = threading.Event()
+    samples = [[] for _ in range(readers)]
+
+    def read(out):
+        symbol = engine.symbols[len(engine.symbols) // 2]
+        while not stop.is_set():
+            started = time.perf_counter_ns()
+            snapshot = engine.current()
+            snapshot.price(symbol)
+            out.append(time.perf_counter_ns() - started)
+
+    threads = [threading.Thread(target=read, args=(out,)) for out in samples]
+    for t in threads:
+        t.start()
+    start, ticks = engine.current().timestamp, 0
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        ticks += 1
+        engine.advance(start + ticks * engine.tick_seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+
+    merged = sorted(ns for out in samples for ns in out)
+    return ticks / duration, statistics.median(merged), merged[int(len(merged) * 0.99)], len(merged)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--symbols', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--ticks', type=int, default=2000)
+    parser.add_argument('--tick-seconds', type=float, default=1.0)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=2.0)
+    args = parser.parse_args()
+
+    for size in args.symbols:
+        stocks = universe(size)
+        engine = PriceEngine(stocks, tick_seconds=args.tick_seconds)
+        engine._pid = os.getpid()  # drive ticks from here, not the background thread
+
+        per_tick = tick_rate(engine, args.ticks)
+        cold, session_ticks = catch_up(stocks, args.tick_seconds)
+        rate, p50, p99, reads = read_latency(engine, args.readers, args.duration)
+
+        print(f"{size} symbols")
+        print(f"  advance() per tick:              {per_tick * 1e6:10.1f} us  ({1 / per_tick:,.0f} ticks/s)")
+        print(f"  catch up a full session:         {cold * 1000:10.1f} ms  ({session_ticks:,} ticks)")
+        print(f"  ticks/s with {args.readers} readers:          {rate:10,.0f}")
+        print(f"  snapshot read p50 / p99:         {p50 / 1000:10.2f} / {p99 / 1000:.2f} us  ({reads:,} reads)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""CPU per /api/stocks poll: rebuilding the JSON vs the versioned quote cache.
+
+For a synthetic universe of each --instruments size, times one poll of the
+full quote list as app.py used to serve it (a list of dicts through
+jsonify), then from QuoteCache: a cached 200, a cached gzip 200 and a 304
+revalidation, all through a minimal Flask app with a test client so request
+handling is included. Also reports the once-per-tick cost of encoding and
+compressing the list, and the body sizes.
+
+    python benchmarks/bench_quote_cache.py --instruments 10 1000 10000 --polls 2000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask, jsonify, request  # noqa: E402
+
+import quote_cache  # noqa: E402
+from prices import static_snapshot  # noqa: E402
+
+
+def universe(size):
+    return {f'S{i:06d}': {'name': f'Company {i} Inc.', 'price': round(10 + (i * 7919) % 990 + i % 100 / 100, 2),
+                          'change': round((i % 601 - 300) / 100, 2)} for i in range(size)}
+
+
+def make_app(snapshot):
+    app = Flask(__name__)
+    cache = quote_cache.QuoteCache()
+
+    @app.route('/old')
+    def old():
+        return jsonify([{'symbol': symbol, 'name': q['name'], 'price': q['price'], 'change': q['change']}
+                        for symbol, q in snapshot.quotes().items()])
+
+    @app.route('/cached')
+    def cached():
+        body = cache.stocks(snapshot)
+        variant = body.encoded('gzip') if request.accept_encodings['gzip'] else None
+        data, etag = variant or (body.body, body.etag)
+        if request.if_none_match.contains(etag):
+            response = app.response_class(status=304)
+        else:
+            response = app.response_class(data, mimetype='application/json')
+            if variant:
+                response.content_encoding = 'gzip'
+        response.set_etag(etag)
+        return response
+
+    return app, cache
+
+
+def per_poll(client, path, polls, headers=None):
+    client.get(path, headers=headers)
+    started = time.perf_counter()
+    for _ in range(polls):
+        response = client.get(path, headers=headers)
+    return (time.perf_counter() - started) / polls * 1e6, response
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--instruments', type=int, nargs='+', default=[10, 1000, 10000])
+    parser.add_argument('--polls', type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"{'instruments':>11}{'rebuild us':>12}{'cached us':>11}{'gzip us':>9}{'304 us':>8}"
+          f"{'per tick ms':>13}{'json KB':>9}{'gzip KB':>9}")
+    for size in args.instruments:
+        snapshot = static_snapshot(universe(size))
+        app, cache = make_app(snapshot)
+        client = app.test_client()
+        polls = max(20, args.polls * 10 // max(10, size // 100))  # fewer polls of the slow path on big lists
+        rebuild, _ = per_poll(client, '/old', polls)
+        cached, plain = per_poll(client, '/cached', polls)
+        gzipped, compressed = per_poll(client, '/cached', polls, {'Accept-Encoding': 'gzip'})
+        not_modified, response = per_poll(client, '/cached', polls, {'If-None-Match': plain.headers['ETag']})
+        assert response.status_code == 304 and compressed.headers['Content-Encoding'] == 'gzip'
+
+        started = time.perf_counter()
+        body = quote_cache.QuoteCache().stocks(snapshot)
+        body.encoded('gzip')
+        body.encoded('br')
+        tick_ms = (time.perf_counter() - started) * 1000
+        print(f"{size:>11,}{rebuild:>12,.0f}{cached:>11,.0f}{gzipped:>9,.0f}{not_modified:>8,.0f}"
+              f"{tick_ms:>13,.1f}{len(plain.data) / 1024:>9,.0f}{len(compressed.data) / 1024:>9,.0f}")
+    if quote_cache.brotli is None:
+        print('(brotli not installed: per tick ms covers JSON and gzip only)')
+
+
+if __name__ == '__main__':
+    main()
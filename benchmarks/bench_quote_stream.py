@@ -0,0 +1,115 @@
+"""Load test: concurrent /api/stream/quotes subscribers on one worker.
+
+Starts the app in a separate process (one threaded server, i.e. one worker
+with a thread per stream) with a fast price tick, then opens N streams
+from an asyncio client. Once all are connected it counts, per stream, the
+ticks received and the delay between a tick's timestamp and its arrival.
+A stream keeps up when it sees (almost) every tick at a low delay.
+
+    python benchmarks/bench_quote_stream.py --subscribers 100 500 1000 --tick 0.25
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _serve(workdir, tick, max_subscribers, ready):
+    os.environ['DATA_FILE'] = os.path.join(workdir, 'trading_data.json')
+    os.environ['SESSION_DB_FILE'] = os.path.join(workdir, 'sessions.db')
+    os.environ['PRICE_TICK_SECONDS'] = str(tick)
+    os.environ['STREAM_MAX_SUBSCRIBERS'] = str(max_subscribers)
+    sys.path.insert(0, ROOT)
+    import app as trading_app
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    WSGIRequestHandler.log_request = lambda *args, **kwargs: None
+    server = make_server('127.0.0.1', 0, trading_app.app, threaded=True)
+    server.socket.listen(4096)
+    cookie = trading_app.session_manager.new_id()
+    trading_app.session_manager.save(cookie, {'username': 'bench'})
+    ready.put((server.server_port, cookie))
+    server.serve_forever()
+
+
+async def _connect(port, cookie, symbols):
+    """Open one stream and wait for its first event; None if the server refused it"""
+    reader, writer = await asyncio.open_connection('127.0.0.1', port, limit=1 << 20)
+    query = f'?symbols={symbols}' if symbols else ''
+    writer.write(f'GET /api/stream/quotes{query} HTTP/1.1\r\nHost: bench\r\nCookie: session={cookie}\r\n\r\n'.encode())
+    await writer.drain()
+    if b' 200 ' not in await reader.readline():
+        writer.close()
+        return None
+    while not (await reader.readline()).startswith(b'data: '):
+        pass
+    return reader, writer
+
+
+async def _subscriber(stream, stop_at, stats):
+    reader, writer = stream
+    ticks, delays = 0, []
+    try:
+        while time.time() < stop_at:
+            line = await asyncio.wait_for(reader.readline(), timeout=max(0.1, stop_at - time.time()))
+            if line.startswith(b'data: '):
+                ticks += 1
+                delays.append(time.time() - json.loads(line[6:])['timestamp'])
+    except asyncio.TimeoutError:
+        pass
+    finally:
+        writer.close()
+    stats['ticks'].append(ticks)
+    stats['delays'].extend(delays)
+
+
+async def _run(port, cookie, subscribers, symbols, duration):
+    streams = await asyncio.gather(*(_connect(port, cookie, symbols) for _ in range(subscribers)))
+    stats = {'ticks': [], 'delays': [], 'rejected': streams.count(None)}
+    stop_at = time.time() + duration
+    await asyncio.gather(*(_subscriber(stream, stop_at, stats) for stream in streams if stream))
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--subscribers', type=int, nargs='+', default=[100, 500, 1000])
+    parser.add_argument('--tick', type=float, default=0.25, help='price tick in seconds')
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--symbols', default='', help='comma-separated subscription (default all)')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench-stream-')
+    ready = multiprocessing.Queue()
+    server = multiprocessing.Process(target=_serve, args=(workdir, args.tick, max(args.subscribers), ready),
+                                     daemon=True)
+    server.start()
+    port, cookie = ready.get(timeout=60)
+    expected = args.duration / args.tick
+
+    print(f"tick {args.tick}s for {args.duration}s (~{expected:.0f} ticks per stream), "
+          f"symbols: {args.symbols or 'all'}")
+    print(f"{'streams':>8}{'rejected':>10}{'ticks p50':>11}{'ticks min':>11}{'delay p50':>11}{'delay p99':>11}")
+    try:
+        for count in args.subscribers:
+            stats = asyncio.run(_run(port, cookie, count, args.symbols, args.duration))
+            delays = sorted(stats['delays']) or [float('nan')]
+            ticks = stats['ticks'] or [0]
+            print(f"{count:>8}{stats['rejected']:>10}{statistics.median(ticks):>11.0f}{min(ticks):>11}"
+                  f"{statistics.median(delays) * 1000:>9.1f}ms{delays[int(len(delays) * 0.99)] * 1000:>9.1f}ms")
+            time.sleep(1)  # let the server notice the closed streams
+    finally:
+        server.terminate()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
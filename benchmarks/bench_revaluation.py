@@ -0,0 +1,87 @@
+"""Bulk revaluation: per-user Python loop vs. HoldingsMatrix.
+
+Generates --users synthetic accounts holding a random subset of --symbols
+symbols, then times a full revaluation (market value, P&L, total value)
+plus a top-10 leaderboard both ways.
+
+    python benchmarks/bench_revaluation.py --users 100000 --symbols 8
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from holdings_matrix import HoldingsMatrix  # noqa: E402
+from money import micros_to_cents, to_cents  # noqa: E402
+
+
+def synthetic_accounts(users, symbols):
+    rng = random.Random(7)
+    for i in range(users):
+        portfolio = {
+            symbol: {'shares': rng.randint(1, 500), 'avg_micros': rng.randint(20_000_000, 900_000_000)}
+            for symbol in rng.sample(symbols, rng.randint(0, len(symbols)))
+        }
+        yield f'user{i}', {'balance_cents': rng.randint(0, 1_000_000), 'portfolio': portfolio}
+
+
+def python_revalue(accounts, prices):
+    cents = {symbol: to_cents(price) for symbol, price in prices.items()}
+    results = []
+    for username, record in accounts:
+        market_value = cost_micros = 0
+        for symbol, holding in record['portfolio'].items():
+            market_value += cents[symbol] * holding['shares']
+            cost_micros += holding['avg_micros'] * holding['shares']
+        results.append((username, record['balance_cents'] + market_value,
+                        market_value - micros_to_cents(cost_micros)))
+    leaderboard = sorted(results, key=lambda r: r[1], reverse=True)[:10]
+    return results, leaderboard
+
+
+def best_of(fn, repeat=5):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=100_000)
+    parser.add_argument('--symbols', type=int, default=8)
+    args = parser.parse_args()
+
+    symbols = [f'SYM{i}' for i in range(args.symbols)]
+    accounts = list(synthetic_accounts(args.users, symbols))
+    rng = random.Random(11)
+    prices = {symbol: round(rng.uniform(20, 900), 2) for symbol in symbols}
+
+    started = time.perf_counter()
+    matrix = HoldingsMatrix.from_accounts(accounts, symbols)
+    build = time.perf_counter() - started
+
+    def vectorized():
+        result = matrix.revalue(prices)
+        return result, matrix.leaderboard(result['total_value'], 10)
+
+    loop_time = best_of(lambda: python_revalue(accounts, prices))
+    numpy_time = best_of(vectorized)
+
+    (_, expected), (_, actual) = python_revalue(accounts, prices), vectorized()
+    assert [(name, total) for name, total, _ in expected] == actual
+
+    print(f"{args.users} users x {args.symbols} symbols")
+    print(f"matrix build (once per holdings change): {build * 1000:8.1f} ms")
+    print(f"python loop revalue + leaderboard:       {loop_time * 1000:8.1f} ms")
+    print(f"vectorized revalue + leaderboard:        {numpy_time * 1000:8.1f} ms  "
+          f"({loop_time / numpy_time:.0f}x faster)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""Per-request session check: signed cookie vs server-side stores.
+
+Times SessionInterface.open_session(), the work Flask does before every
+request to find out who is logged in, for Flask's signed-cookie sessions and
+for sessions.py with each store, with the in-process cache (hot) and without
+it (every check reads the store). Then fills each store with --sessions
+sessions, half of them expired, and times one bulk sweep.
+
+    python benchmarks/bench_sessions.py --checks 100000 --sessions 100000
+    python benchmarks/bench_sessions.py --redis-url redis://localhost:6379/15
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask  # noqa: E402
+from flask.sessions import SecureCookieSessionInterface  # noqa: E402
+
+from sessions import MemorySessionStore, ServerSessionInterface, SessionManager, SQLiteSessionStore, open_session_store  # noqa: E402,E501
+
+
+class FakeRequest:
+    def __init__(self, cookies):
+        self.cookies = cookies
+
+
+def time_checks(interface, app, request, checks):
+    """Microseconds per open_session(); asserts the user is found"""
+    assert interface.open_session(app, request).get('username') == 'alice'
+    started = time.perf_counter()
+    for _ in range(checks):
+        interface.open_session(app, request)
+    return (time.perf_counter() - started) / checks * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--checks', type=int, default=100_000)
+    parser.add_argument('--sessions', type=int, default=100_000, help='sessions in the sweep test')
+    parser.add_argument('--redis-url', help='also test RedisSessionStore (the database is written to)')
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    app.secret_key = 'bench'
+    data = {'username': 'alice'}
+
+    cookie_interface = SecureCookieSessionInterface()
+    signed = cookie_interface.get_signing_serializer(app).dumps(data)
+    us = time_checks(cookie_interface, app, FakeRequest({'session': signed}), args.checks)
+    print(f"{'store':22}{'hot us':>9}{'cold us':>10}{'sweep':>22}")
+    print(f"{'signed cookie':22}{us:>9.2f}{us:>10.2f}{'(cannot revoke)':>22}")
+
+    workdir = tempfile.mkdtemp(prefix='bench-sessions-')
+    stores = [('memory', MemorySessionStore), ('sqlite', lambda: SQLiteSessionStore(os.path.join(workdir, 's.db')))]
+    if args.redis_url:
+        stores.append(('redis', lambda: open_session_store(args.redis_url)))
+    for label, make_store in stores:
+        store = make_store()
+        results = []
+        for cache_seconds in (60, 0):
+            manager = SessionManager(store, cache_seconds=cache_seconds)
+            sid = manager.new_id()
+            manager.save(sid, data)
+            interface = ServerSessionInterface(manager)
+            results.append(time_checks(interface, app, FakeRequest({'session': sid}), args.checks))
+
+        manager = SessionManager(store, ttl=3600)
+        now = time.time()
+        for i in range(args.sessions):
+            store.save(manager.new_id(), f'user{i % 1000}', {'username': f'user{i % 1000}'},
+                       now - 1 if i % 2 else now + 3600)
+        started = time.perf_counter()
+        removed = manager.sweep(now)
+        sweep = f"{removed:,} in {(time.perf_counter() - started) * 1000:.0f} ms"
+        print(f"{label:22}{results[0]:>9.2f}{results[1]:>10.2f}{sweep:>22}")
+
+
+if __name__ == '__main__':
+    main()
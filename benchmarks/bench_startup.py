@@ -0,0 +1,73 @@
+"""Cold start: time to import app.py in a fresh interpreter.
+
+Each run starts a new Python process in local mode (no DynamoDB, no SNS)
+against an empty data directory and times `import app`. It also reports
+whether boto3 got imported. --baseline REF measures the same for an
+older commit, exported with `git archive`, for a before/after comparison.
+
+    python benchmarks/bench_startup.py --runs 10 --baseline HEAD~1
+"""
+import argparse
+import io
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = '''
+import sys, time
+started = time.perf_counter()
+import app
+print(time.perf_counter() - started, 'boto3' in sys.modules)
+'''
+
+
+def export(ref, target):
+    archive = subprocess.run(['git', 'archive', ref], cwd=ROOT, check=True, capture_output=True).stdout
+    with tarfile.open(fileobj=io.BytesIO(archive)) as tar:
+        tar.extractall(target)
+
+
+def measure(source_dir, runs):
+    timings, boto3_loaded = [], False
+    with tempfile.TemporaryDirectory(prefix='bench-startup-') as workdir:
+        env = dict(os.environ, PYTHONPATH=source_dir, PYTHONDONTWRITEBYTECODE='1', USE_DYNAMODB='false',
+                   DATA_FILE=os.path.join(workdir, 'trading_data.json'))
+        for _ in range(runs):
+            out = subprocess.run([sys.executable, '-c', PROBE], cwd=workdir, env=env,
+                                 check=True, capture_output=True, text=True).stdout.split()
+            timings.append(float(out[-2]))
+            boto3_loaded = out[-1] == 'True'
+    return statistics.median(timings), min(timings), boto3_loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--baseline', help='git ref to compare against, e.g. HEAD~1')
+    args = parser.parse_args()
+
+    targets = [('working tree', ROOT)]
+    exported = None
+    if args.baseline:
+        exported = tempfile.mkdtemp(prefix='bench-startup-src-')
+        export(args.baseline, exported)
+        targets.insert(0, (args.baseline, exported))
+
+    print(f"{'source':16}{'median':>10}{'best':>10}  boto3 imported")
+    try:
+        for label, source_dir in targets:
+            median, best, boto3_loaded = measure(source_dir, args.runs)
+            print(f"{label:16}{median * 1000:>8.0f}ms{best * 1000:>8.0f}ms  {boto3_loaded}")
+    finally:
+        if exported:
+            shutil.rmtree(exported, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""Type-ahead latency of SymbolIndex at 10k and 100k instruments.
+
+Generates a universe of random 1-5 letter symbols with company names drawn
+from a word list, builds the index, then times a mix of queries of the kind
+a search box sends while someone types: one or two letters, whole symbols,
+name words, two-word name prefixes and misses. A linear scan over every
+symbol and name, which is what filtering the whole universe in the page
+amounts to, is timed on the same queries for comparison.
+
+    python benchmarks/bench_symbol_search.py --instruments 10000 100000 --queries 20000
+"""
+import argparse
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from search import SymbolIndex  # noqa: E402
+
+WORDS = ('advanced', 'alpha', 'american', 'applied', 'atlantic', 'bio', 'blue', 'capital', 'cloud', 'consolidated',
+         'digital', 'dynamic', 'energy', 'first', 'general', 'global', 'green', 'health', 'international',
+         'logistics', 'marine', 'medical', 'micro', 'national', 'northern', 'pacific', 'pharma', 'power', 'quantum',
+         'resources', 'river', 'semiconductor', 'solar', 'southern', 'standard', 'systems', 'therapeutics',
+         'united', 'venture', 'western')
+SUFFIXES = ('Inc.', 'Corp.', 'Holdings', 'Group', 'Ltd.', 'Technologies', 'Partners', 'Co.')
+
+
+def universe(size, rng):
+    stocks = {}
+    while len(stocks) < size:
+        symbol = ''.join(rng.choices(string.ascii_uppercase, k=rng.randint(1, 5)))
+        name = ' '.join(word.capitalize() for word in rng.sample(WORDS, rng.randint(1, 3)))
+        stocks[symbol] = {'name': f'{name} {rng.choice(SUFFIXES)}'}
+    return stocks
+
+
+def queries(stocks, count, rng):
+    symbols = list(stocks)
+    mix = []
+    for i in range(count):
+        kind = i % 6
+        if kind == 0:
+            mix.append(rng.choice(string.ascii_lowercase))
+        elif kind == 1:
+            mix.append(rng.choice(symbols)[:2])
+        elif kind == 2:
+            mix.append(rng.choice(symbols))
+        elif kind == 3:
+            mix.append(rng.choice(WORDS)[:rng.randint(2, 6)])
+        elif kind == 4:
+            words = stocks[rng.choice(symbols)]['name'].lower().split()
+            mix.append(f'{words[0]} {words[-1][:2]}')
+        else:
+            mix.append('zz' + ''.join(rng.choices(string.ascii_lowercase, k=4)))
+    return mix
+
+
+def linear_search(entries, query, limit):
+    """Every symbol or name containing the query, as the page filtered before"""
+    upper, lower = query.upper(), query.lower()
+    return [symbol for symbol, name in entries if upper in symbol or lower in name][:limit]
+
+
+def latencies(search, mix, limit):
+    timings = []
+    for query in mix:
+        started = time.perf_counter()
+        search(query, limit)
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    return timings[len(timings) // 2] * 1e6, timings[int(len(timings) * 0.99)] * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--instruments', type=int, nargs='+', default=[10_000, 100_000])
+    parser.add_argument('--queries', type=int, default=20_000)
+    parser.add_argument('--limit', type=int, default=10)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    print(f"{'instruments':>11}{'build ms':>10}{'p50 us':>9}{'p99 us':>9}{'scan p50 us':>13}{'scan p99 us':>13}")
+    for size in args.instruments:
+        stocks = universe(size, rng)
+        started = time.perf_counter()
+        index = SymbolIndex(stocks)
+        build_ms = (time.perf_counter() - started) * 1000
+        mix = queries(stocks, args.queries, rng)
+        p50, p99 = latencies(index.search, mix, args.limit)
+        entries = [(symbol, data['name'].lower()) for symbol, data in stocks.items()]
+        scan_mix = mix[:max(60, args.queries * 1000 // size)]  # the scan is slow; fewer queries
+        scan50, scan99 = latencies(lambda query, limit: linear_search(entries, query, limit), scan_mix, args.limit)
+        print(f"{size:>11,}{build_ms:>10,.0f}{p50:>9.1f}{p99:>9.1f}{scan50:>13,.0f}{scan99:>13,.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""Streaming transaction export: throughput and peak memory vs loading everything.
+
+Fills a fresh store with --rows transactions spread over --users users, then
+runs the admin export (every user's rows as CSV, through the same generator
+the /api/admin/transactions/export response iterates) and a one-user
+export (after the JSON store has indexed the log, as the history page
+does), and compares both with store.load_all(), which the export replaces.
+Peak memory is measured with tracemalloc in a second pass, so the rows/s
+figures are not slowed by it.
+
+    python benchmarks/bench_transaction_export.py --backend json --rows 500000 --users 1000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def fill(store, users, rows, make_transaction):
+    from storage import new_user_record
+    for u in range(users):
+        store.create_user(f'user{u}', new_user_record())
+    per_commit = 1000
+    for first in range(0, rows, per_commit):
+        ops = []
+        for i in range(first, min(rows, first + per_commit)):
+            def record_trade(record, i=i):
+                return None, [make_transaction('BUY', 'AAPL', 1 + i % 10, 18245, 18245 * (1 + i % 10))]
+            ops.append((f'user{i % users}', record_trade))
+        store.mutate_users(ops)
+
+
+def drain(chunks):
+    size = 0
+    for chunk in chunks:
+        size += len(chunk)
+    return size
+
+
+def measure(fn):
+    started = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - started
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--backend', choices=['json', 'sqlite'], default='json')
+    parser.add_argument('--rows', type=int, default=200_000)
+    parser.add_argument('--users', type=int, default=1000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench-export-')
+    os.environ['STORAGE_BACKEND'] = args.backend
+    os.environ['DATA_FILE'] = os.path.join(workdir, 'trading_data.json')
+    os.environ['SQLITE_FILE'] = os.path.join(workdir, 'trading_data.db')
+    os.environ['SESSION_DB_FILE'] = os.path.join(workdir, 'sessions.db')
+    os.environ['PRICE_TICK_SECONDS'] = '0'
+    sys.path.insert(0, ROOT)
+    import app as trading_app
+    from trading import make_transaction
+
+    store = trading_app.store
+    started = time.perf_counter()
+    fill(store, args.users, args.rows, make_transaction)
+    print(f"{args.backend}: {args.rows:,} transactions of {args.users:,} users (filled in "
+          f"{time.perf_counter() - started:.0f}s)")
+    store.get_transactions_page('user0', limit=1)  # builds the JSON store's row index, as the history page does
+    print(f"{'':22}{'rows/s':>12}{'peak MB':>10}")
+    cases = [
+        ('export all (CSV)', lambda: drain(trading_app.export_rows(store.iter_transactions(), 'csv', True))),
+        ('export one user', lambda: drain(trading_app.export_rows(store.iter_transactions('user0'), 'csv', False))),
+        ('load_all()', lambda: sum(len(r['transactions']) for r in store.load_all().values())),
+    ]
+    for label, fn in cases:
+        _, elapsed, peak = measure(fn)
+        rows = args.rows // args.users if 'one user' in label else args.rows
+        print(f"{label:22}{rows / elapsed:>12,.0f}{peak / 2 ** 20:>10,.1f}")
+    trading_app.notifier.close()
+
+
+if __name__ == '__main__':
+    main()
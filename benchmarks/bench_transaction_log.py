@@ -0,0 +1,114 @@
+"""Size and parse time: legacy indented JSON vs. compact document + NDJSON log.
+
+Builds a synthetic dataset (1M transactions spread over --users accounts by
+default) and compares the legacy trading_data.json layout against JSONStore's
+layout on disk size, full parse time, one-user history read and the cost of
+recording one more trade.
+
+    python benchmarks/bench_transaction_log.py --transactions 1000000 --users 1000
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage import JSONStore, new_user_record  # noqa: E402
+from trading import make_transaction  # noqa: E402
+
+
+def synthetic_data(transactions, users):
+    rng = random.Random(42)
+    symbols = ['AAPL', 'GOOGL', 'MSFT', 'AMZN', 'TSLA', 'META', 'NFLX', 'NVIDIA']
+    data = {f'user{i}': dict(new_user_record('x'), transactions=[]) for i in range(users)}
+    names = list(data)
+    start = datetime(2025, 1, 1)
+    for i in range(transactions):
+        price_cents = rng.randint(5_000, 90_000)
+        quantity = rng.randint(1, 50)
+        data[names[rng.randrange(users)]]['transactions'].append({
+            'id': str(uuid.UUID(int=rng.getrandbits(128))),
+            'type': rng.choice(('BUY', 'SELL')),
+            'symbol': rng.choice(symbols),
+            'quantity': quantity,
+            'price_cents': price_cents,
+            'total_cents': price_cents * quantity,
+            'timestamp': (start + timedelta(seconds=i)).isoformat(),
+            'status': 'CONFIRMED'
+        })
+    return data
+
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--transactions', type=int, default=1_000_000)
+    parser.add_argument('--users', type=int, default=1000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench-txlog-')
+    data = synthetic_data(args.transactions, args.users)
+
+    legacy_path = os.path.join(workdir, 'legacy.json')
+    with open(legacy_path, 'w') as f:
+        json.dump(data, f, indent=2)
+
+    store = JSONStore(os.path.join(workdir, 'trading_data.json'))
+    store.save_all(data)
+    del data
+
+    legacy_size = os.path.getsize(legacy_path)
+    doc_size = os.path.getsize(store.path)
+    log_size = os.path.getsize(store.log_path)
+
+    def legacy_load():
+        with open(legacy_path) as f:
+            return json.load(f)
+
+    def log_rows():
+        with open(store.log_path, 'rb') as f:
+            return json.loads(b'[' + f.read().rstrip(b'\n').replace(b'\n', b',') + b']')
+
+    legacy, legacy_parse = timed(legacy_load)
+    _, rows_parse = timed(log_rows)
+    _, new_parse = timed(store.load_all)
+    _, legacy_user = timed(lambda: legacy_load()['user7']['transactions'])
+    _, new_user = timed(lambda: JSONStore(store.path).get_transactions('user7'))
+
+    transaction = make_transaction('BUY', 'AAPL', 1, 18245, 18245)
+
+    def legacy_append():
+        legacy['user7']['transactions'].append(transaction)
+        with open(legacy_path, 'w') as f:
+            json.dump(legacy, f, indent=2)
+
+    _, legacy_trade = timed(legacy_append)
+    record = store.get_user('user7')
+    _, new_trade = timed(lambda: store.save_user('user7', record, [transaction]))
+
+    mb = 1024 * 1024
+    print(f"{args.transactions} transactions across {args.users} users")
+    print(f"{'':24}{'legacy JSON':>14}{'doc + log':>14}")
+    print(f"{'size on disk (MB)':24}{legacy_size / mb:>14.1f}{(doc_size + log_size) / mb:>14.1f}")
+    print(f"{'parse raw rows (s)':24}{legacy_parse:>14.2f}{rows_parse:>14.2f}")
+    print(f"{'load_all() as dicts (s)':24}{legacy_parse:>14.2f}{new_parse:>14.2f}")
+    print(f"{'one user history (s)':24}{legacy_user:>14.2f}{new_user:>14.2f}")
+    print(f"{'record one trade (s)':24}{legacy_trade:>14.3f}{new_trade:>14.3f}")
+
+    shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,292 @@
+"""Trade execution against DynamoDB in one transactional write.
+
+A trade reads the user's balance and the one traded position in a single
+TransactGetItems, then commits everything in a single TransactWriteItems:
+
+  1. Users: set the new balance, on the condition that the balance is
+     still the one that was read
+  2. Portfolios: set (or remove) holdings.<symbol> and bump `version`, on
+     the condition that `version` is still the one that was read
+  3. Transactions: put the transaction record
+
+Either all three apply or none do. The balance and version conditions
+detect a concurrent trade on the same account, which rules out a double
+spend; the trade is then re-read and retried. That is two round trips
+instead of the five sequential calls the old path made.
+
+Amounts are computed in integer cents (money.py) and written as exact
+decimal strings, so the stored balance is always a whole number of cents.
+A balance left with float noise by older code fails the equality check
+once and is then replaced by its rounded value.
+
+With an account cache (account_cache.py) holding both items, the read is
+skipped: the conditional write checks the cached balance and version, so
+a stale entry only costs a retry from a fresh read. After the trade the
+cache is updated in place, so a hot account trades in one round trip.
+
+Transaction sort keys are "<timestamp>#<id>", so a Query on a user returns
+their history in time order.
+
+execute_batch() applies a list of trades the same way: one read of the
+balance and the whole holdings map, one TransactWriteItems with the new
+balance, the rewritten map and a Put per transaction, all or nothing.
+"""
+import random
+import time
+
+from account_cache import portfolio_key, user_key
+from aws_clients import PORTFOLIOS_TABLE, TRANSACTIONS_TABLE, USERS_TABLE
+from holdings_codec import Position, decode_holdings, decode_position, encode_holdings, fill, position_update
+from money import CENTS, format_fixed, to_cents
+from trading import BatchError, TradeError, batch_order, make_transaction
+
+MAX_ATTEMPTS = 5
+MAX_TRANSACT_ITEMS = 100  # TransactWriteItems limit: the balance, the portfolio and one Put per trade
+
+
+def _num(value):
+    return {'N': str(value)}
+
+
+def _dollars(cents):
+    """int cents -> exact DynamoDB number in dollars"""
+    return {'N': format_fixed(cents, CENTS)}
+
+
+def transaction_item(username, transaction):
+    """Transactions-table item for a record built by make_transaction()"""
+    return {
+        'username': {'S': username},
+        'transaction_id': {'S': f"{transaction['timestamp']}#{transaction['id']}"},
+        'id': {'S': transaction['id']},
+        'type': {'S': transaction['type']},
+        'symbol': {'S': transaction['symbol']},
+        'quantity': _num(transaction['quantity']),
+        'price': _dollars(transaction['price_cents']),
+        'total': _dollars(transaction['total_cents']),
+        'timestamp': {'S': transaction['timestamp']},
+        'status': {'S': transaction['status']},
+    }
+
+
+def _read(client, username, symbol):
+    """(balance as stored, version, position or None, holdings) in one consistent read.
+
+    holdings is None unless the portfolio has no version yet (a new or
+    legacy item), in which case the whole map is read so it can be rewritten.
+    """
+    response = client.transact_get_items(TransactItems=[
+        {'Get': {'TableName': USERS_TABLE, 'Key': {'username': {'S': username}},
+                 'ProjectionExpression': 'balance'}},
+        {'Get': {'TableName': PORTFOLIOS_TABLE, 'Key': {'username': {'S': username}},
+                 'ProjectionExpression': '#v, holdings.#s',
+                 'ExpressionAttributeNames': {'#v': 'version', '#s': symbol}}},
+    ])
+    user, portfolio = (r.get('Item') for r in response['Responses'])
+    if not user:
+        raise TradeError('User not found')
+    balance = user.get('balance', {'N': '0'})['N']  # the exact string, for the write condition
+    if portfolio and 'version' in portfolio:
+        held = portfolio.get('holdings', {'M': {}})['M'].get(symbol)
+        return balance, int(portfolio['version']['N']), decode_position(held) if held else None, None
+
+    item = client.get_item(TableName=PORTFOLIOS_TABLE, Key={'username': {'S': username}},
+                           ProjectionExpression='holdings', ConsistentRead=True).get('Item', {})
+    holdings = decode_holdings(item.get('holdings', {'M': {}}))
+    return balance, None, holdings.get(symbol), holdings
+
+
+def _cached_state(cache, username):
+    """(user, portfolio) items from the cache, or None unless both are there and versioned"""
+    if cache is None:
+        return None
+    found = cache.get_many([user_key(username), portfolio_key(username)])
+    user, portfolio = found.get(user_key(username)), found.get(portfolio_key(username))
+    if not user or not portfolio or 'balance_cents' not in user or 'version' not in portfolio:
+        return None
+    return user, portfolio
+
+
+def _write_through(cache, since, username, user, portfolio, balance_cents, symbol, position):
+    """Store the post-trade items, unless something invalidated the cache since `since`"""
+    holdings = dict(portfolio['holdings'])
+    if position is None:
+        holdings.pop(symbol, None)
+    else:
+        holdings[symbol] = position
+    cache.set(user_key(username), dict(user, balance_cents=balance_cents), since)
+    cache.set(portfolio_key(username), dict(portfolio, holdings=holdings, version=portfolio['version'] + 1), since)
+
+
+def _check(trade_type, balance_cents, position, quantity, total_cents):
+    """Error message if the trade is not possible, else None"""
+    if trade_type == 'BUY':
+        return 'Insufficient balance' if total_cents > balance_cents else None
+    if position is None:
+        return 'You do not own this stock'
+    if quantity > position.shares:
+        return f"Insufficient shares. You own {position.shares}"
+    return None
+
+
+def _portfolio_update(username, symbol, version, position, holdings):
+    """Update item writing the new position (None removes it) and the next version"""
+    if version is None:
+        # first versioned write: replace the whole map read in _read()
+        if position is None:
+            holdings.pop(symbol, None)
+        else:
+            holdings[symbol] = position
+        return _holdings_update(username, None, holdings)
+
+    # only the traded symbol's map entry is written
+    return dict(position_update(symbol, position, sets=['#v = :next'], names={'#v': 'version'},
+                                values={':v': _num(version), ':next': _num(version + 1)}),
+                TableName=PORTFOLIOS_TABLE, Key={'username': {'S': username}}, ConditionExpression='#v = :v')
+
+
+def _holdings_update(username, version, holdings):
+    """Update item replacing the whole holdings map, conditioned on `version` (None: not versioned yet)"""
+    update = {'TableName': PORTFOLIOS_TABLE, 'Key': {'username': {'S': username}},
+              'UpdateExpression': 'SET holdings = :h, #v = :next',
+              'ExpressionAttributeNames': {'#v': 'version'},
+              'ExpressionAttributeValues': {':h': encode_holdings(holdings), ':next': _num((version or 0) + 1)}}
+    if version is None:
+        update['ConditionExpression'] = 'attribute_not_exists(#v)'
+    else:
+        update['ConditionExpression'] = '#v = :v'
+        update['ExpressionAttributeValues'][':v'] = _num(version)
+    return update
+
+
+def _execute(client, username, trade_type, symbol, quantity, price_cents, cache=None):
+    from botocore.exceptions import ClientError
+
+    total = price_cents * quantity
+    for attempt in range(MAX_ATTEMPTS):
+        since = cache.mark() if cache is not None else None
+        cached = _cached_state(cache, username) if attempt == 0 else None
+        if cached:
+            user, portfolio = cached
+            balance, version, holdings = user['balance_cents'], int(portfolio['version']), None
+            stored_balance = _dollars(balance)
+            held = portfolio['holdings'].get(symbol)
+            position = Position(*held) if held else None  # a list once it has been through JSON
+        else:
+            text, version, position, holdings = _read(client, username, symbol)
+            balance, stored_balance = to_cents(text), {'N': text}
+
+        error = _check(trade_type, balance, position, quantity, total)
+        if error:
+            if cached:
+                continue  # the cache may predate a trade made by another worker
+            raise TradeError(error)
+
+        new_balance = balance - total if trade_type == 'BUY' else balance + total
+        new_position = fill(position, trade_type, quantity, price_cents)
+        transaction = make_transaction(trade_type, symbol, quantity, price_cents, total)
+
+        try:
+            client.transact_write_items(TransactItems=[
+                {'Update': {'TableName': USERS_TABLE, 'Key': {'username': {'S': username}},
+                            'UpdateExpression': 'SET balance = :n', 'ConditionExpression': 'balance = :b',
+                            'ExpressionAttributeValues': {':n': _dollars(new_balance), ':b': stored_balance}}},
+                {'Update': _portfolio_update(username, symbol, version, new_position, holdings)},
+                {'Put': {'TableName': TRANSACTIONS_TABLE, 'Item': transaction_item(username, transaction),
+                         'ConditionExpression': 'attribute_not_exists(transaction_id)'}},
+            ])
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'TransactionCanceledException':
+                raise
+            if cached:
+                cache.delete(user_key(username), portfolio_key(username))  # stale; retry from a fresh read
+                continue
+            # a concurrent trade moved the balance or portfolio (or a transaction conflict): re-read and retry
+            time.sleep(random.uniform(0, 0.01 * 2 ** attempt))
+            continue
+
+        if cached:
+            _write_through(cache, since, username, user, portfolio, new_balance, symbol, new_position)
+        elif cache is not None:
+            cache.delete(user_key(username), portfolio_key(username))
+        return transaction, new_balance
+    raise TradeError('Portfolio is busy, please retry')
+
+
+def execute_buy(client, username, symbol, quantity, price_cents, cache=None):
+    """Atomically buy shares; returns (transaction, new_balance_cents) or raises TradeError"""
+    return _execute(client, username, 'BUY', symbol, quantity, price_cents, cache)
+
+
+def execute_sell(client, username, symbol, quantity, price_cents, cache=None):
+    """Atomically sell shares; returns (transaction, new_balance_cents) or raises TradeError"""
+    return _execute(client, username, 'SELL', symbol, quantity, price_cents, cache)
+
+
+def _read_all(client, username):
+    """(balance as stored, version or None, {symbol: Position}) in one consistent read"""
+    response = client.transact_get_items(TransactItems=[
+        {'Get': {'TableName': USERS_TABLE, 'Key': {'username': {'S': username}},
+                 'ProjectionExpression': 'balance'}},
+        {'Get': {'TableName': PORTFOLIOS_TABLE, 'Key': {'username': {'S': username}},
+                 'ProjectionExpression': '#v, holdings', 'ExpressionAttributeNames': {'#v': 'version'}}},
+    ])
+    user, portfolio = (r.get('Item') for r in response['Responses'])
+    if not user:
+        raise TradeError('User not found')
+    portfolio = portfolio or {}
+    version = int(portfolio['version']['N']) if 'version' in portfolio else None
+    return user.get('balance', {'N': '0'})['N'], version, decode_holdings(portfolio.get('holdings', {'M': {}}))
+
+
+def execute_batch(client, username, trades, cache=None):
+    """Execute [(type, symbol, quantity, price_cents)] all or nothing in one TransactWriteItems.
+
+    Sells run first so their proceeds fund the buys. Returns (transactions in
+    request order, new_balance_cents) or raises BatchError naming the first
+    order that cannot execute.
+    """
+    from botocore.exceptions import ClientError
+
+    if len(trades) + 2 > MAX_TRANSACT_ITEMS:
+        raise TradeError(f'At most {MAX_TRANSACT_ITEMS - 2} orders per batch')
+    for attempt in range(MAX_ATTEMPTS):
+        text, version, holdings = _read_all(client, username)
+        balance = to_cents(text)
+        transactions = [None] * len(trades)
+        puts = []
+        for i in batch_order(trades):
+            trade_type, symbol, quantity, price_cents = trades[i]
+            total = price_cents * quantity
+            position = holdings.get(symbol)
+            error = _check(trade_type, balance, position, quantity, total)
+            if error:
+                raise BatchError(i, error)
+            balance = balance - total if trade_type == 'BUY' else balance + total
+            position = fill(position, trade_type, quantity, price_cents)
+            if position is None:
+                del holdings[symbol]
+            else:
+                holdings[symbol] = position
+            transactions[i] = make_transaction(trade_type, symbol, quantity, price_cents, total)
+            puts.append({'Put': {'TableName': TRANSACTIONS_TABLE, 'Item': transaction_item(username, transactions[i]),
+                                 'ConditionExpression': 'attribute_not_exists(transaction_id)'}})
+
+        try:
+            client.transact_write_items(TransactItems=[
+                {'Update': {'TableName': USERS_TABLE, 'Key': {'username': {'S': username}},
+                            'UpdateExpression': 'SET balance = :n', 'ConditionExpression': 'balance = :b',
+                            'ExpressionAttributeValues': {':n': _dollars(balance), ':b': {'N': text}}}},
+                {'Update': _holdings_update(username, version, holdings)},
+                *puts,
+            ])
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'TransactionCanceledException':
+                raise
+            time.sleep(random.uniform(0, 0.01 * 2 ** attempt))
+            continue
+
+        if cache is not None:
+            cache.delete(user_key(username), portfolio_key(username))
+        return transactions, balance
+    raise TradeError('Portfolio is busy, please retry')
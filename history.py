@@ -0,0 +1,245 @@
+"""Precomputed OHLC price history, fed by the price engine.
+
+Bars are kept per resolution in fixed-size ring buffers of integer cents,
+stored as one contiguous [capacity x 4] slab per symbol, so a chart request
+is a slice copy. Bars are appended once, when their period completes; only
+the bar still forming is merged with the live price at read time.
+
+Everything is derived from the engine's deterministic paths rather than
+from ticks a worker happened to observe. A worker started this morning
+therefore serves the same five years of history as one started last week,
+and responses can carry an ETag that is valid across workers.
+
+5-minute bars carry the true tick high and low. Hourly, daily and weekly
+bars are sampled at the 5-minute closes.
+"""
+import threading
+from datetime import datetime, timezone
+
+try:
+    import numpy as np
+except ImportError:  # optional: HistoryStore needs the price engine, which needs numpy
+    np = None
+
+# resolution -> ring capacity (bars)
+RESOLUTIONS = {
+    '5min': 288,  # one day
+    '1h': 168,  # one week
+    '1d': 365,
+    '1wk': 260,  # five years
+}
+
+# chart timeframe -> (resolution, bars, label format)
+TIMEFRAMES = {
+    '5m': ('5min', 12, '%H:%M'),
+    '1d': ('5min', 288, '%H:%M'),
+    '1w': ('1h', 168, '%a %H:%M'),
+    '1m': ('1d', 30, '%m/%d'),
+    '1y': ('1d', 365, '%m/%d/%y'),
+    '5y': ('1wk', 260, '%m/%d/%y'),
+}
+
+
+def bar_labels(times, timeframe):
+    """Format bar start times (epoch seconds, UTC) for a chart axis"""
+    fmt = TIMEFRAMES[timeframe][2]
+    return [datetime.fromtimestamp(t, timezone.utc).strftime(fmt) for t in times]
+
+
+class _Ring:
+    """Fixed-capacity bar buffer for every symbol; oldest bars are overwritten"""
+
+    __slots__ = ('times', 'bars', 'head', 'count')
+
+    def __init__(self, capacity, symbols):
+        self.times = np.zeros(capacity, dtype=np.int64)
+        self.bars = np.zeros((symbols, capacity, 4), dtype=np.int32)  # open, high, low, close in cents
+        self.head = 0  # next slot to write
+        self.count = 0
+
+    def push(self, time, ohlc):
+        """Append one bar for all symbols; ohlc is [symbols x 4]"""
+        self.times[self.head] = time
+        self.bars[:, self.head, :] = ohlc
+        self.head = (self.head + 1) % len(self.times)
+        self.count = min(self.count + 1, len(self.times))
+
+    def tail(self, index, n):
+        """The last n bars of one symbol, oldest first: (times, [n x 4] cents)"""
+        n = min(n, self.count)
+        slots = (self.head - n + np.arange(n)) % len(self.times)
+        return self.times[slots], self.bars[index, slots]
+
+
+class HistoryStore:
+    """Per-resolution OHLC bars for every symbol of a PriceEngine"""
+
+    def __init__(self, engine, resolutions=RESOLUTIONS):
+        self.engine = engine
+        self._rings = {name: _Ring(capacity, len(engine.symbols)) for name, capacity in resolutions.items()}
+        self._forming = {}  # resolution -> (key, time, [symbols x 4] cents) for completed blocks so far
+        self._synced = None  # (session, block) of the first block not yet folded in
+        self._backfilling = False
+        self._backfilled = threading.Event()
+        self._start_lock = threading.Lock()  # not _lock: the backfill holds that throughout
+        self._lock = threading.Lock()
+
+    # -- period arithmetic ---------------------------------------------------
+
+    def _keys(self, resolution, session, blocks):
+        """Period key of each block in `blocks` (an int array) of one session"""
+        engine = self.engine
+        if resolution == '5min':
+            return session * engine.blocks_per_session + blocks
+        if resolution == '1h':
+            return (engine.block_time(session, blocks) // 3600).astype(np.int64)
+        if resolution == '1d':
+            return np.full(len(blocks), session, dtype=np.int64)
+        return np.full(len(blocks), (session + 3) // 7, dtype=np.int64)  # weeks start on Monday
+
+    def _period_time(self, resolution, key):
+        engine = self.engine
+        if resolution == '5min':
+            return int(engine.block_time(*divmod(int(key), engine.blocks_per_session)))
+        if resolution == '1h':
+            return int(key) * 3600
+        if resolution == '1d':
+            return int(key) * engine.session_seconds
+        return (7 * int(key) - 3) * engine.session_seconds
+
+    def _oldest_key(self, resolution, session, block):
+        """Key of the oldest period the ring keeps while (session, block) is current"""
+        return int(self._keys(resolution, session, np.array([block]))[0]) - self._rings[resolution].times.size
+
+    def _first_block(self, session, block):
+        """Where a cold store starts so that every ring fills up"""
+        start = min(self._period_time(resolution, self._oldest_key(resolution, session, block))
+                    for resolution in self._rings)
+        return max(0, start // self.engine.session_seconds), 0
+
+    # -- feeding -------------------------------------------------------------
+
+    def on_tick(self, snapshot):
+        """Price engine listener: fold in blocks that completed since the last tick.
+
+        The first call starts the backfill on its own thread so ticking goes on;
+        ticks that find the store busy are skipped, as the next sync catches up.
+        """
+        position = self.engine.position(snapshot.timestamp)
+        if not self._backfilled.is_set():
+            self._start_backfill(position)
+        elif not self._lock.locked():
+            self.sync(*position)
+
+    def _start_backfill(self, position):
+        with self._start_lock:
+            if self._backfilling:
+                return
+            self._backfilling = True
+        threading.Thread(target=self._backfill, args=position, daemon=True, name='history-backfill').start()
+
+    def _backfill(self, session, tick):
+        self.sync(session, tick)
+        self._backfilled.set()
+
+    def ready(self, snapshot, timeout=0):
+        """True once the backfill is done; starts it if no tick has yet (timeout: seconds to wait, e.g. in scripts)"""
+        if not self._backfilled.is_set():
+            self._start_backfill(self.engine.position(snapshot.timestamp))
+        return self._backfilled.wait(timeout)
+
+    def sync(self, session, tick):
+        """Fold every block completed before (session, tick) into the rings"""
+        block = tick // self.engine.block_ticks
+        with self._lock:
+            if self._synced is None:
+                self._synced = self._first_block(session, block)
+            s, b = self._synced
+            oldest = {resolution: self._oldest_key(resolution, session, block) for resolution in self._rings}
+            while (s, b) < (session, block):
+                end = block if s == session else self.engine.blocks_per_session
+                self._fold(s, b, end, oldest)
+                s, b = (s, end) if end < self.engine.blocks_per_session else (s + 1, 0)
+            self._synced = (s, b)
+
+    def _fold(self, session, start, end, oldest):
+        """Add completed blocks [start, end) of one session, skipping periods older than oldest[resolution]"""
+        engine = self.engine
+        blocks = np.arange(start, end)
+        closes = engine.to_cents(engine.session_levels(session)[start:end + 1])  # block boundaries
+
+        for resolution, ring in self._rings.items():
+            keys = self._keys(resolution, session, blocks)
+            wanted = keys >= oldest[resolution]
+            if not wanted.any():
+                continue
+            first = int(np.argmax(wanted))
+
+            if resolution == '5min':
+                for i in range(first, len(blocks)):
+                    ticks = engine.to_cents(engine.block_path(session, int(blocks[i])))
+                    bar = np.stack([ticks[0], ticks.max(axis=0), ticks.min(axis=0), ticks[-1]], axis=1)
+                    ring.push(self._period_time(resolution, keys[i]), bar)
+                continue
+
+            # split the blocks into runs of the same period
+            edges = [first, *(np.flatnonzero(np.diff(keys[first:])) + first + 1).tolist(), len(blocks)]
+            for i, j in zip(edges, edges[1:]):
+                window = closes[i:j + 1]
+                key = int(keys[i])
+                forming = self._forming.get(resolution)
+                if forming is not None and forming[0] == key:
+                    bar = forming[2]
+                    bar[:, 1] = np.maximum(bar[:, 1], window.max(axis=0))
+                    bar[:, 2] = np.minimum(bar[:, 2], window.min(axis=0))
+                    bar[:, 3] = window[-1]
+                    continue
+                if forming is not None:
+                    ring.push(forming[1], forming[2])
+                bar = np.stack([window[0], window.max(axis=0), window.min(axis=0), window[-1]], axis=1)
+                self._forming[resolution] = (key, self._period_time(resolution, key), bar)
+
+    # -- reading -------------------------------------------------------------
+
+    def series(self, symbol, timeframe, snapshot):
+        """Bars for a chart ending at the snapshot's tick: (times, [[o, h, l, c], ...] in dollars)
+
+        Until the backfill is done (see ready) only the bar in progress is
+        returned; the backfill is never run on the caller's thread.
+        """
+        engine = self.engine
+        resolution, count, _ = TIMEFRAMES[timeframe]
+        index = engine.index[symbol]
+        session, tick = engine.position(snapshot.timestamp)
+        block, offset = divmod(tick, engine.block_ticks)
+        backfilled = self._backfilled.is_set()
+        if backfilled:
+            self.sync(session, tick)  # blocks since the last tick, if any
+
+        # the period in progress: completed blocks (from _forming) plus the current block so far
+        path = engine.to_cents(engine.block_path(session, block)[:offset + 1, index], index)
+        if resolution == '5min':
+            live = [int(path[0]), int(path.max()), int(path.min()), int(path[-1])]
+        else:
+            start = int(engine.to_cents(engine.session_levels(session)[block, index], index))
+            live = [start, max(start, int(path[-1])), min(start, int(path[-1])), int(path[-1])]
+        key = int(self._keys(resolution, session, np.array([block]))[0])
+
+        times, bars = [], []
+        if backfilled:
+            with self._lock:
+                times, bars = self._rings[resolution].tail(index, count)
+                times, bars = times.tolist(), bars.tolist()
+                forming = self._forming.get(resolution)
+                bar = forming[2][index].tolist() if forming is not None else None
+            if forming is not None:
+                if forming[0] == key:
+                    live = [bar[0], max(bar[1], live[1]), min(bar[2], live[2]), live[3]]
+                else:
+                    times.append(forming[1])
+                    bars.append(bar)
+
+        times.append(self._period_time(resolution, key))
+        bars.append(live)
+        times, bars = times[-count:], bars[-count:]
+        return times, [[cents / 100 for cents in bar] for bar in bars]
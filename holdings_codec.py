@@ -0,0 +1,95 @@
+"""Typed positions for the DynamoDB holdings map.
+
+A Portfolios item stores holdings as {symbol: {'shares': N, 'avg_price': N}}.
+The low-level client returns numbers as strings. This codec parses them once
+into Position(shares, avg_micros): share counts are ints, and the average
+price is fixed-point in micro-dollars (see money.py), so the average-price
+arithmetic of a fill is exact integer math with one rounding, and nothing
+goes through Decimal or float on the trade path. Positions are cached in that form
+(a [shares, avg_micros] pair is plain JSON), and a trade rewrites only the
+touched symbol's map entry (holdings.#s).
+"""
+from typing import NamedTuple
+
+from money import MICROS, fill_avg, format_fixed, parse_fixed
+
+
+class Position(NamedTuple):
+    shares: int
+    avg_micros: int
+
+    def buy(self, quantity, price_cents):
+        """Position after buying quantity shares at a price in cents"""
+        return Position(self.shares + quantity, fill_avg(self.shares, self.avg_micros, quantity, price_cents))
+
+    def sell(self, quantity):
+        """Position after selling quantity shares, or None once it is closed"""
+        shares = self.shares - quantity
+        return Position(shares, self.avg_micros) if shares else None
+
+    @classmethod
+    def from_record(cls, record):
+        """Position from a {'shares', 'avg_micros'} dict"""
+        return cls(int(record['shares']), int(record['avg_micros']))
+
+    def record(self):
+        """{'shares', 'avg_micros'} as used by the local stores and the valuation engine"""
+        return {'shares': self.shares, 'avg_micros': self.avg_micros}
+
+
+def fill(position, trade_type, quantity, price_cents):
+    """Position after a fill; position is None when the symbol is not held"""
+    if trade_type == 'BUY':
+        return (position or Position(0, 0)).buy(quantity, price_cents)
+    return position.sell(quantity)
+
+
+def decode_position(attr):
+    """DynamoDB map attribute -> Position"""
+    fields = attr['M']
+    return Position(parse_fixed(fields['shares']['N'], 1), parse_fixed(fields['avg_price']['N'], MICROS))
+
+
+def encode_position(position):
+    """Position -> DynamoDB map attribute"""
+    return {'M': {'shares': {'N': str(position.shares)},
+                  'avg_price': {'N': format_fixed(position.avg_micros, MICROS)}}}
+
+
+def decode_holdings(attr):
+    """DynamoDB holdings map attribute -> {symbol: Position}"""
+    return {symbol: decode_position(value) for symbol, value in attr['M'].items()}
+
+
+def encode_holdings(holdings):
+    return {'M': {symbol: encode_position(position) for symbol, position in holdings.items()}}
+
+
+def holdings_record(holdings):
+    """{symbol: Position} -> {symbol: {'shares', 'avg_micros'}}"""
+    return {symbol: position.record() for symbol, position in holdings.items()}
+
+
+def update_expression(sets=(), removes=()):
+    """'SET a, b REMOVE c' from lists of actions"""
+    clauses = []
+    if sets:
+        clauses.append('SET ' + ', '.join(sets))
+    if removes:
+        clauses.append('REMOVE ' + ', '.join(removes))
+    return ' '.join(clauses)
+
+
+def position_update(symbol, position, sets=(), names=None, values=None):
+    """UpdateItem fields writing one symbol's entry (None removes it), plus any extra SET actions"""
+    names = dict(names or {}, **{'#s': symbol})
+    values = dict(values or {})
+    if position is None:
+        expression = update_expression(sets, ['holdings.#s'])
+    else:
+        expression = update_expression(['holdings.#s = :p', *sets])
+        values[':p'] = encode_position(position)
+    fields = {'UpdateExpression': expression, 'ExpressionAttributeNames': names}
+    if values:
+        fields['ExpressionAttributeValues'] = values
+    return fields
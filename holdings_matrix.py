@@ -0,0 +1,82 @@
+"""Array-backed holdings for revaluing every account at once.
+
+HoldingsMatrix lays all accounts out as a users x symbols matrix of shares
+and average prices plus a balance vector. Revaluing every account after a
+price move, totalling P&L and ranking a leaderboard then each take a few
+vectorized NumPy operations instead of a Python loop per user.
+
+Every array holds integers in the store's units (see money.py): cents for
+balances, prices and values, micro-dollars for average prices. Integer
+sums are exact and do not depend on summation order, so a revaluation
+gives the same totals as the per-user valuation engine, to the cent.
+"""
+try:
+    import numpy as np
+except ImportError:  # optional: only bulk revaluation needs it
+    np = None
+
+from money import CENT_MICROS, CENTS
+
+NUMPY_AVAILABLE = np is not None
+
+
+class HoldingsMatrix:
+    """Shares and average prices for many users, one row per user"""
+
+    def __init__(self, usernames, symbols, shares, avg_micros, balance_cents):
+        self.usernames = usernames  # row labels
+        self.symbols = symbols  # column labels
+        self.shares = shares  # int64 [users x symbols]
+        self.avg_micros = avg_micros  # int64 [users x symbols]
+        self.balance_cents = balance_cents  # int64 [users]
+        # Cost basis only changes with trades, so compute it once per build
+        cost_micros = np.einsum('ij,ij->i', shares, avg_micros)
+        self.cost_basis = (cost_micros + CENT_MICROS // 2) // CENT_MICROS  # cents, half up
+
+    @classmethod
+    def from_accounts(cls, accounts, symbols):
+        """Build from an iterable of (username, record) pairs, e.g. store.iter_accounts()"""
+        column = {symbol: i for i, symbol in enumerate(symbols)}
+        usernames, balances = [], []
+        rows, cols, shares, avg_micros = [], [], [], []
+        for row, (username, record) in enumerate(accounts):
+            usernames.append(username)
+            balances.append(record.get('balance_cents', 0))
+            for symbol, holding in record.get('portfolio', {}).items():
+                if symbol in column:
+                    rows.append(row)
+                    cols.append(column[symbol])
+                    shares.append(holding['shares'])
+                    avg_micros.append(holding['avg_micros'])
+
+        shape = (len(usernames), len(symbols))
+        share_matrix = np.zeros(shape, dtype=np.int64)
+        avg_matrix = np.zeros(shape, dtype=np.int64)
+        share_matrix[rows, cols] = shares
+        avg_matrix[rows, cols] = avg_micros
+        return cls(usernames, list(symbols), share_matrix, avg_matrix,
+                   np.asarray(balances, dtype=np.int64))
+
+    def price_vector(self, prices):
+        """Align a {symbol: dollar price} mapping with the matrix columns, in cents"""
+        return np.rint(np.array([prices[symbol] for symbol in self.symbols], dtype=np.float64) * CENTS
+                       ).astype(np.int64)
+
+    def revalue(self, prices):
+        """Value every account at dollar `prices`; returns a dict of per-user int64 arrays in cents"""
+        market_value = self.shares @ self.price_vector(prices)
+        return {
+            'market_value': market_value,
+            'cost_basis': self.cost_basis,
+            'unrealized_pnl': market_value - self.cost_basis,
+            'total_value': self.balance_cents + market_value
+        }
+
+    def leaderboard(self, values, limit=10):
+        """Top `limit` users by values (e.g. revalue(...)['total_value']), best first"""
+        limit = min(limit, len(values))
+        if limit == 0:
+            return []
+        top = np.argpartition(-values, limit - 1)[:limit]
+        top = top[np.argsort(-values[top])]
+        return [(self.usernames[i], int(values[i])) for i in top]
@@ -0,0 +1,225 @@
+"""In-memory limit order books with price-time priority.
+
+Each symbol has an OrderBook with two sides. A side is a heap of price
+levels (negated for bids, so the best price is always on top) plus, per
+level, a FIFO deque of resting orders and the level's total quantity. An
+incoming order walks the opposite side from the best level and fills the
+oldest orders first, at their resting price; a limit order's remainder then
+rests in the book, a market order's remainder is dropped (immediate or
+cancel). Cancels are lazy: cancel() zeroes the order and takes its quantity
+off the level, and the dead order is discarded when it reaches the head of
+its deque, so a cancel is O(1) and matching never searches.
+
+Prices are int cents (see money.py). The engine does no I/O; orders.py
+reserves funds for orders and settles fills into accounts.
+"""
+import heapq
+import itertools
+from collections import deque
+from typing import NamedTuple
+
+BUY = 'BUY'
+SELL = 'SELL'
+
+
+class Order:
+    """One order; price is None for a market order, remaining counts unfilled shares"""
+
+    __slots__ = ('id', 'username', 'side', 'symbol', 'price', 'quantity', 'remaining', 'seq')
+
+    def __init__(self, id, username, side, symbol, quantity, price=None, remaining=None):
+        self.id = id
+        self.username = username
+        self.side = side
+        self.symbol = symbol
+        self.price = price
+        self.quantity = quantity
+        self.remaining = quantity if remaining is None else remaining
+        self.seq = 0  # arrival order, set by the engine
+
+    def __repr__(self):
+        price = 'MKT' if self.price is None else self.price
+        return f'Order({self.id!r}, {self.side} {self.remaining}/{self.quantity} {self.symbol} @ {price})'
+
+
+class Fill(NamedTuple):
+    symbol: str
+    price: int  # cents; always the resting (maker) order's price
+    quantity: int
+    taker: Order
+    maker: Order
+
+
+class _Side:
+    __slots__ = ('sign', 'prices', 'levels', 'sizes')
+
+    def __init__(self, sign):
+        self.sign = sign  # 1 for asks (lowest first), -1 for bids (highest first)
+        self.prices = []  # heap of sign * price, one entry per level
+        self.levels = {}  # price -> deque of resting orders, oldest first
+        self.sizes = {}  # price -> resting quantity at that level
+
+    def best(self):
+        """Best price with resting quantity (dropping emptied levels), or None"""
+        prices, sizes = self.prices, self.sizes
+        while prices:
+            price = prices[0] * self.sign
+            if sizes[price]:
+                return price
+            heapq.heappop(prices)
+            del self.levels[price], sizes[price]
+        return None
+
+    def add(self, order):
+        price = order.price
+        level = self.levels.get(price)
+        if level is None:
+            level = self.levels[price] = deque()
+            self.sizes[price] = 0
+            heapq.heappush(self.prices, price * self.sign)
+        level.append(order)
+        self.sizes[price] += order.remaining
+
+    def live_levels(self):
+        """[(price, quantity)] of non-empty levels, best first"""
+        sign = self.sign
+        return sorted(((price, size) for price, size in self.sizes.items() if size), key=lambda l: sign * l[0])
+
+
+class OrderBook:
+    """Bids and asks for one symbol"""
+
+    __slots__ = ('symbol', 'bids', 'asks')
+
+    def __init__(self, symbol):
+        self.symbol = symbol
+        self.bids = _Side(-1)
+        self.asks = _Side(1)
+
+    def match(self, order):
+        """Fill order against the opposite side; returns the fills, rests a limit remainder"""
+        if order.side == BUY:
+            opposite, own = self.asks, self.bids
+        else:
+            opposite, own = self.bids, self.asks
+        sign, limit = opposite.sign, order.price
+        levels, sizes = opposite.levels, opposite.sizes
+        fills = []
+        remaining = order.remaining
+        while remaining:
+            best = opposite.best()
+            if best is None or (limit is not None and sign * best > sign * limit):
+                break
+            level = levels[best]
+            while remaining and sizes[best]:
+                maker = level[0]
+                if not maker.remaining:  # cancelled
+                    level.popleft()
+                    continue
+                quantity = remaining if remaining < maker.remaining else maker.remaining
+                maker.remaining -= quantity
+                remaining -= quantity
+                sizes[best] -= quantity
+                if not maker.remaining:
+                    level.popleft()
+                fills.append(Fill(self.symbol, best, quantity, order, maker))
+        order.remaining = remaining
+        if remaining and limit is not None:
+            own.add(order)
+        return fills
+
+    def preview(self, order):
+        """The fills match(order) would make now, without changing the book or the order"""
+        opposite = self.asks if order.side == BUY else self.bids
+        sign, limit = opposite.sign, order.price
+        fills = []
+        remaining = order.remaining
+        for price in sorted((p for p, size in opposite.sizes.items() if size), key=lambda p: sign * p):
+            if not remaining or (limit is not None and sign * price > sign * limit):
+                break
+            for maker in opposite.levels[price]:
+                if not remaining:
+                    break
+                if maker.remaining:  # cancelled orders wait at zero until matching drops them
+                    quantity = min(remaining, maker.remaining)
+                    remaining -= quantity
+                    fills.append(Fill(self.symbol, price, quantity, order, maker))
+        return fills
+
+    def rest(self, order):
+        """Put an order on its side without matching (rebuilding a book)"""
+        (self.bids if order.side == BUY else self.asks).add(order)
+
+    def remove(self, order):
+        """Take a resting order's remaining quantity off its level"""
+        side = self.bids if order.side == BUY else self.asks
+        side.sizes[order.price] -= order.remaining
+        order.remaining = 0
+
+    def sweep(self, side, quantity):
+        """(fillable quantity, cost in cents) of a market order for quantity, without trading"""
+        filled = cost = 0
+        for price, size in (self.asks if side == BUY else self.bids).live_levels():
+            take = min(size, quantity - filled)
+            filled += take
+            cost += take * price
+            if filled == quantity:
+                break
+        return filled, cost
+
+    def depth(self, levels=10):
+        """{'bids': [(price, quantity)], 'asks': [...]}, best levels first"""
+        return {'bids': self.bids.live_levels()[:levels], 'asks': self.asks.live_levels()[:levels]}
+
+
+class MatchingEngine:
+    """Order books for every symbol plus an index of resting orders by id.
+
+    Not thread-safe; callers serialize access (OrderDesk holds a lock).
+    """
+
+    def __init__(self):
+        self.books = {}  # symbol -> OrderBook
+        self.orders = {}  # id -> resting Order
+        self._seq = itertools.count(1)
+
+    def book(self, symbol):
+        book = self.books.get(symbol)
+        if book is None:
+            book = self.books[symbol] = OrderBook(symbol)
+        return book
+
+    def submit(self, order):
+        """Match a new order; returns its fills (it rests if it is a limit order with quantity left)"""
+        order.seq = next(self._seq)
+        fills = self.book(order.symbol).match(order)
+        orders = self.orders
+        for fill in fills:
+            if not fill.maker.remaining:
+                orders.pop(fill.maker.id, None)
+        if order.remaining and order.price is not None:
+            orders[order.id] = order
+        return fills
+
+    def rest(self, order):
+        """Add a resting order without matching it, e.g. one restored from storage"""
+        order.seq = next(self._seq)
+        self.book(order.symbol).rest(order)
+        self.orders[order.id] = order
+
+    def cancel(self, order_id):
+        """Remove a resting order; returns it (remaining set to 0) or None if it is not resting"""
+        order = self.orders.pop(order_id, None)
+        if order is not None:
+            self.books[order.symbol].remove(order)
+        return order
+
+    def preview(self, order):
+        """Fills submit(order) would return, with nothing changed; see OrderBook.preview"""
+        return self.book(order.symbol).preview(order)
+
+    def sweep(self, symbol, side, quantity):
+        return self.book(symbol).sweep(side, quantity)
+
+    def depth(self, symbol, levels=10):
+        return self.book(symbol).depth(levels)
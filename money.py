@@ -0,0 +1,80 @@
+"""Fixed-point money.
+
+Balances, prices and transaction totals are ints in cents, and average
+prices are ints in micro-dollars (an average of cent prices needs more than
+two decimals). Trade math, storage and valuation all work in these units, so
+sums are exact and every process and every vectorized pass computes the same
+result; dollars appear only at the edges: prices from the price engine,
+JSON responses, templates and DynamoDB's decimal numbers.
+"""
+CENTS = 100  # balance, price and total units per dollar
+MICROS = 1_000_000  # avg_micros units per dollar
+CENT_MICROS = MICROS // CENTS
+
+
+def parse_fixed(text, scale):
+    """Decimal number string -> int in 1/scale units, rounded half away from zero, without float"""
+    text = text.strip()
+    negative = text.startswith('-')
+    text = text.lstrip('+-')
+    exponent = 0
+    if 'e' in text or 'E' in text:
+        text, _, exp = text.lower().partition('e')
+        exponent = int(exp)
+    whole, _, frac = text.partition('.')
+    digits = (whole or '0') + frac
+    shift = exponent - len(frac) + len(str(scale)) - 1  # scale is a power of ten
+    if shift >= 0:
+        value = int(digits) * 10 ** shift
+    else:
+        value, rest = divmod(int(digits), 10 ** -shift)
+        value += rest * 2 >= 10 ** -shift
+    return -value if negative else value
+
+
+def format_fixed(value, scale):
+    """int in 1/scale units -> shortest exact decimal string"""
+    sign = '-' if value < 0 else ''
+    whole, frac = divmod(abs(value), scale)
+    frac = str(frac).rjust(len(str(scale)) - 1, '0').rstrip('0')
+    return f'{sign}{whole}.{frac}' if frac else f'{sign}{whole}'
+
+
+def to_cents(dollars):
+    """Dollar amount (float, int or decimal string) -> int cents"""
+    if isinstance(dollars, str):
+        return parse_fixed(dollars, CENTS)
+    return round(dollars * CENTS)
+
+
+def to_micros(dollars):
+    """Dollar amount (float, int or decimal string) -> int micro-dollars"""
+    if isinstance(dollars, str):
+        return parse_fixed(dollars, MICROS)
+    return round(dollars * MICROS)
+
+
+def dollars(cents):
+    """int cents -> float dollars, for JSON responses"""
+    return cents / CENTS
+
+
+def micros_to_cents(micros):
+    """Round micro-dollars to cents, half away from zero"""
+    cents, rest = divmod(abs(micros), CENT_MICROS)
+    cents += rest * 2 >= CENT_MICROS
+    return cents if micros >= 0 else -cents
+
+
+def format_cents(cents):
+    """int cents -> '1234.50' (always two decimals, no float)"""
+    sign = '-' if cents < 0 else ''
+    whole, frac = divmod(abs(cents), CENTS)
+    return f'{sign}{whole}.{frac:02d}'
+
+
+def fill_avg(shares, avg_micros, quantity, price_cents):
+    """Average price in micro-dollars after buying quantity more shares at price_cents"""
+    total = shares + quantity
+    cost = avg_micros * shares + price_cents * CENT_MICROS * quantity
+    return (cost + total // 2) // total
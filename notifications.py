@@ -0,0 +1,264 @@
+"""Background delivery of trade notifications.
+
+Request handlers call NotificationDispatcher.submit(), which only appends
+to an in-memory queue, so a slow or failing SNS never delays a trade.
+Worker threads take up to max_batch messages at a time and hand them to a
+publisher. Messages that fail are retried with exponential backoff and
+jitter until max_retries is reached.
+
+The queue is bounded. When it is full, messages are appended to an
+optional NDJSON spool file and read back once the queue drains; without a
+spool they are dropped and counted. Messages still queued at exit are
+spooled too.
+
+A publisher is any object with publish_batch(messages) that returns the
+messages that failed: SNSPublisher for AWS, CallbackPublisher to wrap a
+per-message function, and StubPublisher to record messages locally.
+"""
+import atexit
+import heapq
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+
+
+class SNSPublisher:
+    """Publishes to one SNS topic, up to 10 messages per PublishBatch call"""
+
+    def __init__(self, get_client, topic_arn):
+        self.get_client = get_client  # called per batch, so the client is created on first use
+        self.topic_arn = topic_arn
+
+    def publish_batch(self, messages):
+        client = self.get_client()
+        failed = []
+        for start in range(0, len(messages), 10):
+            chunk = messages[start:start + 10]
+            response = client.publish_batch(
+                TopicArn=self.topic_arn,
+                PublishBatchRequestEntries=[{
+                    'Id': str(i),
+                    'Subject': message['subject'],
+                    'Message': f"User: {message['username']}\n\n{message['message']}"
+                } for i, message in enumerate(chunk)]
+            )
+            failed.extend(chunk[int(entry['Id'])] for entry in response.get('Failed', []))
+        return failed
+
+
+class CallbackPublisher:
+    """Calls fn(message) for each message; an exception marks it failed"""
+
+    def __init__(self, fn):
+        self.fn = fn
+
+    def publish_batch(self, messages):
+        failed = []
+        for message in messages:
+            try:
+                self.fn(message)
+            except Exception as e:
+                print(f"Error sending notification: {e}")
+                failed.append(message)
+        return failed
+
+
+class StubPublisher:
+    """Keeps the last `keep` messages in memory; fail_rate and latency simulate a flaky SNS"""
+
+    def __init__(self, keep=1000, fail_rate=0.0, latency=0.0):
+        self.sent = deque(maxlen=keep)
+        self.calls = 0
+        self.fail_rate = fail_rate
+        self.latency = latency
+
+    def publish_batch(self, messages):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        failed = [m for m in messages if self.fail_rate and random.random() < self.fail_rate]
+        failed_ids = {id(m) for m in failed}
+        self.sent.extend(m for m in messages if id(m) not in failed_ids)
+        return failed
+
+
+class NotificationDispatcher:
+    """Bounded queue of notifications drained by background worker threads"""
+
+    def __init__(self, publisher, max_queue=10000, workers=2, max_batch=10, max_retries=5,
+                 base_delay=0.5, max_delay=30.0, spool_path=None):
+        self.publisher = publisher
+        self.max_queue = max_queue
+        self.workers = workers
+        self.max_batch = max_batch
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.spool_path = spool_path
+        self._ready = deque()  # [attempts, message]
+        self._delayed = []  # heap of (due, seq, [attempts, message]) waiting for a retry
+        self._seq = 0
+        self._in_flight = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._pid = None
+        self._stats = {'submitted': 0, 'sent': 0, 'retried': 0, 'failed': 0, 'dropped': 0,
+                       'spooled': 0, 'batches': 0}
+        if spool_path:
+            atexit.register(self.close)
+
+    # -- producer side -----------------------------------------------------
+
+    def submit(self, message):
+        """Queue a message dict; returns False if it had to be dropped"""
+        self._ensure_running()
+        with self._cond:
+            self._stats['submitted'] += 1
+            if len(self._ready) + len(self._delayed) < self.max_queue:
+                self._ready.append([0, message])
+                self._cond.notify_all()  # flush() waits on the same condition
+                return True
+        if self._spool([[0, message]]):
+            return True
+        with self._cond:
+            self._stats['dropped'] += 1
+        return False
+
+    def metrics(self):
+        """Queue depth, in-flight count and lifetime counters"""
+        with self._cond:
+            return dict(self._stats, queued=len(self._ready), retrying=len(self._delayed),
+                        in_flight=self._in_flight, spool_bytes=self._spool_size())
+
+    def flush(self, timeout=None):
+        """Wait until nothing is queued, retrying or in flight; returns True if drained"""
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: not self._ready and not self._delayed and not self._in_flight, timeout)
+
+    def close(self, timeout=2.0):
+        """Stop the workers, spooling whatever they could not send in time"""
+        self.flush(timeout)
+        with self._cond:
+            self._closed = True
+            leftover = list(self._ready) + [item for _, _, item in self._delayed]
+            self._ready.clear()
+            self._delayed = []
+            self._cond.notify_all()
+        if leftover and not self._spool(leftover):
+            with self._cond:
+                self._stats['dropped'] += len(leftover)
+
+    # -- spool ---------------------------------------------------------------
+
+    def _spool_size(self):
+        try:
+            return os.path.getsize(self.spool_path) if self.spool_path else 0
+        except OSError:
+            return 0
+
+    def _spool(self, items):
+        """Append items to the spool file; False if there is no spool or it failed"""
+        if not self.spool_path:
+            return False
+        try:
+            with self._cond:
+                with open(self.spool_path, 'a') as f:
+                    for item in items:
+                        f.write(json.dumps(item) + '\n')
+                self._stats['spooled'] += len(items)
+            return True
+        except (OSError, TypeError, ValueError) as e:
+            print(f"Error spooling notifications: {e}")
+            return False
+
+    def _unspool(self):
+        """Move up to the free queue space from the spool back into the queue (caller holds _cond)"""
+        if self._spool_size() == 0:
+            return
+        free = self.max_queue - len(self._ready) - len(self._delayed)
+        if free <= 0:
+            return
+        draining = self.spool_path + '.draining'
+        os.replace(self.spool_path, draining)
+        with open(draining) as f:
+            lines = f.readlines()
+        for line in lines[:free]:
+            self._ready.append(json.loads(line))
+        if lines[free:]:
+            with open(self.spool_path, 'a') as f:
+                f.writelines(lines[free:])
+        os.remove(draining)
+
+    # -- workers -------------------------------------------------------------
+
+    def _ensure_running(self):
+        """Start the worker threads lazily, and again after a gunicorn fork"""
+        if self._pid == os.getpid():
+            return
+        with self._cond:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            if self.spool_path:
+                try:
+                    self._unspool()
+                except (OSError, ValueError) as e:
+                    print(f"Error reading notification spool: {e}")
+            for i in range(self.workers):
+                threading.Thread(target=self._run, daemon=True, name=f'notifier-{i}').start()
+
+    def _next_batch(self):
+        """Block until messages are due; returns up to max_batch items, or None once closed"""
+        with self._cond:
+            while True:
+                if self._closed:
+                    return None
+                now = time.monotonic()
+                while self._delayed and self._delayed[0][0] <= now:
+                    self._ready.append(heapq.heappop(self._delayed)[2])
+                if not self._ready and self.spool_path:
+                    try:
+                        self._unspool()
+                    except (OSError, ValueError) as e:
+                        print(f"Error reading notification spool: {e}")
+                if self._ready:
+                    batch = [self._ready.popleft() for _ in range(min(self.max_batch, len(self._ready)))]
+                    self._in_flight += len(batch)
+                    return batch
+                wait = self._delayed[0][0] - now if self._delayed else None
+                if self.spool_path and self._spool_size():
+                    wait = min(wait or 1.0, 1.0)  # spooled messages wait for free space
+                self._cond.wait(wait)
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            try:
+                failed_messages = self.publisher.publish_batch([message for _, message in batch])
+            except Exception as e:
+                print(f"Error publishing notifications: {e}")
+                failed_messages = [message for _, message in batch]
+            failed_ids = {id(message) for message in failed_messages}
+
+            with self._cond:
+                self._in_flight -= len(batch)
+                self._stats['batches'] += 1
+                for item in batch:
+                    if id(item[1]) not in failed_ids:
+                        self._stats['sent'] += 1
+                    elif item[0] >= self.max_retries:
+                        self._stats['failed'] += 1
+                    else:
+                        item[0] += 1
+                        delay = min(self.max_delay, self.base_delay * 2 ** (item[0] - 1))
+                        self._seq += 1
+                        heapq.heappush(self._delayed, (time.monotonic() + delay * random.uniform(0.5, 1.0),
+                                                       self._seq, item))
+                        self._stats['retried'] += 1
+                self._cond.notify_all()
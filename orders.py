@@ -0,0 +1,194 @@
+"""Limit and market orders against the local store.
+
+OrderDesk runs orders through the matching engine (matching.py) and keeps
+the accounts in step with the books:
+
+- placing an order reserves what it may spend: a buy moves its limit price
+  times quantity (for a market buy, the cost of the liquidity it will take)
+  from the balance into the order's hold; a sell earmarks shares, which
+  trading.apply_sell then refuses to sell elsewhere;
+- the fills of one order, for the taker and every resting order it reached,
+  are settled into portfolios and transaction histories with a single
+  atomic store.mutate_users() call, i.e. one commit; a buy filled below its
+  limit gets the difference back at once. The fills are previewed and
+  settled before the engine executes them, so if the commit fails the
+  book is untouched, the new order's reservation is returned and the
+  caller gets a TradeError;
+- a filled or cancelled order returns what is left of its hold.
+
+Open orders are saved with the account (record['orders']) and the books are
+rebuilt from them on first use, so they survive a restart. The books live
+in one process: with several gunicorn workers, route the order endpoints to
+a single worker.
+"""
+import threading
+import uuid
+from datetime import datetime
+
+from matching import BUY, SELL, MatchingEngine, Order
+from trading import TradeError, make_transaction, reserved_shares, update_position
+
+
+def _reserve(record, order_id, entry):
+    """Hold the balance or shares an order needs and save the order with the account"""
+    if entry['side'] == BUY:
+        if entry['hold_cents'] > record.get('balance_cents', 0):
+            raise TradeError('Insufficient balance')
+        record['balance_cents'] -= entry['hold_cents']
+    else:
+        symbol = entry['symbol']
+        owned = record.get('portfolio', {}).get(symbol, {}).get('shares', 0)
+        free = owned - reserved_shares(record, symbol)
+        if entry['remaining'] > free:
+            raise TradeError(f'Insufficient shares. You have {free} available')
+    record.setdefault('orders', {})[order_id] = entry
+
+
+def _release(record, order_id):
+    """Drop a finished or cancelled order, returning its remaining hold; returns the entry"""
+    orders = record['orders']
+    entry = orders.pop(order_id)
+    record['balance_cents'] += entry['hold_cents']
+    if not orders:
+        del record['orders']
+    return entry
+
+
+def _apply_fills(record, fills):
+    """Settle one user's fills, [(order, price_cents, quantity)], into the record; returns the transactions"""
+    orders = record['orders']
+    portfolio = record.setdefault('portfolio', {})
+    transactions = []
+    touched = {}
+    for order, price_cents, quantity in fills:  # settled before the engine fills order, so use entry['remaining']
+        entry = orders[order.id]
+        total = price_cents * quantity
+        entry['remaining'] -= quantity
+        if order.side == BUY:
+            entry['hold_cents'] -= total
+        else:
+            record['balance_cents'] += total
+        update_position(portfolio, order.side, order.symbol, quantity, price_cents)
+        transactions.append(make_transaction(order.side, order.symbol, quantity, price_cents, total))
+        touched[order.id] = order
+    for order in touched.values():
+        entry = orders[order.id]
+        if not entry['remaining'] or order.price is None:
+            _release(record, order.id)
+        elif order.side == BUY:
+            needed = order.price * entry['remaining']
+            record['balance_cents'] += entry['hold_cents'] - needed  # filled below the limit
+            entry['hold_cents'] = needed
+    return transactions
+
+
+class OrderDesk:
+    """The order books of one process, settled into a storage.py store.
+
+    on_fill(username, type, symbol, quantity, price_cents) is called for
+    every settled fill on both sides, e.g. to update the valuation engine.
+    """
+
+    def __init__(self, store, on_fill=None):
+        self.store = store
+        self.engine = MatchingEngine()
+        self.on_fill = on_fill
+        self._lock = threading.Lock()  # books and their settlement change together
+        self._loaded = False
+
+    def _load(self):
+        """Rebuild the books from the open orders saved with the accounts, once"""
+        if self._loaded:
+            return
+        resting, interrupted = [], []
+        for username, record in self.store.iter_accounts():
+            for order_id, entry in record.get('orders', {}).items():
+                if entry['price_cents'] is None:
+                    interrupted.append((username, order_id))  # market order cut off before settling
+                else:
+                    resting.append((entry['created_at'], Order(order_id, username, entry['side'], entry['symbol'],
+                                                               entry['quantity'], entry['price_cents'],
+                                                               entry['remaining'])))
+        for username, order_id in interrupted:
+            self.store.mutate_user(username, lambda record, order_id=order_id: (_release(record, order_id), []))
+        resting.sort(key=lambda item: item[0])
+        for _, order in resting:
+            self.engine.rest(order)
+        self._loaded = True
+
+    def place(self, username, side, symbol, quantity, price_cents=None):
+        """Reserve, match and settle a new order (market if price_cents is None).
+
+        Returns (order, fills); raises TradeError if the account cannot cover
+        the order or its fills cannot be settled. A market order takes what the book offers and never rests:
+        it comes back with the requested quantity and the part the book could
+        not fill as `remaining`, which is cancelled (all of it, with no fills,
+        if the book is empty).
+        """
+        if side not in (BUY, SELL):
+            raise TradeError('Side must be BUY or SELL')
+        with self._lock:
+            self._load()
+            requested = quantity
+            if price_cents is None:
+                quantity, cost = self.engine.sweep(symbol, side, quantity)
+                hold = cost if side == BUY else 0
+            else:
+                hold = price_cents * quantity if side == BUY else 0
+            order_id = str(uuid.uuid4())
+            if not quantity:
+                return Order(order_id, username, side, symbol, requested), []
+            entry = {
+                'side': side,
+                'symbol': symbol,
+                'price_cents': price_cents,
+                'quantity': quantity,
+                'remaining': quantity,
+                'hold_cents': hold,
+                'created_at': datetime.now().isoformat()
+            }
+            self.store.mutate_user(username, lambda record: (_reserve(record, order_id, entry), []))
+            order = Order(order_id, username, side, symbol, quantity, price_cents)
+            planned = self.engine.preview(order)
+            if planned:
+                error = self._settle(planned)
+                if error is not None:
+                    self.store.mutate_user(username, lambda record: (_release(record, order_id), []))
+                    raise TradeError(f'Order could not be settled: {error}')
+            fills = self.engine.submit(order)  # the same fills: the lock is held throughout
+            if price_cents is None:
+                order.quantity, order.remaining = requested, order.remaining + requested - quantity
+            return order, fills
+
+    def _settle(self, fills):
+        """Settle fills for every account they touch in one atomic commit; returns the error, or None"""
+        by_user = {}
+        for fill in fills:
+            for order in (fill.taker, fill.maker):
+                by_user.setdefault(order.username, []).append((order, fill.price, fill.quantity))
+        ops = [(username, lambda record, user_fills=user_fills: (None, _apply_fills(record, user_fills)))
+               for username, user_fills in by_user.items()]
+        for _, error in self.store.mutate_users(ops, atomic=True):
+            if error is not None:
+                return error
+        if self.on_fill:
+            for username, user_fills in by_user.items():
+                for order, price_cents, quantity in user_fills:
+                    self.on_fill(username, order.side, order.symbol, quantity, price_cents)
+        return None
+
+    def cancel(self, username, order_id):
+        """Cancel a resting order of username and return its hold; returns the order's saved entry"""
+        with self._lock:
+            self._load()
+            order = self.engine.orders.get(order_id)
+            if order is None or order.username != username:
+                raise TradeError('Order not found')
+            self.engine.cancel(order_id)
+            return self.store.mutate_user(username, lambda record: (_release(record, order_id), []))
+
+    def depth(self, symbol, levels=10):
+        """{'bids': [(price_cents, quantity)], 'asks': [...]}, best levels first"""
+        with self._lock:
+            self._load()
+            return self.engine.depth(symbol, levels)
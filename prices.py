@@ -0,0 +1,216 @@
+"""Simulated live prices: geometric Brownian motion on a fixed tick.
+
+Time is divided into sessions (one UTC day by default), 5-minute blocks and
+ticks. Every session opens at the reference prices in STOCK_DATABASE, and the
+price at a tick depends only on (seed, session, tick). Each gunicorn worker
+therefore computes the same prices without coordination, and a worker that
+starts mid-session catches up from the tick number alone.
+
+One draw per session gives every block's total log return; the ticks inside
+a block are a Brownian bridge pinned to that total. Catching up costs one
+session draw plus one block, and the block-boundary levels double as the
+5-minute closes the history store (history.py) builds its bars from.
+
+Readers call engine.current() and get an immutable Snapshot. The engine
+swaps in a new one on each tick, so reads need no lock.
+"""
+import math
+import os
+import threading
+import time
+
+try:
+    import numpy as np
+except ImportError:  # optional: without numpy prices stay static
+    np = None
+
+PRICE_ENGINE_AVAILABLE = np is not None
+
+SECONDS_PER_YEAR = 365 * 24 * 3600
+BLOCK_SECONDS = 300  # one block of ticks is one 5-minute history bar
+
+
+class Snapshot:
+    """Prices for one tick; never modified after publication"""
+
+    __slots__ = ('version', 'timestamp', 'symbols', '_index', '_names', '_prices', '_changes',
+                 '_quotes', '_price_map')
+
+    def __init__(self, version, timestamp, symbols, index, names, prices, changes):
+        self.version = version  # increases by one per tick
+        self.timestamp = timestamp  # epoch seconds at the start of the tick
+        self.symbols = symbols
+        self._index = index
+        self._names = names
+        self._prices = prices
+        self._changes = changes
+        self._quotes = None
+        self._price_map = None
+
+    def __contains__(self, symbol):
+        return symbol in self._index
+
+    def price(self, symbol):
+        return self._prices[self._index[symbol]]
+
+    def prices(self):
+        """All prices as {symbol: price}, built on first use"""
+        if self._price_map is None:
+            self._price_map = dict(zip(self.symbols, self._prices))
+        return self._price_map
+
+    def quote(self, symbol):
+        """{'name', 'price', 'change'} for one symbol (change is % since the session open)"""
+        i = self._index[symbol]
+        return {'name': self._names[i], 'price': self._prices[i], 'change': self._changes[i]}
+
+    def quotes(self):
+        """All quotes as {symbol: {'name', 'price', 'change'}}, built on first use"""
+        if self._quotes is None:
+            self._quotes = {symbol: {'name': name, 'price': price, 'change': change}
+                            for symbol, name, price, change
+                            in zip(self.symbols, self._names, self._prices, self._changes)}
+        return self._quotes
+
+
+class PriceEngine:
+    """Advances every symbol on a fixed tick and publishes Snapshots"""
+
+    def __init__(self, stocks, tick_seconds=1.0, volatility=0.4, drift=0.0, seed=0, session_seconds=86400):
+        self.symbols = list(stocks)
+        self.index = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self._names = [stocks[symbol]['name'] for symbol in self.symbols]
+        self._open = np.array([stocks[symbol]['price'] for symbol in self.symbols], dtype=np.float64)
+        self.tick_seconds = tick_seconds
+        self.session_seconds = session_seconds
+        self.block_ticks = max(1, int(round(BLOCK_SECONDS / tick_seconds)))
+        self.blocks_per_session = max(1, -(-int(session_seconds // tick_seconds) // self.block_ticks))
+        self.ticks_per_session = self.blocks_per_session * self.block_ticks
+        self.seed = seed
+
+        dt = tick_seconds / SECONDS_PER_YEAR
+        self._mean = (drift - 0.5 * volatility ** 2) * dt  # per-tick log-return drift
+        self._scale = volatility * math.sqrt(dt)  # per-tick log-return std dev
+
+        self._lock = threading.Lock()  # serializes advance(); readers never take it
+        self._listeners = []
+        self._pid = None
+        self._position = None
+        self._levels = {}  # session -> block-boundary levels (last two sessions)
+        self._paths = {}  # (session, block) -> tick levels (last two blocks)
+        self._snapshot = None
+        self.advance()
+
+    # -- deterministic paths -------------------------------------------------
+
+    def session_levels(self, session):
+        """Log level (return since the open) at every block boundary: array [blocks + 1 x symbols]
+
+        Row b is the level before block b's first tick; the last row is the session close.
+        """
+        levels = self._levels.get(session)
+        if levels is None:
+            rng = np.random.default_rng([self.seed, session, 0])
+            totals = (self.block_ticks * self._mean + self._scale * math.sqrt(self.block_ticks)
+                      * rng.standard_normal((self.blocks_per_session, len(self.symbols))))
+            levels = np.zeros((self.blocks_per_session + 1, len(self.symbols)))
+            np.cumsum(totals, axis=0, out=levels[1:])
+            # caches are replaced, never mutated, so concurrent readers can iterate them
+            cache = {s: v for s, v in self._levels.items() if s > session - 2}
+            cache[session] = levels
+            self._levels = cache
+        return levels
+
+    def block_path(self, session, block):
+        """Log level after each tick of one block: array [block_ticks x symbols]"""
+        key = (session, block)
+        path = self._paths.get(key)
+        if path is None:
+            levels = self.session_levels(session)
+            rng = np.random.default_rng([self.seed, session, block, 1])
+            z = rng.standard_normal((self.block_ticks, len(self.symbols)))
+            # Brownian bridge: replace the sample mean so the ticks add up to
+            # the block total already fixed by session_levels()
+            total = (levels[block + 1] - levels[block] - self.block_ticks * self._mean) / self._scale
+            z += total / self.block_ticks - z.mean(axis=0)
+            path = levels[block] + np.cumsum(self._mean + self._scale * z, axis=0)
+            path[-1] = levels[block + 1]  # exact, so block closes match session_levels()
+            cache = {k: v for k, v in self._paths.items() if k >= (session, block - 1)}
+            cache[key] = path
+            self._paths = cache
+        return path
+
+    def to_cents(self, levels, index=None):
+        """Prices in integer cents for an array of log levels (of one symbol if index is given)"""
+        open_prices = self._open if index is None else self._open[index]
+        return np.rint(open_prices * np.exp(levels) * 100).astype(np.int64)
+
+    def block_time(self, session, block):
+        """Epoch seconds at the start of a block"""
+        return session * self.session_seconds + block * self.block_ticks * self.tick_seconds
+
+    # -- ticking -------------------------------------------------------------
+
+    def position(self, now):
+        """(session, tick) containing the epoch time `now`"""
+        session, into = divmod(now, self.session_seconds)
+        return int(session), min(int(into // self.tick_seconds), self.ticks_per_session - 1)
+
+    def advance(self, now=None):
+        """Move prices to the tick containing `now`; returns True if a new snapshot was published"""
+        session, tick = self.position(time.time() if now is None else now)
+        with self._lock:
+            if (session, tick) == self._position:
+                return False
+            self._position = (session, tick)
+            block, offset = divmod(tick, self.block_ticks)
+            cents = self.to_cents(self.block_path(session, block)[offset])
+            prices = cents / 100
+            changes = np.round((prices / self._open - 1) * 100, 2)
+            snapshot = Snapshot(session * self.ticks_per_session + tick,
+                                session * self.session_seconds + tick * self.tick_seconds,
+                                self.symbols, self.index, self._names, prices.tolist(), changes.tolist())
+            self._snapshot = snapshot
+
+        for listener in list(self._listeners):
+            try:
+                listener(snapshot)
+            except Exception as e:
+                print(f"Error in price listener: {e}")
+        return True
+
+    def subscribe(self, listener):
+        """Call listener(snapshot) after every published tick (on the engine thread)"""
+        self._listeners.append(listener)
+
+    def _ensure_running(self):
+        """Start the ticker thread lazily, and again after a gunicorn fork"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            threading.Thread(target=self._run, daemon=True, name='price-engine').start()
+
+    def _run(self):
+        while True:
+            now = time.time()
+            time.sleep(max(0.0, (math.floor(now / self.tick_seconds) + 1) * self.tick_seconds - now))
+            try:
+                self.advance()
+            except Exception as e:
+                print(f"Error advancing prices: {e}")
+
+    def current(self):
+        """Latest Snapshot (lock-free)"""
+        self._ensure_running()
+        return self._snapshot
+
+
+def static_snapshot(stocks):
+    """A Snapshot of fixed prices, used when the engine is disabled"""
+    symbols = list(stocks)
+    return Snapshot(0, 0.0, symbols, {symbol: i for i, symbol in enumerate(symbols)},
+                    [stocks[s]['name'] for s in symbols], [stocks[s]['price'] for s in symbols],
+                    [stocks[s]['change'] for s in symbols])
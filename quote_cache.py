@@ -0,0 +1,123 @@
+"""Pre-serialized /api/stocks and /api/stock/<symbol> responses.
+
+Quotes only change when the price engine ticks, so QuoteCache encodes each
+response once per snapshot version and every poll until the next tick gets
+the same bytes. A response is a CachedBody: the JSON bytes, a strong ETag
+(a hash of the bytes, so every worker computes the same one for the same
+tick) and gzip/brotli variants compressed on first request. A subset
+(?symbols=A,B,C) joins per-symbol fragments that are also encoded once,
+and the most recent subsets are kept whole.
+"""
+import gzip
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+try:
+    import brotli
+except ImportError:  # optional: without it only gzip is offered
+    brotli = None
+
+MIN_COMPRESS_BYTES = 512  # smaller bodies are sent as they are
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5  # 11 compresses best but costs ~100x the CPU, once per tick
+
+
+class CachedBody:
+    """One response body and its compressed variants; never modified once built"""
+
+    __slots__ = ('body', 'etag', '_encoded')
+
+    def __init__(self, body):
+        self.body = body
+        self.etag = hashlib.blake2b(body, digest_size=12).hexdigest()
+        self._encoded = {}  # coding -> bytes, or None when compressing does not pay
+
+    def encoded(self, coding):
+        """(body, etag) for 'gzip' or 'br'; None if the body is too small or brotli is missing"""
+        if coding not in self._encoded:
+            data = None
+            if len(self.body) >= MIN_COMPRESS_BYTES:
+                if coding == 'gzip':
+                    data = gzip.compress(self.body, GZIP_LEVEL, mtime=0)  # mtime=0: same bytes in every worker
+                elif coding == 'br' and brotli is not None:
+                    data = brotli.compress(self.body, quality=BROTLI_QUALITY)
+            self._encoded[coding] = data
+        data = self._encoded[coding]
+        return (data, f'{self.etag}-{coding}') if data is not None else None
+
+
+def _encode_item(snapshot, symbol):
+    """b'{"symbol":...,"name":...,"price":...,"change":...}'"""
+    quote = snapshot.quote(symbol)
+    return json.dumps({'symbol': symbol, 'name': quote['name'], 'price': quote['price'],
+                       'change': quote['change']}, separators=(',', ':')).encode()
+
+
+def _encode_list(snapshot, symbols):
+    return b'[' + b','.join(_encode_item(snapshot, s) for s in symbols) + b']'
+
+
+def _encode_detail(item):
+    return item[:-1] + b',"found":true}'
+
+
+class QuoteCache:
+    """Encoded quote responses for the latest snapshot version"""
+
+    def __init__(self, max_subsets=256):
+        self.max_subsets = max_subsets
+        self._lock = threading.Lock()
+        self._version = None
+        self._all = None
+        self._items = {}  # symbol -> b'{"symbol":...}' list item
+        self._details = {}  # symbol -> CachedBody of /api/stock/<symbol>
+        self._subsets = OrderedDict()  # tuple of symbols -> CachedBody, least recently used first
+
+    def _check(self, snapshot):
+        """Switch to snapshot's version if it is newer; False if it is older (not cached). Lock held."""
+        if self._version is None or snapshot.version > self._version:
+            self._version = snapshot.version
+            self._all = None
+            self._items = {}
+            self._details = {}
+            self._subsets = OrderedDict()
+        return snapshot.version == self._version
+
+    def _item(self, snapshot, symbol):
+        item = self._items.get(symbol)
+        if item is None:
+            item = self._items[symbol] = _encode_item(snapshot, symbol)
+        return item
+
+    def stocks(self, snapshot, symbols=None):
+        """CachedBody of the quote list: every symbol, or symbols in that order (all must be in snapshot)"""
+        with self._lock:
+            if not self._check(snapshot):  # a request that read the snapshot just before a tick
+                return CachedBody(_encode_list(snapshot, symbols or snapshot.symbols))
+            if not symbols:
+                if self._all is None:
+                    self._all = CachedBody(b'[' + b','.join(self._item(snapshot, s) for s in snapshot.symbols) + b']')
+                return self._all
+            key = tuple(symbols)
+            cached = self._subsets.get(key)
+            if cached is None:
+                cached = CachedBody(b'[' + b','.join(self._item(snapshot, s) for s in key) + b']')
+                self._subsets[key] = cached
+                if len(self._subsets) > self.max_subsets:
+                    self._subsets.popitem(last=False)
+            else:
+                self._subsets.move_to_end(key)
+            return cached
+
+    def stock(self, snapshot, symbol):
+        """CachedBody of one known symbol's details"""
+        with self._lock:
+            if not self._check(snapshot):
+                return CachedBody(_encode_detail(_encode_item(snapshot, symbol)))
+            cached = self._details.get(symbol)
+            if cached is None:
+                cached = CachedBody(_encode_detail(self._item(snapshot, symbol)))
+                self._details[symbol] = cached
+            return cached
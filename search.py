@@ -0,0 +1,116 @@
+"""Symbol and company-name search for type-ahead.
+
+SymbolIndex keeps three sorted key lists: symbols, full company names, and
+every word of every name, each lowercased to letters and digits. A sorted
+list is a flattened prefix trie: bisect finds the first key with a prefix,
+and every match follows it in order. A query walks the lists in rank order
+and stops once it has `limit` results:
+
+  0. the symbol itself                 'AAPL'
+  1. symbols starting with the query   'AA'
+  2. names starting with the query     'apple i'
+  3. names with a word starting with every query word ('corp micro'), a
+     different word for each, so 'bank bank' needs two
+
+Each tier comes in the order of the list it walks: tier 1 by symbol, which
+puts 'A' before 'AA' before 'AAB'; tier 2 by name; tier 3 by the name word
+that the rarest query word matched, then by symbol, so 'micro' lists names
+with the word 'micro' before names with 'microsystems'. A query costs
+O(log n + limit) however many instruments match a short prefix, except
+tier 3 with several words, which filters the candidates of the rarest
+word, at most `max_scan` of them.
+"""
+import re
+from bisect import bisect_left, bisect_right
+
+_NON_WORD = re.compile(r'[^0-9a-z]+')
+
+
+def _words(text):
+    return _NON_WORD.sub(' ', text.lower()).split()
+
+
+def _sorted_pairs(keys, values):
+    """keys and values reordered by key, ties kept in order (sorting strings alone beats sorting tuples)"""
+    order = sorted(range(len(keys)), key=keys.__getitem__)
+    return [keys[i] for i in order], [values[i] for i in order]
+
+
+def _starts_distinct(words, parts):
+    """Whether each of words starts a different one of parts (a query has few words, so backtracking is cheap)"""
+    if not words:
+        return True
+    word, rest = words[0], words[1:]
+    return any(part.startswith(word) and _starts_distinct(rest, parts[:j] + parts[j + 1:])
+               for j, part in enumerate(parts))
+
+
+def _prefixed(keys, prefix):
+    """Indexes of keys starting with prefix, in order"""
+    i = bisect_left(keys, prefix)
+    while i < len(keys) and keys[i].startswith(prefix):
+        yield i
+        i += 1
+
+
+class SymbolIndex:
+    """Prefix search over {symbol: {'name': ...}}; immutable once built"""
+
+    def __init__(self, stocks, max_scan=10_000):
+        self.max_scan = max_scan
+        self._symbols = sorted(symbol.upper() for symbol in stocks)
+        self._known = set(self._symbols)
+        self._name_words = {}  # symbol -> words of its name
+        name_keys, name_symbols, word_keys, word_symbols = [], [], [], []
+        for symbol, data in sorted(((symbol.upper(), data) for symbol, data in stocks.items()),
+                                   key=lambda item: item[0]):
+            parts = _words(data['name'])
+            self._name_words[symbol] = parts
+            name_keys.append(' '.join(parts))
+            name_symbols.append(symbol)
+            for word in set(parts):
+                word_keys.append(word)
+                word_symbols.append(symbol)
+        self._name_keys, self._name_symbols = _sorted_pairs(name_keys, name_symbols)
+        self._word_keys, self._word_symbols = _sorted_pairs(word_keys, word_symbols)
+
+    def __len__(self):
+        return len(self._symbols)
+
+    def search(self, query, limit=10):
+        """Up to limit symbols matching query, best first ('' lists symbols alphabetically)"""
+        words = _words(query)
+        if not words:
+            return self._symbols[:limit] if not query.strip() else []
+        results, seen = [], set()
+
+        def add(symbol):
+            if symbol not in seen:
+                seen.add(symbol)
+                results.append(symbol)
+            return len(results) >= limit
+
+        symbol_query = query.strip().upper()
+        if symbol_query in self._known and add(symbol_query):
+            return results
+        for i in _prefixed(self._symbols, symbol_query):
+            if add(self._symbols[i]):
+                return results
+        for i in _prefixed(self._name_keys, ' '.join(words)):
+            if add(self._name_symbols[i]):
+                return results
+
+        # every word must start its own word of the name; scan the one with the fewest matches
+        anchor = min(words, key=lambda word: bisect_right(self._word_keys, word + '\uffff')
+                     - bisect_left(self._word_keys, word))
+        at = words.index(anchor)
+        others = words[:at] + words[at + 1:]  # a repeated anchor is still required again
+        for scanned, i in enumerate(_prefixed(self._word_keys, anchor)):
+            if scanned >= self.max_scan:
+                break
+            symbol = self._word_symbols[i]
+            parts = list(self._name_words[symbol])
+            parts.remove(self._word_keys[i])  # the word the anchor matched
+            if _starts_distinct(others, parts) and add(symbol):
+                break
+        return results
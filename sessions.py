@@ -0,0 +1,342 @@
+"""Server-side sessions.
+
+The session cookie carries only a random id; what Flask keeps in `session`
+(the username, flashed messages) lives in a session store:
+
+- MemorySessionStore: a dict in this process (a single worker, or tests)
+- SQLiteSessionStore: a table in SESSION_DB_FILE, shared by the workers of
+  one node
+- RedisSessionStore: Redis (or anything that speaks its protocol), shared by
+  every node; needs the redis package
+
+A session expires `ttl` seconds after it was last used. So that the auth
+check on each request stays a dict lookup, SessionManager keeps sessions in
+process for `cache_seconds`, pushes the sliding expiry to the store at most
+every `touch_seconds`, and deletes expired sessions in one bulk sweep every
+`sweep_seconds`. revoke_user() ends every session of a user; other
+processes drop theirs within cache_seconds.
+"""
+import copy
+import json
+import secrets
+import sqlite3
+import threading
+import time
+
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+try:
+    import redis
+except ImportError:  # optional; only needed for SESSION_STORE=redis://...
+    redis = None
+
+
+class MemorySessionStore:
+    """Sessions in a dict of this process"""
+
+    def __init__(self):
+        self._sessions = {}  # sid -> (username, data, expires_at)
+        self._by_user = {}  # username -> {sid}
+        self._lock = threading.Lock()
+
+    def load(self, sid):
+        """(username, data, expires_at) or None"""
+        return self._sessions.get(sid)
+
+    def save(self, sid, username, data, expires_at):
+        with self._lock:
+            self._forget(sid)
+            self._sessions[sid] = (username, data, expires_at)
+            if username is not None:
+                self._by_user.setdefault(username, set()).add(sid)
+
+    def touch(self, sid, expires_at):
+        with self._lock:
+            found = self._sessions.get(sid)
+            if found is not None:
+                self._sessions[sid] = (found[0], found[1], expires_at)
+
+    def delete(self, sid):
+        with self._lock:
+            self._forget(sid)
+
+    def delete_user(self, username):
+        """Delete every session of username; returns how many there were"""
+        with self._lock:
+            sids = self._by_user.pop(username, set())
+            for sid in sids:
+                self._sessions.pop(sid, None)
+            return len(sids)
+
+    def sweep(self, now):
+        """Delete every session that expired before now; returns how many"""
+        with self._lock:
+            expired = [sid for sid, (_, _, expires_at) in self._sessions.items() if expires_at <= now]
+            for sid in expired:
+                self._forget(sid)
+            return len(expired)
+
+    def _forget(self, sid):
+        found = self._sessions.pop(sid, None)
+        if found is not None and found[0] is not None:
+            sids = self._by_user.get(found[0])
+            if sids is not None:
+                sids.discard(sid)
+                if not sids:
+                    del self._by_user[found[0]]
+
+
+class SQLiteSessionStore:
+    """Sessions in one SQLite table, in WAL mode"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS sessions (
+            id TEXT PRIMARY KEY,
+            username TEXT,
+            data TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_sessions_username ON sessions (username);
+        CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions (expires_at);
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript(self.SCHEMA)
+
+    def _connect(self):
+        """Return this thread's connection (sqlite3 connections are not shareable)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def load(self, sid):
+        row = self._connect().execute('SELECT username, data, expires_at FROM sessions WHERE id = ?',
+                                      (sid,)).fetchone()
+        return (row[0], json.loads(row[1]), row[2]) if row else None
+
+    def save(self, sid, username, data, expires_at):
+        with self._connect() as conn:
+            conn.execute('INSERT OR REPLACE INTO sessions (id, username, data, expires_at) VALUES (?, ?, ?, ?)',
+                         (sid, username, json.dumps(data), expires_at))
+
+    def touch(self, sid, expires_at):
+        with self._connect() as conn:
+            conn.execute('UPDATE sessions SET expires_at = ? WHERE id = ?', (expires_at, sid))
+
+    def delete(self, sid):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM sessions WHERE id = ?', (sid,))
+
+    def delete_user(self, username):
+        with self._connect() as conn:
+            return conn.execute('DELETE FROM sessions WHERE username = ?', (username,)).rowcount
+
+    def sweep(self, now):
+        with self._connect() as conn:
+            return conn.execute('DELETE FROM sessions WHERE expires_at <= ?', (now,)).rowcount
+
+
+class RedisSessionStore:
+    """Sessions as Redis keys that expire by themselves, plus a set of session ids per user"""
+
+    def __init__(self, client, prefix='stocktrading:'):
+        self.client = client
+        self.prefix = prefix
+
+    def _key(self, sid):
+        return f'{self.prefix}session:{sid}'
+
+    def _user_key(self, username):
+        return f'{self.prefix}user_sessions:{username}'
+
+    def load(self, sid):
+        value = self.client.get(self._key(sid))
+        if value is None:
+            return None
+        found = json.loads(value)
+        return found['username'], found['data'], found['expires_at']
+
+    def save(self, sid, username, data, expires_at):
+        ttl_ms = max(1, int((expires_at - time.time()) * 1000))
+        value = json.dumps({'username': username, 'data': data, 'expires_at': expires_at})
+        pipe = self.client.pipeline()
+        pipe.set(self._key(sid), value, px=ttl_ms)
+        if username is not None:
+            pipe.sadd(self._user_key(username), sid)
+        pipe.execute()
+
+    def touch(self, sid, expires_at):
+        found = self.load(sid)
+        if found is not None:
+            self.save(sid, found[0], found[1], expires_at)
+
+    def delete(self, sid):
+        self.client.delete(self._key(sid))
+
+    def delete_user(self, username):
+        user_key = self._user_key(username)
+        sids = self.client.smembers(user_key)
+        removed = self.client.delete(*(self._key(sid.decode() if isinstance(sid, bytes) else sid)
+                                       for sid in sids)) if sids else 0
+        self.client.delete(user_key)
+        return removed
+
+    def sweep(self, now):
+        return 0  # Redis expires session keys itself; user sets only hold ids, stale ones are harmless
+
+
+def open_session_store(spec, sqlite_path='sessions.db'):
+    """Store named by SESSION_STORE: 'memory', 'sqlite' or a redis:// URL"""
+    if spec.startswith(('redis://', 'rediss://', 'unix://')):
+        if redis is None:
+            raise RuntimeError('SESSION_STORE points at Redis but the redis package is not installed')
+        return RedisSessionStore(redis.Redis.from_url(spec))
+    if spec == 'sqlite':
+        return SQLiteSessionStore(sqlite_path)
+    if spec == 'memory':
+        return MemorySessionStore()
+    raise ValueError(f"Unknown session store: {spec}")
+
+
+class SessionManager:
+    """A session store behind a process-local cache with sliding expiry and periodic sweeps"""
+
+    def __init__(self, store, ttl=86400.0, cache_seconds=5.0, touch_seconds=60.0, sweep_seconds=300.0,
+                 max_cached=100_000):
+        self.store = store
+        self.ttl = ttl
+        self.cache_seconds = cache_seconds
+        self.touch_seconds = touch_seconds
+        self.sweep_seconds = sweep_seconds
+        self.max_cached = max_cached
+        self._cache = {}  # sid -> [username, data, expires_at, cached_until]; read and written under _lock
+        self._next_sweep = time.time() + sweep_seconds
+        self._lock = threading.Lock()  # never held across store calls
+
+    @staticmethod
+    def new_id():
+        return secrets.token_urlsafe(32)
+
+    def load(self, sid):
+        """The session's data, or None if it does not exist or has expired; slides its expiry"""
+        now = time.time()
+        with self._lock:
+            entry = self._cache.get(sid)
+        if entry is None or entry[3] <= now:
+            found = self.store.load(sid)
+            if found is None:
+                with self._lock:
+                    self._cache.pop(sid, None)
+                return None
+            entry = [found[0], found[1], found[2], now + self.cache_seconds]
+            self._remember(sid, entry)
+        if entry[2] <= now:
+            self.delete(sid)
+            return None
+        if entry[2] - self.ttl + self.touch_seconds <= now:
+            entry[2] = now + self.ttl
+            self.store.touch(sid, entry[2])
+        self._maybe_sweep(now)
+        return entry[1]
+
+    def save(self, sid, data):
+        """Store a session's data (data['username'] links it to a user for revoke_user())"""
+        now = time.time()
+        username = data.get('username')
+        expires_at = now + self.ttl
+        self.store.save(sid, username, data, expires_at)
+        self._remember(sid, [username, data, expires_at, now + self.cache_seconds])
+
+    def delete(self, sid):
+        with self._lock:
+            self._cache.pop(sid, None)
+        self.store.delete(sid)
+
+    def revoke_user(self, username):
+        """End every session of username; returns how many the store held"""
+        with self._lock:
+            for sid in [sid for sid, entry in self._cache.items() if entry[0] == username]:
+                self._cache.pop(sid, None)
+        return self.store.delete_user(username)
+
+    def sweep(self, now=None):
+        """Delete expired sessions from the store and the cache; returns how many the store removed"""
+        now = time.time() if now is None else now
+        with self._lock:
+            for sid in [sid for sid, entry in self._cache.items() if entry[2] <= now or entry[3] <= now]:
+                self._cache.pop(sid, None)
+        return self.store.sweep(now)
+
+    def _remember(self, sid, entry):
+        with self._lock:
+            self._cache[sid] = entry
+            full = len(self._cache) > self.max_cached
+        if full:
+            self.sweep()
+
+    def _maybe_sweep(self, now):
+        with self._lock:
+            if now < self._next_sweep:
+                return
+            self._next_sweep = now + self.sweep_seconds
+        self.sweep(now)
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    """Flask session whose contents are kept by a SessionManager"""
+
+    def __init__(self, initial=None, sid=None):
+        def on_update(self):
+            self.modified = True
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.modified = False
+        self.rotate = False
+
+    def regenerate(self):
+        """Move the session to a new id when it is saved (on login, against session fixation)"""
+        self.rotate = True
+        self.modified = True
+
+
+class ServerSessionInterface(SessionInterface):
+    """Plugs a SessionManager into Flask: app.session_interface = ServerSessionInterface(manager)"""
+
+    def __init__(self, manager):
+        self.manager = manager
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            data = self.manager.load(sid)
+            if data is not None:
+                return ServerSession(copy.deepcopy(data), sid)
+        return ServerSession()
+
+    def save_session(self, app, session, response):
+        name, domain, path = self.get_cookie_name(app), self.get_cookie_domain(app), self.get_cookie_path(app)
+        if not session:
+            if session.sid:
+                self.manager.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+        if not session.modified:
+            return
+        sid = session.sid
+        if sid is None or session.rotate:
+            if sid is not None:
+                self.manager.delete(sid)
+            sid = self.manager.new_id()
+        self.manager.save(sid, dict(session))
+        if sid != session.sid:
+            response.set_cookie(name, sid, domain=domain, path=path, httponly=self.get_cookie_httponly(app),
+                                secure=self.get_cookie_secure(app), samesite=self.get_cookie_samesite(app))
+            response.vary.add('Cookie')
@@ -160,6 +160,23 @@ async function apiRequest(url, options = {}) {
     }
 }
 
+/**
+ * Subscribe to live quotes pushed by the server (Server-Sent Events).
+ * Calls onQuotes({SYMBOL: {price, change}}) on every tick; pass null
+ * symbols for all. The browser reconnects by itself; returns the
+ * EventSource so the caller can close() it.
+ */
+function subscribeQuotes(symbols, onQuotes) {
+    const query = symbols && symbols.length ? `?symbols=${encodeURIComponent(symbols.join(','))}` : '';
+    const source = new EventSource(`/api/stream/quotes${query}`);
+    source.addEventListener('quotes', event => {
+        onQuotes(JSON.parse(event.data).quotes);
+    });
+    source.onerror = () => console.warn('Quote stream interrupted, reconnecting...');
+    window.addEventListener('beforeunload', () => source.close());
+    return source;
+}
+
 // ============================================
 // PORTFOLIO UTILITIES
 // ============================================
@@ -0,0 +1,923 @@
+"""Persistence backends for user accounts and transaction history.
+
+JSONStore keeps account state in trading_data.json and transactions in an
+append-only NDJSON log beside it. It is the legacy, small-scale backend and
+stays the default only so existing deployments keep their data: every
+account write re-serializes and rewrites the whole account document.
+SQLiteStore keeps one row per user plus an indexed transactions table, so
+reading or updating an account only touches that user's rows; use it for
+anything beyond a few hundred users.
+
+Both stores expose the same interface; app.py picks one with the
+STORAGE_BACKEND environment variable. Read-modify-write cycles go through
+mutate_user(), which holds the store's write lock for the whole cycle so
+concurrent gunicorn workers cannot lose each other's updates.
+
+Money is stored as integers (see money.py): balance_cents, price_cents and
+total_cents in cents, and avg_micros in micro-dollars. Stores written by
+older versions, with float dollar amounts, are converted when first opened.
+"""
+import copy
+import json
+import os
+import queue
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextlib import contextmanager
+from datetime import datetime
+
+from money import CENTS, to_cents, to_micros
+
+try:
+    import fcntl
+except ImportError:  # Windows: writers are only serialized within one process
+    fcntl = None
+
+STARTING_BALANCE_CENTS = 10000 * CENTS
+
+TRANSACTION_FIELDS = ('id', 'type', 'symbol', 'quantity', 'price_cents', 'total_cents', 'timestamp', 'status')
+DOLLAR_TRANSACTION_FIELDS = ('id', 'type', 'symbol', 'quantity', 'price', 'total', 'timestamp', 'status')
+
+LOG_BLOCK_SIZE = 4 * 1024 * 1024  # bytes parsed per json.loads() when scanning the whole log
+
+
+def new_user_record(password=''):
+    """Build the default account record for a new user"""
+    return {
+        'password': password,
+        'balance_cents': STARTING_BALANCE_CENTS,  # Virtual currency allocation
+        'portfolio': {},  # {symbol: {'shares': int, 'avg_micros': int}}
+        'created_at': datetime.now().isoformat()
+    }
+
+
+def cents_portfolio(portfolio):
+    """Convert {symbol: {'shares', 'avg_price'}} holdings to avg_micros; current ones pass through"""
+    return {symbol: holding if 'avg_micros' in holding
+            else {'shares': int(holding['shares']), 'avg_micros': to_micros(holding['avg_price'])}
+            for symbol, holding in portfolio.items()}
+
+
+def cents_record(record):
+    """An account record with a float dollar balance, converted to integer units"""
+    if 'balance_cents' in record:
+        return record
+    converted = {k: v for k, v in record.items() if k != 'balance'}
+    converted['balance_cents'] = to_cents(record.get('balance') or 0)
+    converted['portfolio'] = cents_portfolio(record.get('portfolio') or {})
+    return converted
+
+
+def cents_transaction(tx):
+    """A transaction with float dollar price/total, converted to cents"""
+    if 'price_cents' in tx:
+        return tx
+    converted = {k: v for k, v in tx.items() if k not in ('price', 'total')}
+    converted['price_cents'] = to_cents(tx.get('price') or 0)
+    converted['total_cents'] = to_cents(tx.get('total') or 0)
+    return converted
+
+
+class JSONStore:
+    """Account state in one compact JSON document, history in an append-only log
+
+    Legacy, small-scale backend: mutate_users() and create_user() rewrite the
+    whole document, so write cost grows with the number of accounts (see
+    SQLiteStore, and migrate_json_to_sqlite()).
+
+    DATA_FILE holds only the mutable account state:
+
+        {"format": 3, "log_size": <committed log bytes>, "users": {username: record}}
+
+    Transactions live next to it in <name>.transactions.ndjson, one compact
+    array per line ([username] + TRANSACTION_FIELDS), so recording a trade
+    appends a line instead of rewriting the history. The document is the
+    commit point: log bytes past log_size belong to a write that never
+    committed and are ignored, then truncated by the next writer. Older
+    documents (inline transaction lists, or format 2 with dollar floats) are
+    converted when first opened.
+
+    For paging, each process keeps an index of row offsets per user, built by
+    one pass over the log and then extended from the last indexed offset as
+    the committed size grows.
+
+    Parsed records are kept in a bounded, process-local LRU. The cache is
+    dropped whenever the document's (mtime, size, inode) no longer matches what
+    this process last read or wrote, so writes from other workers are seen.
+    """
+
+    FORMAT = 3
+
+    def __init__(self, path, cache_size=1024):
+        self.path = path
+        self.log_path = os.path.splitext(path)[0] + '.transactions.ndjson'
+        self.cache_size = cache_size
+        self.version = 0  # bumped by every document write in this process
+        self._cache = OrderedDict()  # username -> {'record': ..., 'transactions': list or None}
+        self._stamp = None
+        self._cache_lock = threading.Lock()
+        self._write_lock = threading.RLock()
+        self._lock_depth = 0
+        self._log_meta = None  # (document stamp, log_size, log_id)
+        self._index = {}  # username -> array('q') of row offsets in the log
+        self._index_size = 0  # log bytes covered by _index
+        self._index_log_id = None
+        self._index_lock = threading.Lock()
+        self._upgrade_legacy_document()
+
+    @contextmanager
+    def _exclusive(self):
+        """Hold the writer lock: an RLock across threads plus flock across processes"""
+        with self._write_lock:
+            if self._lock_depth or fcntl is None:
+                self._lock_depth += 1
+                try:
+                    yield
+                finally:
+                    self._lock_depth -= 1
+                return
+            with open(self.path + '.lock', 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                self._lock_depth += 1
+                try:
+                    yield
+                finally:
+                    self._lock_depth -= 1
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    # -- on-disk format --------------------------------------------------
+
+    @staticmethod
+    def _is_current(raw):
+        return raw.get('format') == JSONStore.FORMAT and isinstance(raw.get('users'), dict)
+
+    def _read_raw(self):
+        if os.path.exists(self.path):
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        return {}
+
+    def _read_doc(self):
+        raw = self._read_raw()
+        if self._is_current(raw):
+            return raw
+        # Older layout seen before _upgrade_legacy_document() ran (or an empty file)
+        users = raw['users'] if isinstance(raw.get('users'), dict) else raw
+        users = {name: cents_record({k: v for k, v in rec.items() if k != 'transactions'})
+                 for name, rec in users.items()}
+        return {'format': self.FORMAT, 'log_size': 0, 'users': users}
+
+    def _upgrade_legacy_document(self):
+        """Bring an older document up to FORMAT.
+
+        Format 1 kept transaction lists inline; they move into the log.
+        Format 2 stored dollar floats; records and log rows become cents.
+        """
+        if not os.path.exists(self.path):
+            return
+        with self._exclusive():
+            raw = self._read_raw()
+            if self._is_current(raw):
+                return
+            if raw.get('format') == 2 and isinstance(raw.get('users'), dict):
+                data = {name: dict(record, transactions=[]) for name, record in raw['users'].items()}
+                for username, tx in self._iter_log(raw['log_size'], fields=DOLLAR_TRANSACTION_FIELDS):
+                    if username in data:
+                        data[username]['transactions'].append(tx)
+                raw = data
+            self.save_all(raw)
+
+    @staticmethod
+    def _encode_row(username, tx):
+        return json.dumps([username] + [tx[field] for field in TRANSACTION_FIELDS], separators=(',', ':'))
+
+    @staticmethod
+    def _decode_row(row, fields=TRANSACTION_FIELDS):
+        return dict(zip(fields, row[1:]))
+
+    def _append_log(self, lines, committed_size):
+        """Drop uncommitted bytes, append lines durably and return the new log size"""
+        mode = 'r+b' if os.path.exists(self.log_path) else 'w+b'
+        with open(self.log_path, mode) as f:
+            f.truncate(committed_size)
+            f.seek(committed_size)
+            if lines:
+                f.write(('\n'.join(lines) + '\n').encode('utf-8'))
+            f.flush()
+            os.fsync(f.fileno())
+            return f.tell()
+
+    def _iter_log(self, log_size, username=None, fields=TRANSACTION_FIELDS):
+        """Yield (username, transaction) for committed log rows, optionally for one user"""
+        if not log_size or not os.path.exists(self.log_path):
+            return
+        with open(self.log_path, 'rb') as f:
+            if username is None:
+                # Parse blocks of whole rows as one JSON array rather than line by line
+                remaining, tail = log_size, b''
+                while remaining > 0:
+                    block = f.read(min(remaining, LOG_BLOCK_SIZE))
+                    if not block:
+                        break
+                    remaining -= len(block)
+                    block = tail + block
+                    cut = block.rfind(b'\n') + 1
+                    block, tail = block[:cut], block[cut:]
+                    if block:
+                        for row in json.loads(b'[' + block[:-1].replace(b'\n', b',') + b']'):
+                            yield row[0], self._decode_row(row, fields)
+                return
+
+            # Rows are written compactly, so one user's rows share an exact prefix
+            # and every other row can be skipped without parsing it.
+            prefix = (json.dumps([username])[:-1] + ',').encode('utf-8')
+            remaining = log_size
+            for line in f:
+                remaining -= len(line)
+                if remaining < 0:
+                    break
+                if line.startswith(prefix):
+                    row = json.loads(line)
+                    yield row[0], self._decode_row(row, fields)
+
+    def _write_doc(self, doc, appended=()):
+        """Atomically replace the document, then write changes through to the cache.
+
+        Written to a temp file and renamed over the original, so readers never
+        see a half-written document. Caller must hold _exclusive().
+        """
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-', suffix='.json')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(doc, f, separators=(',', ':'))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        with self._cache_lock:
+            self.version += 1
+            self._stamp = self._file_stamp()
+            self._log_meta = (self._stamp, doc['log_size'], doc.get('log_id'))
+            for username, entry in self._cache.items():
+                entry['record'] = doc['users'].get(username)
+            for username, tx in appended:
+                entry = self._cache.get(username)
+                if entry is not None and entry['transactions'] is not None:
+                    entry['transactions'].append(tx)
+
+    # -- paging index ----------------------------------------------------
+
+    def _committed_log(self):
+        """(log_size, log_id) of the current document, re-read only when it changed"""
+        stamp = self._file_stamp()
+        with self._cache_lock:
+            if self._log_meta is not None and self._log_meta[0] == stamp:
+                return self._log_meta[1:]
+        doc = self._read_doc()
+        with self._cache_lock:
+            self._log_meta = (stamp, doc['log_size'], doc.get('log_id'))
+            return self._log_meta[1:]
+
+    def _user_offsets(self, username):
+        """Return a snapshot of the user's row offsets, indexing any new log rows first"""
+        log_size, log_id = self._committed_log()
+        with self._index_lock:
+            if log_id != self._index_log_id or log_size < self._index_size:
+                self._index, self._index_size, self._index_log_id = {}, 0, log_id
+            if log_size > self._index_size:
+                decoder = json.JSONDecoder()
+                with open(self.log_path, 'rb') as f:
+                    f.seek(self._index_size)
+                    offset = self._index_size
+                    while offset < log_size:
+                        line = f.readline()
+                        if not line:
+                            break
+                        name, _ = decoder.raw_decode(line.decode('utf-8'), 1)
+                        self._index.setdefault(name, array('q')).append(offset)
+                        offset += len(line)
+                self._index_size = offset
+            return array('q', self._index.get(username, ()))
+
+    # -- cache -----------------------------------------------------------
+
+    def _file_stamp(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def _cached(self, username, field):
+        """Return the cached 'record' or 'transactions' for username, loading on a miss"""
+        stamp = self._file_stamp()
+        with self._cache_lock:
+            if stamp != self._stamp:
+                self._cache.clear()
+                self._stamp = stamp
+            entry = self._cache.get(username)
+            if entry is not None:
+                self._cache.move_to_end(username)
+                if field == 'record' or entry['transactions'] is not None:
+                    return entry[field]
+            version = self.version
+
+        doc = self._read_doc()
+        record = doc['users'].get(username)
+        transactions = None
+        if field == 'transactions':
+            transactions = [tx for _, tx in self._iter_log(doc['log_size'], username)] if record else []
+
+        with self._cache_lock:
+            # Only cache if nothing was written while we were reading
+            if self._stamp == stamp and self.version == version:
+                entry = self._cache.setdefault(username, {'record': record, 'transactions': None})
+                if transactions is not None:
+                    entry['transactions'] = transactions
+                self._cache.move_to_end(username)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return record if field == 'record' else transactions
+
+    # -- public interface --------------------------------------------------
+
+    def load_all(self):
+        """Load everything in the legacy shape: {username: record-with-transactions}"""
+        doc = self._read_doc()
+        data = {name: dict(record, transactions=[]) for name, record in doc['users'].items()}
+        for username, tx in self._iter_log(doc['log_size']):
+            if username in data:
+                data[username]['transactions'].append(tx)
+        return data
+
+    def save_all(self, data):
+        """Replace everything from the legacy {username: record-with-transactions} shape"""
+        data = {name: cents_record(record) for name, record in data.items()}
+        with self._exclusive():
+            lines = [self._encode_row(username, cents_transaction(tx))
+                     for username, record in data.items() for tx in record.get('transactions', [])]
+            users = {name: {k: v for k, v in rec.items() if k != 'transactions'} for name, rec in data.items()}
+            log_size = self._append_log(lines, 0)
+            # A fresh log_id tells every process that offsets into the old log are void
+            self._write_doc({'format': self.FORMAT, 'log_size': log_size, 'log_id': uuid.uuid4().hex,
+                             'users': users})
+            with self._cache_lock:
+                self._cache.clear()
+
+    def get_user(self, username):
+        """Return the account record or None"""
+        record = self._cached(username, 'record')
+        return copy.deepcopy(record) if record is not None else None
+
+    def get_transactions(self, username):
+        """Return the user's transactions, oldest first"""
+        return list(self._cached(username, 'transactions'))
+
+    def get_transactions_page(self, username, cursor=None, limit=50):
+        """Return (transactions newest first, next_cursor) for one page of history.
+
+        cursor is the opaque next_cursor of the previous page (None for the
+        newest page); next_cursor is None once the oldest row is reached.
+        """
+        offsets = self._user_offsets(username)
+        end = len(offsets) if cursor is None else min(int(cursor), len(offsets))
+        start = max(0, end - limit)
+        transactions = []
+        if end > start:
+            with open(self.log_path, 'rb') as f:
+                for offset in reversed(offsets[start:end]):
+                    f.seek(offset)
+                    transactions.append(self._decode_row(json.loads(f.readline())))
+        return transactions, (str(start) if start > 0 else None)
+
+    def iter_transactions(self, username=None, start=None, end=None, cursor=None):
+        """Yield (cursor, username, transaction) oldest first, for one user or every user.
+
+        start and end bound the ISO timestamp (start <= timestamp < end).
+        Each row's cursor resumes an export just after that row. Rows are
+        read from the log one at a time, so memory stays flat however long
+        the history (the document is only read for the committed log size).
+
+        A cursor is 'offset|log_id|timestamp|id' of the row it follows. If
+        save_all() has rewritten the log since (a new log_id), the offset is
+        void and the export resumes by timestamp instead: every row from the
+        cursor's timestamp on except the row itself, so a row stamped in the
+        same microsecond may be sent twice but none is skipped.
+        """
+        log_size, log_id = self._committed_log()
+        log_id = log_id or ''
+        position, after = self._resume_point(cursor, log_id)
+        if not log_size or position >= log_size or not os.path.exists(self.log_path):
+            return
+
+        def wanted(tx):
+            timestamp = tx['timestamp']
+            if after is not None and (timestamp < after[0] or (timestamp == after[0] and tx['id'] == after[1])):
+                return False
+            return (start is None or timestamp >= start) and (end is None or timestamp < end)
+
+        with open(self.log_path, 'rb') as f:
+            if username is not None:
+                offsets = self._user_offsets(username)
+                for i in range(bisect_left(offsets, position), len(offsets)):
+                    f.seek(offsets[i])
+                    line = f.readline()
+                    tx = self._decode_row(json.loads(line))
+                    if wanted(tx):
+                        yield f"{offsets[i] + len(line)}|{log_id}|{tx['timestamp']}|{tx['id']}", username, tx
+                return
+
+            if position:
+                f.seek(position - 1)
+                if f.read(1) != b'\n':
+                    raise ValueError(f'Cursor {cursor} is not at the start of a row')
+            while position < log_size:
+                line = f.readline()
+                if not line:
+                    break
+                position += len(line)
+                row = json.loads(line)
+                tx = self._decode_row(row)
+                if wanted(tx):
+                    yield f"{position}|{log_id}|{tx['timestamp']}|{tx['id']}", row[0], tx
+
+    @staticmethod
+    def _resume_point(cursor, log_id):
+        """(log offset, None) to resume an export at, or (0, (timestamp, id)) if the log was rewritten since"""
+        if cursor is None:
+            return 0, None
+        parts = cursor.split('|')
+        try:
+            position = int(parts[0])
+        except ValueError:
+            raise ValueError(f'Invalid cursor {cursor}') from None
+        if position < 0 or len(parts) not in (1, 4):
+            raise ValueError(f'Invalid cursor {cursor}')
+        if len(parts) == 1 or parts[1] == log_id:  # a bare offset is a cursor from before log ids were added
+            return position, None
+        return 0, (parts[2], parts[3])
+
+    def create_user(self, username, record):
+        """Insert a new user; returns False if the username is taken"""
+        with self._exclusive():
+            doc = self._read_doc()
+            if username in doc['users']:
+                return False
+            doc['users'][username] = {k: v for k, v in record.items() if k != 'transactions'}
+            self._write_doc(doc)
+        return True
+
+    def save_user(self, username, record, transactions=()):
+        """Persist account fields and append any new transactions"""
+        with self._exclusive():
+            doc = self._read_doc()
+            self._commit(doc, {username: record}, [(username, tx) for tx in transactions])
+
+    def _commit(self, doc, records, appended):
+        doc['log_size'] = self._append_log([self._encode_row(u, tx) for u, tx in appended], doc['log_size'])
+        for username, record in records.items():
+            doc['users'][username] = {k: v for k, v in record.items() if k != 'transactions'}
+        self._write_doc(doc, appended)
+
+    def mutate_user(self, username, fn):
+        """Atomically apply fn to a fresh copy of the user's account record.
+
+        fn(record) mutates the record in place and returns (result, new_transactions).
+        Nothing is written if fn raises. Returns fn's result.
+        """
+        result, error = self.mutate_users([(username, fn)])[0]
+        if error is not None:
+            raise error
+        return result
+
+    def mutate_users(self, ops, atomic=False):
+        """Apply several (username, fn) mutations under one lock and one commit.
+
+        Each op is isolated: if its fn raises, its changes are discarded and the
+        exception is returned in its slot. Returns [(result, error), ...].
+        With atomic=True the first failure aborts the call instead: nothing is
+        committed and the outcomes end with that op's error.
+        """
+        outcomes = []
+        with self._exclusive():
+            doc = self._read_doc()
+            records, appended = {}, []
+            for username, fn in ops:
+                current = records.get(username, doc['users'].get(username))
+                if current is None:
+                    outcomes.append((None, KeyError(username)))
+                    if atomic:
+                        return outcomes
+                    continue
+                record = copy.deepcopy(current)
+                try:
+                    result, transactions = fn(record)
+                except Exception as e:
+                    outcomes.append((None, e))
+                    if atomic:
+                        return outcomes
+                    continue
+                records[username] = record
+                appended.extend((username, tx) for tx in transactions)
+                outcomes.append((result, None))
+            if records:
+                self._commit(doc, records, appended)
+        return outcomes
+
+    def usernames(self):
+        return list(self._read_doc()['users'].keys())
+
+    def iter_accounts(self):
+        """Yield (username, record) for every account, without transactions"""
+        yield from self._read_doc()['users'].items()
+
+
+class SQLiteStore:
+    """One row per user and one row per transaction, in WAL mode"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS users (
+            username TEXT PRIMARY KEY,
+            password TEXT NOT NULL,
+            balance_cents INTEGER NOT NULL,
+            portfolio TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            orders TEXT NOT NULL DEFAULT '{}'
+        );
+        CREATE TABLE IF NOT EXISTS transactions (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT NOT NULL,
+            id TEXT NOT NULL,
+            type TEXT NOT NULL,
+            symbol TEXT NOT NULL,
+            quantity INTEGER NOT NULL,
+            price_cents INTEGER NOT NULL,
+            total_cents INTEGER NOT NULL,
+            timestamp TEXT NOT NULL,
+            status TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_transactions_user_time
+            ON transactions (username, timestamp);
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            if 'balance' in {row['name'] for row in conn.execute('PRAGMA table_info(users)')}:
+                self._upgrade_dollar_schema(conn)
+            conn.executescript(self.SCHEMA)
+            if 'orders' not in {row['name'] for row in conn.execute('PRAGMA table_info(users)')}:
+                conn.execute("ALTER TABLE users ADD COLUMN orders TEXT NOT NULL DEFAULT '{}'")
+
+    def _upgrade_dollar_schema(self, conn):
+        """Rebuild tables created with REAL dollar columns with integer money columns, in one transaction"""
+        conn.create_function('cents', 1, to_cents, deterministic=True)
+        conn.create_function('micros_portfolio', 1,
+                             lambda text: json.dumps(cents_portfolio(json.loads(text))), deterministic=True)
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if 'balance' in {row['name'] for row in conn.execute('PRAGMA table_info(users)')}:
+                conn.execute('DROP INDEX IF EXISTS idx_transactions_user_time')
+                conn.execute('ALTER TABLE users RENAME TO users_dollars')
+                conn.execute('ALTER TABLE transactions RENAME TO transactions_dollars')
+                for statement in self.SCHEMA.split(';'):
+                    if statement.strip():
+                        conn.execute(statement)
+                conn.execute('INSERT INTO users (username, password, balance_cents, portfolio, created_at) '
+                             'SELECT username, password, cents(balance), micros_portfolio(portfolio), created_at '
+                             'FROM users_dollars')
+                conn.execute('INSERT INTO transactions (seq, username, id, type, symbol, quantity, price_cents, '
+                             'total_cents, timestamp, status) '
+                             'SELECT seq, username, id, type, symbol, quantity, cents(price), cents(total), '
+                             'timestamp, status FROM transactions_dollars')
+                conn.execute('DROP TABLE users_dollars')
+                conn.execute('DROP TABLE transactions_dollars')
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+
+    def _connect(self):
+        """Return this thread's connection (sqlite3 connections are not shareable)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _user_from_row(row):
+        record = {
+            'password': row['password'],
+            'balance_cents': row['balance_cents'],
+            'portfolio': json.loads(row['portfolio']),
+            'created_at': row['created_at']
+        }
+        orders = json.loads(row['orders'])
+        if orders:
+            record['orders'] = orders  # open orders, see orders.py
+        return record
+
+    @staticmethod
+    def _insert_transactions(conn, username, transactions):
+        conn.executemany(
+            'INSERT INTO transactions (username, id, type, symbol, quantity, price_cents, total_cents, timestamp, status) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            [(username,) + tuple(tx[field] for field in TRANSACTION_FIELDS) for tx in transactions]
+        )
+
+    def get_user(self, username):
+        row = self._connect().execute(
+            'SELECT password, balance_cents, portfolio, created_at, orders FROM users WHERE username = ?', (username,)
+        ).fetchone()
+        return self._user_from_row(row) if row else None
+
+    def get_transactions(self, username):
+        rows = self._connect().execute(
+            'SELECT id, type, symbol, quantity, price_cents, total_cents, timestamp, status '
+            'FROM transactions WHERE username = ? ORDER BY seq', (username,)
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def get_transactions_page(self, username, cursor=None, limit=50):
+        """Newest-first page keyed on (timestamp, seq); same contract as JSONStore"""
+        query = ('SELECT seq, id, type, symbol, quantity, price_cents, total_cents, timestamp, status '
+                 'FROM transactions WHERE username = ?')
+        params = [username]
+        if cursor is not None:
+            timestamp, seq = cursor.rsplit('|', 1)
+            query += ' AND (timestamp, seq) < (?, ?)'
+            params += [timestamp, int(seq)]
+        query += ' ORDER BY timestamp DESC, seq DESC LIMIT ?'
+        params.append(limit + 1)
+        rows = [dict(row) for row in self._connect().execute(query, params)]
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = f"{rows[-1]['timestamp']}|{rows[-1]['seq']}"
+        for row in rows:
+            del row['seq']
+        return rows, next_cursor
+
+    def iter_transactions(self, username=None, start=None, end=None, cursor=None, chunk=1000):
+        """Same contract as JSONStore.iter_transactions.
+
+        Reads `chunk` rows per query, keyed on the last row sent, so no read
+        transaction stays open while a slow client downloads. One user's rows
+        come in (timestamp, seq) order off the (username, timestamp) index,
+        everyone's in seq order.
+        """
+        columns = 'seq, username, id, type, symbol, quantity, price_cents, total_cents, timestamp, status'
+        conditions, params = [], []
+        if username is not None:
+            conditions.append('username = ?')
+            params.append(username)
+        if start is not None:
+            conditions.append('timestamp >= ?')
+            params.append(start)
+        if end is not None:
+            conditions.append('timestamp < ?')
+            params.append(end)
+        if username is not None:
+            order, key = 'timestamp, seq', '(timestamp, seq) > (?, ?)'
+            last = None
+            if cursor is not None:
+                timestamp, seq = cursor.rsplit('|', 1)
+                last = [timestamp, int(seq)]
+        else:
+            order, key = 'seq', 'seq > ?'
+            last = [int(cursor)] if cursor is not None else None
+        while True:
+            where = conditions + ([key] if last is not None else [])
+            query = f'SELECT {columns} FROM transactions'
+            if where:
+                query += ' WHERE ' + ' AND '.join(where)
+            rows = self._connect().execute(f'{query} ORDER BY {order} LIMIT ?',
+                                           params + (last or []) + [chunk]).fetchall()
+            for row in rows:
+                tx = dict(row)
+                seq, name = tx.pop('seq'), tx.pop('username')
+                yield (f"{tx['timestamp']}|{seq}" if username is not None else str(seq)), name, tx
+            if len(rows) < chunk:
+                return
+            last = [rows[-1]['timestamp'], rows[-1]['seq']] if username is not None else [rows[-1]['seq']]
+
+    def create_user(self, username, record):
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    'INSERT INTO users (username, password, balance_cents, portfolio, created_at) VALUES (?, ?, ?, ?, ?)',
+                    (username, record['password'], record['balance_cents'],
+                     json.dumps(record['portfolio']), record['created_at'])
+                )
+        except sqlite3.IntegrityError:
+            return False
+        return True
+
+    def save_user(self, username, record, transactions=()):
+        conn = self._connect()
+        with conn:
+            self._upsert_user(conn, username, record)
+            self._insert_transactions(conn, username, transactions)
+
+    def _upsert_user(self, conn, username, record):
+        conn.execute(
+            'INSERT INTO users (username, password, balance_cents, portfolio, created_at, orders) '
+            'VALUES (?, ?, ?, ?, ?, ?) '
+            'ON CONFLICT(username) DO UPDATE SET password = excluded.password, '
+            'balance_cents = excluded.balance_cents, portfolio = excluded.portfolio, orders = excluded.orders',
+            (username, record['password'], record['balance_cents'],
+             json.dumps(record['portfolio']), record['created_at'], json.dumps(record.get('orders', {})))
+        )
+
+    def mutate_user(self, username, fn):
+        """Atomically apply fn to the user's record inside a BEGIN IMMEDIATE transaction.
+
+        Same contract as JSONStore.mutate_user.
+        """
+        result, error = self.mutate_users([(username, fn)])[0]
+        if error is not None:
+            raise error
+        return result
+
+    def mutate_users(self, ops, atomic=False):
+        """Apply several mutations in one transaction, each inside its own savepoint.
+
+        Same contract as JSONStore.mutate_users.
+        """
+        conn = self._connect()
+        outcomes = []
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            for username, fn in ops:
+                conn.execute('SAVEPOINT op')
+                try:
+                    row = conn.execute(
+                        'SELECT password, balance_cents, portfolio, created_at, orders FROM users WHERE username = ?', (username,)
+                    ).fetchone()
+                    if row is None:
+                        raise KeyError(username)
+                    record = self._user_from_row(row)
+                    result, transactions = fn(record)
+                    self._upsert_user(conn, username, record)
+                    self._insert_transactions(conn, username, transactions)
+                except Exception as e:
+                    outcomes.append((None, e))
+                    if atomic:
+                        conn.rollback()
+                        return outcomes
+                    conn.execute('ROLLBACK TO op')
+                    conn.execute('RELEASE op')
+                    continue
+                conn.execute('RELEASE op')
+                outcomes.append((result, None))
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+        return outcomes
+
+    def usernames(self):
+        return [row[0] for row in self._connect().execute('SELECT username FROM users')]
+
+    def iter_accounts(self):
+        rows = self._connect().execute('SELECT username, password, balance_cents, portfolio, created_at, orders FROM users')
+        for row in rows:
+            yield row['username'], self._user_from_row(row)
+
+    def load_all(self):
+        data = {}
+        for row in self._connect().execute('SELECT username, password, balance_cents, portfolio, created_at, orders FROM users'):
+            data[row['username']] = dict(self._user_from_row(row), transactions=[])
+        for row in self._connect().execute(
+                'SELECT username, id, type, symbol, quantity, price_cents, total_cents, timestamp, status '
+                'FROM transactions ORDER BY seq'):
+            tx = dict(row)
+            username = tx.pop('username')
+            if username in data:
+                data[username]['transactions'].append(tx)
+        return data
+
+    def save_all(self, data):
+        """Replace the entire contents of the database with `data`"""
+        conn = self._connect()
+        with conn:
+            conn.execute('DELETE FROM transactions')
+            conn.execute('DELETE FROM users')
+            for username, record in data.items():
+                record = cents_record(record)
+                conn.execute(
+                    'INSERT INTO users (username, password, balance_cents, portfolio, created_at, orders) '
+                    'VALUES (?, ?, ?, ?, ?, ?)',
+                    (username, record.get('password', ''), record['balance_cents'],
+                     json.dumps(record['portfolio']),
+                     record.get('created_at') or datetime.now().isoformat(), json.dumps(record.get('orders', {})))
+                )
+                self._insert_transactions(conn, username,
+                                          [cents_transaction(tx) for tx in record.get('transactions', [])])
+
+
+class GroupCommitter:
+    """Coalesce mutate_user() calls from many threads into batched commits.
+
+    Mutations are queued to a background thread. It waits `window` seconds
+    after the first queued mutation, then applies everything queued so far
+    with one store.mutate_users() call: one lock acquisition and one durable
+    write. Each caller blocks until its own batch is committed. All other
+    store methods pass straight through to the wrapped store.
+    """
+
+    def __init__(self, store, window=0.005, max_batch=512):
+        self.store = store
+        self.window = window
+        self.max_batch = max_batch
+        self._lock = threading.Lock()
+        self._queue = None
+        self._pid = None
+
+    def __getattr__(self, name):
+        return getattr(self.store, name)
+
+    def _ensure_worker(self):
+        """Start the commit thread lazily, and again after a gunicorn fork"""
+        with self._lock:
+            if self._pid != os.getpid():
+                self._queue = queue.Queue()
+                self._pid = os.getpid()
+                threading.Thread(target=self._run, args=(self._queue,), daemon=True,
+                                 name='group-commit').start()
+            return self._queue
+
+    def mutate_user(self, username, fn):
+        future = Future()
+        self._ensure_worker().put((username, fn, future))
+        return future.result()
+
+    def _collect(self, pending):
+        batch = [pending.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(pending.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self, pending):
+        while True:
+            batch = self._collect(pending)
+            try:
+                outcomes = self.store.mutate_users([(username, fn) for username, fn, _ in batch])
+            except Exception as e:
+                for _, _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, _, future), (result, error) in zip(batch, outcomes):
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(result)
+
+
+def open_store(backend, path, cache_size=1024):
+    """Create the store named by STORAGE_BACKEND ('json', the legacy default, or 'sqlite')"""
+    if backend == 'sqlite':
+        return SQLiteStore(path)
+    if backend == 'json':
+        return JSONStore(path, cache_size=cache_size)
+    raise ValueError(f"Unknown storage backend: {backend}")
+
+
+def migrate_json_to_sqlite(json_path, db_path):
+    """One-shot copy of an existing trading_data.json into a SQLite database"""
+    data = JSONStore(json_path).load_all()
+    SQLiteStore(db_path).save_all(data)
+    return len(data)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 4 or sys.argv[1] != 'migrate':
+        print("Usage: python storage.py migrate <trading_data.json> <trading_data.db>")
+        sys.exit(1)
+    count = migrate_json_to_sqlite(sys.argv[2], sys.argv[3])
+    print(f"Migrated {count} users from {sys.argv[2]} to {sys.argv[3]}")
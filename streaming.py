@@ -0,0 +1,127 @@
+"""Server-Sent Events fan-out of price ticks.
+
+One QuoteHub per worker receives every snapshot from the price engine and
+wakes the open streams. Each event is encoded once per tick and shared:
+a stream of all symbols reuses one byte string, and a stream of a subset
+joins per-symbol fragments that are also encoded once.
+
+Nothing is queued per client. A stream always sends the latest snapshot,
+so a slow client that blocks on its socket skips the ticks it missed
+instead of building up a backlog (conflation), and memory stays flat
+however far behind it falls.
+"""
+import json
+import threading
+import time
+
+
+class HubFull(Exception):
+    """The worker already serves max_subscribers streams"""
+
+
+class QuoteHub:
+    """Latest price snapshot plus the streams waiting for the next one"""
+
+    def __init__(self, snapshot, max_subscribers=500, keepalive=15.0, max_seconds=300.0):
+        self.max_subscribers = max_subscribers
+        self.keepalive = keepalive  # seconds between comments on a quiet stream
+        self.max_seconds = max_seconds  # streams end after this; EventSource reconnects
+        self.subscribers = 0
+        self.published = 0
+        self._snapshot = snapshot
+        self._cond = threading.Condition()
+        self._encoded_version = None
+        self._fragments = {}  # symbol -> b'"SYM":{...}' for the current snapshot
+        self._full = None  # event with every symbol for the current snapshot
+
+    def publish(self, snapshot):
+        """Price engine listener: make snapshot current and wake every stream"""
+        with self._cond:
+            self._snapshot = snapshot
+            self.published += 1
+            self._cond.notify_all()
+
+    def subscribe(self, symbols=None):
+        """Open a stream of quotes for symbols (None for all); raises HubFull"""
+        with self._cond:
+            if self.subscribers >= self.max_subscribers:
+                raise HubFull(f'{self.subscribers} streams open')
+            self.subscribers += 1
+        return Subscription(self, symbols)
+
+    def _release(self):
+        with self._cond:
+            self.subscribers -= 1
+
+    def _wait(self, after_version, timeout):
+        """The current snapshot once its version differs from after_version, or None on timeout"""
+        with self._cond:
+            if self._cond.wait_for(lambda: self._snapshot.version != after_version, timeout):
+                return self._snapshot
+            return None
+
+    def encode(self, snapshot, symbols=None):
+        """SSE 'quotes' event for snapshot, shared by every stream on the same tick"""
+        with self._cond:
+            if self._encoded_version != snapshot.version:
+                self._encoded_version = snapshot.version
+                self._fragments = {}
+                self._full = None
+            if symbols is None:
+                if self._full is None:
+                    quotes = {symbol: {'price': q['price'], 'change': q['change']}
+                              for symbol, q in snapshot.quotes().items()}
+                    self._full = self._event(snapshot, json.dumps(quotes, separators=(',', ':')).encode())
+                return self._full
+            parts = []
+            for symbol in symbols:
+                fragment = self._fragments.get(symbol)
+                if fragment is None:
+                    quote = snapshot.quote(symbol)
+                    fragment = json.dumps({symbol: {'price': quote['price'], 'change': quote['change']}},
+                                          separators=(',', ':'))[1:-1].encode()
+                    self._fragments[symbol] = fragment
+                parts.append(fragment)
+            return self._event(snapshot, b'{' + b','.join(parts) + b'}')
+
+    @staticmethod
+    def _event(snapshot, quotes):
+        return (b'event: quotes\nid: %d\ndata: {"version":%d,"timestamp":%s,"quotes":%s}\n\n'
+                % (snapshot.version, snapshot.version, repr(snapshot.timestamp).encode(), quotes))
+
+
+class Subscription:
+    """WSGI response iterable for one stream; close() frees its slot"""
+
+    def __init__(self, hub, symbols):
+        self._hub = hub
+        self._symbols = symbols
+        self._version = None
+        self._deadline = time.monotonic() + hub.max_seconds
+        self._closed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._closed:
+            raise StopIteration
+        if self._version is None:
+            snapshot = self._hub._snapshot
+            self._version = snapshot.version
+            return b'retry: 1000\n\n' + self._hub.encode(snapshot, self._symbols)
+
+        remaining = self._deadline - time.monotonic()
+        if remaining <= 0:
+            self.close()
+            raise StopIteration
+        snapshot = self._hub._wait(self._version, min(self._hub.keepalive, remaining))
+        if snapshot is None:
+            return b': keepalive\n\n'
+        self._version = snapshot.version
+        return self._hub.encode(snapshot, self._symbols)
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._hub._release()
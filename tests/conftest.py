@@ -0,0 +1,45 @@
+import os
+import sys
+import uuid
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope='session')
+def trading_app(tmp_path_factory):
+    """app.py imported once against a scratch JSON store, static prices and in-memory sessions"""
+    workdir = tmp_path_factory.mktemp('app')
+    os.environ.update({
+        'STORAGE_BACKEND': 'json',
+        'DATA_FILE': str(workdir / 'trading_data.json'),
+        'SESSION_STORE': 'memory',
+        'PRICE_TICK_SECONDS': '0',
+        'USE_DYNAMODB': 'false',
+        'SNS_ENABLED': 'false',
+        'LOGIN_IP_BURST': '100000',  # every test client logs in from 127.0.0.1
+    })
+    import app
+    yield app
+    app.notifier.close()
+
+
+@pytest.fixture
+def new_client(trading_app):
+    """Factory of test clients, each logged in as a new user (client.username)"""
+    def new_client():
+        client = trading_app.app.test_client()
+        username = f'user-{uuid.uuid4().hex[:8]}'
+        client.post('/signup', data={'username': username, 'password': 'pw', 'confirm_password': 'pw'})
+        response = client.post('/login', data={'username': username, 'password': 'pw'})
+        assert response.status_code == 302 and 'dashboard' in response.location
+        client.username = username
+        return client
+    return new_client
+
+
+@pytest.fixture
+def client(new_client):
+    """Test client logged in as a new user"""
+    return new_client()
@@ -0,0 +1,29 @@
+def test_invalid_entries_are_rejected_per_order(trading_app, client):
+    orders = [{'symbol': 'AAPL', 'side': 'BUY', 'quantity': 1}, 'AAPL',
+              {'symbol': 'MSFT', 'side': 'BUY', 'quantity': 'abc'}, {'symbol': 'GOOGL', 'side': 'BUY', 'quantity': None}]
+    response = client.post('/api/orders/batch', json={'orders': orders})
+    assert response.status_code == 400
+    body = response.get_json()
+    assert body['error'] == 'Order must be an object'
+    assert [(r['status'], r.get('error')) for r in body['results']] == [
+        ('NOT_EXECUTED', None),
+        ('REJECTED', 'Order must be an object'),
+        ('REJECTED', 'Quantity must be a whole number'),
+        ('REJECTED', 'Quantity must be a whole number'),
+    ]
+    assert body['results'][2]['quantity'] == 'abc'
+    assert trading_app.store.get_user(client.username)['portfolio'] == {}
+
+
+def test_body_must_hold_a_list(client):
+    for body in ({'orders': {'symbol': 'AAPL'}}, {'orders': []}, ['AAPL'], {}):
+        response = client.post('/api/orders/batch', json=body)
+        assert response.status_code == 400 and response.get_json()['error'] == 'orders must be a non-empty list'
+
+
+def test_valid_batch_executes(trading_app, client):
+    orders = [{'symbol': 'AAPL', 'side': 'BUY', 'quantity': '2'}, {'symbol': 'MSFT', 'side': 'buy', 'quantity': 1}]
+    body = client.post('/api/orders/batch', json={'orders': orders}).get_json()
+    assert body['success'] and [r['status'] for r in body['results']] == ['EXECUTED', 'EXECUTED']
+    portfolio = trading_app.store.get_user(client.username)['portfolio']
+    assert portfolio['AAPL']['shares'] == 2 and portfolio['MSFT']['shares'] == 1
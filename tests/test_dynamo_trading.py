@@ -0,0 +1,154 @@
+
+import pytest
+
+moto = pytest.importorskip('moto')
+boto3 = pytest.importorskip('boto3')
+mock_aws = getattr(moto, 'mock_aws', None) or moto.mock_dynamodb  # moto < 5
+
+import aws_clients  # noqa: E402
+import dynamo_trading  # noqa: E402
+from money import to_cents  # noqa: E402
+from trading import BatchError, TradeError  # noqa: E402
+
+TABLES = {
+    aws_clients.USERS_TABLE: [('username', 'HASH')],
+    aws_clients.PORTFOLIOS_TABLE: [('username', 'HASH')],
+    aws_clients.TRANSACTIONS_TABLE: [('username', 'HASH'), ('transaction_id', 'RANGE')],
+}
+
+
+class CountingClient:
+    """Counts calls per method; before_write(client) runs ahead of the first TransactWriteItems"""
+
+    def __init__(self, client, before_write=None):
+        self.client = client
+        self.before_write = before_write
+        self.calls = {}
+
+    def __getattr__(self, name):
+        method = getattr(self.client, name)
+
+        def call(*args, **kwargs):
+            self.calls[name] = self.calls.get(name, 0) + 1
+            if name == 'transact_write_items' and self.before_write:
+                before_write, self.before_write = self.before_write, None
+                before_write(self.client)
+            return method(*args, **kwargs)
+        return call
+
+
+@pytest.fixture
+def dynamodb(monkeypatch):
+    for name in ('AWS_ENDPOINT_URL', 'AWS_ENDPOINT_URL_DYNAMODB'):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'testing')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'testing')
+    with mock_aws():
+        client = boto3.client('dynamodb', region_name='us-east-1')
+        for name, keys in TABLES.items():
+            client.create_table(
+                TableName=name, BillingMode='PAY_PER_REQUEST',
+                KeySchema=[{'AttributeName': attr, 'KeyType': kind} for attr, kind in keys],
+                AttributeDefinitions=[{'AttributeName': attr, 'AttributeType': 'S'} for attr, _ in keys])
+        client.put_item(TableName=aws_clients.USERS_TABLE,
+                        Item={'username': {'S': 'alice'}, 'balance': {'N': '1000'}})
+        yield client
+
+
+def balance(client):
+    """alice's stored balance in cents"""
+    item = client.get_item(TableName=aws_clients.USERS_TABLE, Key={'username': {'S': 'alice'}})['Item']
+    return to_cents(item['balance']['N'])
+
+
+def portfolio(client):
+    return client.get_item(TableName=aws_clients.PORTFOLIOS_TABLE, Key={'username': {'S': 'alice'}}).get('Item')
+
+
+def transactions(client):
+    return client.query(TableName=aws_clients.TRANSACTIONS_TABLE, KeyConditionExpression='username = :u',
+                        ExpressionAttributeValues={':u': {'S': 'alice'}})['Items']
+
+
+def test_buy_and_sell_write_everything_in_one_transaction(dynamodb):
+    client = CountingClient(dynamodb)
+    transaction, new_balance = dynamo_trading.execute_buy(client, 'alice', 'AAPL', 3, 18250)
+    assert new_balance == 100000 - 3 * 18250 and balance(dynamodb) == 45250
+    assert transaction['type'] == 'BUY' and transaction['total_cents'] == 54750
+    assert client.calls == {'transact_get_items': 1, 'get_item': 1, 'transact_write_items': 1}  # new portfolio
+
+    held = portfolio(dynamodb)
+    assert held['version'] == {'N': '1'} and 'AAPL' in held['holdings']['M']
+
+    client = CountingClient(dynamodb)
+    _, new_balance = dynamo_trading.execute_sell(client, 'alice', 'AAPL', 1, 20000)
+    assert new_balance == 45250 + 20000 and balance(dynamodb) == 65250
+    assert client.calls == {'transact_get_items': 1, 'transact_write_items': 1}
+
+    dynamo_trading.execute_sell(dynamodb, 'alice', 'AAPL', 2, 20000)
+    held = portfolio(dynamodb)
+    assert held['version'] == {'N': '3'} and 'AAPL' not in held['holdings']['M']
+    assert sorted(item['type']['S'] for item in transactions(dynamodb)) == ['BUY', 'SELL', 'SELL']
+
+
+def test_insufficient_balance_writes_nothing(dynamodb):
+    with pytest.raises(TradeError, match='Insufficient balance'):
+        dynamo_trading.execute_buy(dynamodb, 'alice', 'AAPL', 10, 18250)
+    assert balance(dynamodb) == 100000 and portfolio(dynamodb) is None and transactions(dynamodb) == []
+
+
+def test_insufficient_shares_writes_nothing(dynamodb):
+    with pytest.raises(TradeError, match='do not own'):
+        dynamo_trading.execute_sell(dynamodb, 'alice', 'AAPL', 1, 18250)
+    dynamo_trading.execute_buy(dynamodb, 'alice', 'AAPL', 2, 10000)
+    with pytest.raises(TradeError, match='Insufficient shares. You own 2'):
+        dynamo_trading.execute_sell(dynamodb, 'alice', 'AAPL', 3, 10000)
+    assert balance(dynamodb) == 80000 and len(transactions(dynamodb)) == 1
+
+
+def test_concurrent_balance_change_fails_the_condition_and_retries(dynamodb):
+    def spend_elsewhere(client):
+        client.update_item(TableName=aws_clients.USERS_TABLE, Key={'username': {'S': 'alice'}},
+                           UpdateExpression='SET balance = :b', ExpressionAttributeValues={':b': {'N': '900'}})
+
+    client = CountingClient(dynamodb, before_write=spend_elsewhere)
+    _, new_balance = dynamo_trading.execute_buy(client, 'alice', 'AAPL', 1, 10000)
+    assert new_balance == 80000 and balance(dynamodb) == 80000  # re-read after the condition failed
+    assert client.calls['transact_write_items'] == 2 and len(transactions(dynamodb)) == 1
+
+
+def test_concurrent_spend_leaves_insufficient_balance(dynamodb):
+    def spend_elsewhere(client):
+        client.update_item(TableName=aws_clients.USERS_TABLE, Key={'username': {'S': 'alice'}},
+                           UpdateExpression='SET balance = :b', ExpressionAttributeValues={':b': {'N': '50'}})
+
+    client = CountingClient(dynamodb, before_write=spend_elsewhere)
+    with pytest.raises(TradeError, match='Insufficient balance'):
+        dynamo_trading.execute_buy(client, 'alice', 'AAPL', 1, 10000)
+    assert balance(dynamodb) == 5000 and portfolio(dynamodb) is None and transactions(dynamodb) == []
+
+
+def test_concurrent_sell_fails_the_version_condition(dynamodb):
+    dynamo_trading.execute_buy(dynamodb, 'alice', 'AAPL', 2, 10000)
+
+    def sell_elsewhere(client):
+        dynamo_trading.execute_sell(client, 'alice', 'AAPL', 2, 10000)
+
+    client = CountingClient(dynamodb, before_write=sell_elsewhere)
+    with pytest.raises(TradeError, match='do not own'):
+        dynamo_trading.execute_sell(client, 'alice', 'AAPL', 2, 10000)
+    assert balance(dynamodb) == 100000 and len(transactions(dynamodb)) == 2
+
+
+def test_batch_is_all_or_nothing(dynamodb):
+    dynamo_trading.execute_buy(dynamodb, 'alice', 'AAPL', 2, 10000)
+    # sells run first, so the sale of AAPL funds the MSFT buy the balance alone could not
+    trades = [('BUY', 'MSFT', 3, 30000), ('SELL', 'AAPL', 2, 11000), ('BUY', 'AAPL', 1, 100)]
+    new, new_balance = dynamo_trading.execute_batch(dynamodb, 'alice', trades)
+    assert [t['symbol'] for t in new] == ['MSFT', 'AAPL', 'AAPL'] and new_balance == 80000 + 22000 - 90000 - 100
+    assert balance(dynamodb) == 11900 and len(transactions(dynamodb)) == 4
+
+    with pytest.raises(BatchError) as rejected:
+        dynamo_trading.execute_batch(dynamodb, 'alice', [('BUY', 'AAPL', 1, 100), ('SELL', 'MSFT', 5, 30000)])
+    assert rejected.value.index == 1
+    assert balance(dynamodb) == 11900 and len(transactions(dynamodb)) == 4
@@ -0,0 +1,31 @@
+import pytest
+
+from storage import JSONStore
+from trading import make_transaction
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = JSONStore(str(tmp_path / 'trading_data.json'))
+    for username in ('alice', 'bob'):
+        store.create_user(username, {'password': 'x', 'balance_cents': 0, 'portfolio': {}, 'created_at': ''})
+    for i in range(6):
+        username = 'alice' if i % 2 else 'bob'
+        store.save_user(username, store.get_user(username), [make_transaction('BUY', 'AAPL', i + 1, 100, 100 * (i + 1))])
+    return store
+
+
+@pytest.mark.parametrize('username', [None, 'alice'])
+def test_cursor_survives_log_rewrite(store, username):
+    rows = list(store.iter_transactions(username))
+    cursor = rows[1][0]
+    store.save_all(store.load_all())  # rewrites the log grouped by user, under a new log id
+    resumed = [tx['id'] for _, _, tx in store.iter_transactions(username, cursor=cursor)]
+    assert sorted(resumed) == sorted(tx['id'] for _, _, tx in rows[2:])
+
+
+def test_cursor_resumes_after_its_row(store):
+    rows = list(store.iter_transactions())
+    assert [tx['id'] for _, _, tx in store.iter_transactions(cursor=rows[2][0])] == [tx['id'] for _, _, tx in rows[3:]]
+    with pytest.raises(ValueError):
+        list(store.iter_transactions(cursor='junk'))
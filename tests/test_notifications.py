@@ -0,0 +1,116 @@
+import threading
+import time
+
+from notifications import NotificationDispatcher, StubPublisher
+
+
+def message(i):
+    return {'username': 'alice', 'subject': 'Stock Purchase Confirmed', 'message': f'order {i}'}
+
+
+class FlakyPublisher:
+    """Fails every message the first time it is seen"""
+
+    def __init__(self):
+        self.seen = set()
+        self.sent = []
+
+    def publish_batch(self, messages):
+        failed = [m for m in messages if m['message'] not in self.seen]
+        self.seen.update(m['message'] for m in failed)
+        self.sent.extend(m for m in messages if m not in failed)
+        return failed
+
+
+class BlockingPublisher:
+    """Hangs until released, then raises, like an SNS endpoint that times out"""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.calls = 0
+
+    def publish_batch(self, messages):
+        self.calls += 1
+        self.release.wait(10)
+        raise ConnectionError('SNS unreachable')
+
+
+def test_delivers_in_batches():
+    publisher = StubPublisher()
+    dispatcher = NotificationDispatcher(publisher, workers=1, max_batch=10)
+    for i in range(25):
+        assert dispatcher.submit(message(i))
+    assert dispatcher.flush(5)
+    assert sorted(m['message'] for m in publisher.sent) == sorted(f'order {i}' for i in range(25))
+    metrics = dispatcher.metrics()
+    assert metrics['sent'] == metrics['submitted'] == 25
+    assert metrics['batches'] >= 3 and metrics['queued'] == metrics['in_flight'] == 0
+    dispatcher.close()
+
+
+def test_retries_failed_messages():
+    publisher = FlakyPublisher()
+    dispatcher = NotificationDispatcher(publisher, workers=1, base_delay=0.01, max_delay=0.05)
+    for i in range(3):
+        dispatcher.submit(message(i))
+    assert dispatcher.flush(5)
+    assert len(publisher.sent) == 3
+    metrics = dispatcher.metrics()
+    assert metrics['retried'] == 3 and metrics['sent'] == 3 and metrics['failed'] == 0
+    dispatcher.close()
+
+
+def test_gives_up_after_max_retries():
+    publisher = StubPublisher(fail_rate=1.0)
+    dispatcher = NotificationDispatcher(publisher, workers=1, max_retries=2, base_delay=0.01)
+    dispatcher.submit(message(0))
+    assert dispatcher.flush(5)
+    metrics = dispatcher.metrics()
+    assert metrics['failed'] == 1 and metrics['retried'] == 2 and publisher.calls == 3
+    dispatcher.close()
+
+
+def test_full_queue_drops_without_spool():
+    publisher = BlockingPublisher()
+    dispatcher = NotificationDispatcher(publisher, workers=1, max_queue=2, max_batch=1)
+    results = [dispatcher.submit(message(i)) for i in range(5)]  # one in flight, two queued
+    assert results.count(False) >= 2
+    assert dispatcher.metrics()['dropped'] == results.count(False)
+    publisher.release.set()
+    dispatcher.close(timeout=0)
+
+
+def test_full_queue_spools_and_drains(tmp_path):
+    publisher = BlockingPublisher()
+    spool = tmp_path / 'notifications.ndjson'
+    dispatcher = NotificationDispatcher(publisher, workers=1, max_queue=1, max_batch=1, spool_path=str(spool))
+    assert all(dispatcher.submit(message(i)) for i in range(4))
+    assert dispatcher.metrics()['spooled'] >= 2 and spool.stat().st_size > 0
+
+    dispatcher.publisher = stub = StubPublisher()
+    publisher.release.set()
+    deadline = time.monotonic() + 10
+    while len(stub.sent) < 3 and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert {m['message'] for m in stub.sent} >= {'order 1', 'order 2', 'order 3'}
+    dispatcher.close()
+
+
+def test_failing_publisher_does_not_block_trade(trading_app, client, monkeypatch):
+    publisher = BlockingPublisher()
+    monkeypatch.setattr(trading_app, 'notifier', NotificationDispatcher(publisher, workers=1, max_retries=0))
+
+    started = time.perf_counter()
+    response = client.post('/api/buy', json={'symbol': 'AAPL', 'quantity': 2})
+    elapsed = time.perf_counter() - started
+    assert response.status_code == 200 and response.get_json()['success']
+    assert elapsed < 2  # the publisher hangs for up to 10 seconds
+
+    response = client.post('/api/sell', json={'symbol': 'AAPL', 'quantity': 1})
+    assert response.status_code == 200 and response.get_json()['success']
+    assert trading_app.store.get_user(client.username)['portfolio']['AAPL']['shares'] == 1
+
+    publisher.release.set()
+    assert trading_app.notifier.flush(5)
+    assert trading_app.notifier.metrics()['failed'] == 2
+    trading_app.notifier.close()
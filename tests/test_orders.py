@@ -0,0 +1,52 @@
+import pytest
+
+
+@pytest.mark.parametrize('body, error', [
+    ({'quantity': 'abc', 'price': 100}, 'Quantity must be a whole number'),
+    ({'quantity': None, 'price': 100}, 'Quantity must be a whole number'),
+    ({'quantity': 1, 'price': 'abc'}, 'Limit price must be a number'),
+    ({'quantity': 1, 'price': [100]}, 'Limit price must be a number'),
+    ({'quantity': 1, 'price': -5}, 'Limit price must be positive'),
+])
+def test_invalid_order_is_rejected(client, body, error):
+    response = client.post('/api/orders', json=dict(body, symbol='AAPL', side='BUY'))
+    assert response.status_code == 400 and response.get_json() == {'success': False, 'error': error}
+
+
+def test_market_order_reports_the_unfilled_part(trading_app, client, new_client):
+    seller = new_client()
+    assert seller.post('/api/buy', json={'symbol': 'TSLA', 'quantity': 2}).get_json()['success']
+    assert seller.post('/api/orders', json={'symbol': 'TSLA', 'side': 'SELL', 'quantity': 2, 'price': 100}).status_code == 200
+
+    market_buy = {'symbol': 'TSLA', 'side': 'BUY', 'type': 'MARKET', 'quantity': 5}
+    order = client.post('/api/orders', json=market_buy).get_json()['order']
+    assert (order['quantity'], order['remaining'], order['status']) == (5, 3, 'PARTIALLY_FILLED')
+    assert order['fills'] == [{'price': 100.0, 'quantity': 2}]
+    record = trading_app.store.get_user(client.username)
+    assert record['portfolio']['TSLA']['shares'] == 2 and 'orders' not in record
+
+    order = client.post('/api/orders', json=market_buy).get_json()['order']
+    assert (order['quantity'], order['remaining'], order['status'], order['fills']) == (5, 5, 'CANCELLED', [])
+
+
+def test_failed_settlement_leaves_book_and_accounts_unchanged(trading_app, client, new_client, monkeypatch):
+    import orders
+
+    seller = new_client()
+    assert seller.post('/api/buy', json={'symbol': 'META', 'quantity': 3}).get_json()['success']
+    assert seller.post('/api/orders', json={'symbol': 'META', 'side': 'SELL', 'quantity': 3, 'price': 100}).status_code == 200
+    store = trading_app.store
+    before = store.get_user(client.username), store.get_user(seller.username)
+
+    def broken(record, fills):
+        raise OSError('disk full')
+    monkeypatch.setattr(orders, '_apply_fills', broken)
+    response = client.post('/api/orders', json={'symbol': 'META', 'side': 'BUY', 'quantity': 2, 'price': 100})
+    assert response.status_code == 400 and response.get_json()['error'] == 'Order could not be settled: disk full'
+    assert (store.get_user(client.username), store.get_user(seller.username)) == before
+    assert client.get('/api/book/META').get_json()['asks'] == [{'price': 100.0, 'quantity': 3}]
+
+    monkeypatch.undo()
+    order = client.post('/api/orders', json={'symbol': 'META', 'side': 'BUY', 'quantity': 2, 'price': 100}).get_json()['order']
+    assert order['status'] == 'FILLED' and store.get_user(client.username)['portfolio']['META']['shares'] == 2
+    assert client.get('/api/book/META').get_json()['asks'] == [{'price': 100.0, 'quantity': 1}]
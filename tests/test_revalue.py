@@ -0,0 +1,37 @@
+import pytest
+
+pytest.importorskip('numpy')
+
+
+@pytest.fixture
+def admin(trading_app, client, monkeypatch):
+    monkeypatch.setattr(trading_app, 'ADMIN_USERS', {client.username})
+    return client
+
+
+@pytest.mark.parametrize('body', [
+    {'prices': {'AAPL': 'abc'}},
+    {'prices': {'AAPL': None}},
+    {'prices': {'AAPL': -1}},
+    {'prices': ['AAPL']},
+    {'limit': 'ten'},
+    {'limit': [1]},
+    ['AAPL'],
+])
+def test_invalid_body_is_rejected(admin, body):
+    response = admin.post('/api/admin/revalue', json=body)
+    assert response.status_code == 400 and 'error' in response.get_json()
+
+
+def test_revalues_at_given_prices(admin):
+    assert admin.post('/api/buy', json={'symbol': 'AAPL', 'quantity': 2}).get_json()['success']
+    body = admin.post('/api/admin/revalue', json={'prices': {'aapl': 200}, 'limit': '5', 'rebuild': True}).get_json()
+    assert body['prices']['AAPL'] == 200.0 and len(body['leaderboard']) == min(5, body['users'])
+    assert body['total_market_value'] >= 400.0
+
+
+def test_dynamodb_mode_is_rejected(trading_app, admin, monkeypatch):
+    monkeypatch.setattr(trading_app, 'USE_DYNAMODB', True)
+    monkeypatch.setattr(trading_app, 'aws_manager', object())
+    response = admin.post('/api/admin/revalue', json={})
+    assert response.status_code == 400 and response.get_json()['error'] == 'Bulk revaluation needs the local store'
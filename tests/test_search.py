@@ -0,0 +1,17 @@
+from search import SymbolIndex
+
+STOCKS = {
+    'BK': {'name': 'Bank Corp'},
+    'BB': {'name': 'Bank of Bank'},
+    'MS': {'name': 'Micro Systems Corp'},
+    'MM': {'name': 'Micro Microsystems'},
+}
+
+
+def test_every_query_word_needs_its_own_name_word():
+    index = SymbolIndex(STOCKS)
+    assert index.search('bank') == ['BK', 'BB']
+    assert index.search('bank bank') == ['BB']
+    assert index.search('bank bank bank') == []
+    assert index.search('corp micro') == ['MS']
+    assert index.search('micro mic') == ['MM']
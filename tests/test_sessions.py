@@ -0,0 +1,48 @@
+import threading
+
+from sessions import MemorySessionStore, SessionManager
+
+
+def test_load_save_revoke():
+    manager = SessionManager(MemorySessionStore(), ttl=60, cache_seconds=60)
+    manager.save('a', {'username': 'alice', 'n': 1})
+    manager.save('b', {'username': 'alice'})
+    manager.save('c', {'username': 'bob'})
+    assert manager.load('a') == {'username': 'alice', 'n': 1}
+    assert manager.revoke_user('alice') == 2
+    assert manager.load('a') is None and manager.load('b') is None and manager.load('c') == {'username': 'bob'}
+    manager.delete('c')
+    assert manager.load('c') is None
+
+
+def test_expired_session_is_gone():
+    manager = SessionManager(MemorySessionStore(), ttl=0.01, cache_seconds=60)
+    manager.save('a', {'username': 'alice'})
+    threading.Event().wait(0.02)
+    assert manager.load('a') is None
+
+
+def test_concurrent_requests_sweeping_and_revoking():
+    # a small cache makes every save sweep, while other threads load, delete and revoke
+    manager = SessionManager(MemorySessionStore(), ttl=60, cache_seconds=0.001, sweep_seconds=0, max_cached=8)
+    errors = []
+
+    def worker(n):
+        try:
+            for i in range(2000):
+                sid = f'{n}-{i % 50}'
+                manager.save(sid, {'username': f'user{i % 5}'})
+                manager.load(sid)
+                if i % 7 == 0:
+                    manager.delete(sid)
+                if i % 101 == 0:
+                    manager.revoke_user(f'user{i % 5}')
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
@@ -0,0 +1,145 @@
+"""Trade execution against the local store.
+
+Each trade runs through store.mutate_user(), so the balance/holdings check,
+the portfolio update and the transaction record are applied atomically
+against the latest copy of the user's account. All amounts are ints:
+balances, prices and totals in cents, average prices in micro-dollars
+(see money.py).
+"""
+import uuid
+from datetime import datetime
+
+from money import CENT_MICROS, fill_avg
+
+
+class TradeError(Exception):
+    """A trade was rejected (insufficient balance or shares)"""
+
+
+class BatchError(TradeError):
+    """A batch was rejected because the order at `index` could not execute"""
+
+    def __init__(self, index, message):
+        super().__init__(message)
+        self.index = index
+
+
+def make_transaction(trade_type, symbol, quantity, price_cents, total_cents):
+    """Build a confirmed transaction record"""
+    return {
+        'id': str(uuid.uuid4()),
+        'type': trade_type,
+        'symbol': symbol,
+        'quantity': quantity,
+        'price_cents': price_cents,
+        'total_cents': total_cents,
+        'timestamp': datetime.now().isoformat(),
+        'status': 'CONFIRMED'
+    }
+
+
+def update_position(portfolio, trade_type, symbol, quantity, price_cents):
+    """Apply a fill to a {symbol: {'shares', 'avg_micros'}} portfolio in place.
+
+    Shared with the valuation engine so both sides compute identical positions.
+    """
+    if trade_type == 'BUY':
+        if symbol in portfolio:
+            holding = portfolio[symbol]
+            holding['avg_micros'] = fill_avg(holding['shares'], holding['avg_micros'], quantity, price_cents)
+            holding['shares'] += quantity
+        else:
+            portfolio[symbol] = {'shares': quantity, 'avg_micros': price_cents * CENT_MICROS}
+    else:
+        portfolio[symbol]['shares'] -= quantity
+        if portfolio[symbol]['shares'] == 0:
+            del portfolio[symbol]
+
+
+def apply_buy(user_data, symbol, quantity, price_cents):
+    """Debit the balance and add shares in place; returns the transaction"""
+    total_cost = price_cents * quantity
+    if total_cost > user_data.get('balance_cents', 0):
+        raise TradeError('Insufficient balance')
+
+    user_data['balance_cents'] -= total_cost
+    update_position(user_data.setdefault('portfolio', {}), 'BUY', symbol, quantity, price_cents)
+    return make_transaction('BUY', symbol, quantity, price_cents, total_cost)
+
+
+def reserved_shares(user_data, symbol):
+    """Shares of symbol promised to the user's open sell orders (see orders.py)"""
+    return sum(order['remaining'] for order in user_data.get('orders', {}).values()
+               if order['side'] == 'SELL' and order['symbol'] == symbol)
+
+
+def apply_sell(user_data, symbol, quantity, price_cents):
+    """Remove shares and credit the balance in place; returns the transaction"""
+    portfolio = user_data.get('portfolio', {})
+    if symbol not in portfolio:
+        raise TradeError('You do not own this stock')
+
+    owned_shares = portfolio[symbol]['shares']
+    if quantity > owned_shares:
+        raise TradeError(f'Insufficient shares. You own {owned_shares}')
+    reserved = reserved_shares(user_data, symbol)
+    if quantity > owned_shares - reserved:
+        raise TradeError(f'Insufficient shares. {reserved} of your {owned_shares} are reserved by open orders')
+
+    total_proceeds = price_cents * quantity
+    user_data['balance_cents'] += total_proceeds
+    update_position(portfolio, 'SELL', symbol, quantity, price_cents)
+    return make_transaction('SELL', symbol, quantity, price_cents, total_proceeds)
+
+
+def _execute(store, username, apply, symbol, quantity, price_cents):
+    def mutate(user_data):
+        transaction = apply(user_data, symbol, quantity, price_cents)
+        return (transaction, user_data['balance_cents']), [transaction]
+    return store.mutate_user(username, mutate)
+
+
+def execute_buy(store, username, symbol, quantity, price_cents):
+    """Atomically buy shares; returns (transaction, new_balance_cents) or raises TradeError"""
+    return _execute(store, username, apply_buy, symbol, quantity, price_cents)
+
+
+def execute_sell(store, username, symbol, quantity, price_cents):
+    """Atomically sell shares; returns (transaction, new_balance_cents) or raises TradeError"""
+    return _execute(store, username, apply_sell, symbol, quantity, price_cents)
+
+
+def batch_order(trades):
+    """Indices of [(type, symbol, quantity, price_cents)] in execution order: sells first, so they fund the buys"""
+    return sorted(range(len(trades)), key=lambda i: trades[i][0] != 'SELL')
+
+
+def apply_batch(user_data, trades):
+    """Apply every trade in place; returns their transactions in execution order or raises BatchError.
+
+    The caller discards user_data on error, which makes the batch all or nothing.
+    """
+    transactions = []
+    for i in batch_order(trades):
+        trade_type, symbol, quantity, price_cents = trades[i]
+        apply = apply_buy if trade_type == 'BUY' else apply_sell
+        try:
+            transactions.append(apply(user_data, symbol, quantity, price_cents))
+        except TradeError as e:
+            raise BatchError(i, str(e)) from None
+    return transactions
+
+
+def execute_batch(store, username, trades):
+    """Atomically execute a list of trades with one write.
+
+    Returns (transactions in request order, new_balance_cents) or raises BatchError.
+    """
+    def mutate(user_data):
+        transactions = apply_batch(user_data, trades)
+        return (transactions, user_data['balance_cents']), transactions
+    transactions, new_balance = store.mutate_user(username, mutate)
+    by_request = [None] * len(trades)
+    for i, transaction in zip(batch_order(trades), transactions):
+        by_request[i] = transaction
+    return by_request, new_balance
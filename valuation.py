@@ -0,0 +1,142 @@
+"""Incrementally maintained portfolio valuations.
+
+The engine keeps, per user, ready-to-render position rows and running
+totals (market value, cost basis, unrealized P&L). Trades update only the
+touched position; a price change updates only the users holding that symbol.
+Page views then read the precomputed totals instead of looping over every
+holding on each render.
+
+Books are process-local. Each one remembers the portfolio it was built from,
+and summary() rebuilds it when the stored portfolio differs (for example
+after a trade handled by another gunicorn worker).
+
+Amounts are integers (see money.py): prices, values and gains in cents, cost
+basis summed in micro-dollars, so running totals never drift no matter how
+many incremental updates they absorb.
+"""
+import copy
+import threading
+from collections import OrderedDict
+
+from money import CENT_MICROS, micros_to_cents, to_cents
+from trading import update_position
+
+
+class _Book:
+    __slots__ = ('portfolio', 'positions', 'market_value', 'cost_micros')
+
+    def __init__(self, portfolio):
+        self.portfolio = portfolio  # {symbol: {'shares', 'avg_micros'}} as stored
+        self.positions = {}  # symbol -> position row (replaced, never mutated), in portfolio order
+        self.market_value = 0  # cents
+        self.cost_micros = 0
+
+
+class ValuationEngine:
+    """Per-user market value, cost basis and unrealized P&L"""
+
+    def __init__(self, stocks, max_users=10000):
+        # stocks: {symbol: {'name', 'price', ...}} with dollar prices; prices are
+        # read at build time and afterwards only changed through update_price(s)()
+        self._names = {symbol: data['name'] for symbol, data in stocks.items()}
+        self._prices = {symbol: to_cents(data['price']) for symbol, data in stocks.items()}  # cents
+        self.max_users = max_users
+        self._books = OrderedDict()  # username -> _Book
+        self._holders = {}  # symbol -> set of usernames with a position
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _position_row(symbol, name, shares, avg_micros, price_cents):
+        value_cents = price_cents * shares
+        cost_micros = avg_micros * shares
+        return {
+            'symbol': symbol,
+            'name': name,
+            'shares': shares,
+            'avg_micros': avg_micros,
+            'price_cents': price_cents,
+            'value_cents': value_cents,
+            'cost_micros': cost_micros,
+            'gain_cents': value_cents - micros_to_cents(cost_micros),
+            'gain_loss_percent': (price_cents * CENT_MICROS / avg_micros - 1) * 100 if avg_micros > 0 else 0
+        }
+
+    def _set_position(self, username, book, symbol):
+        """Recompute one position row and adjust the book totals by the difference"""
+        old = book.positions.get(symbol)
+        if old is not None:
+            book.market_value -= old['value_cents']
+            book.cost_micros -= old['cost_micros']
+
+        holding = book.portfolio.get(symbol)
+        if holding is None or symbol not in self._prices:
+            book.positions.pop(symbol, None)
+            self._holders.get(symbol, set()).discard(username)
+            return
+
+        row = self._position_row(symbol, self._names[symbol], holding['shares'],
+                                 holding['avg_micros'], self._prices[symbol])
+        book.positions[symbol] = row
+        book.market_value += row['value_cents']
+        book.cost_micros += row['cost_micros']
+        self._holders.setdefault(symbol, set()).add(username)
+
+    def _build(self, username, portfolio):
+        self._drop(username)
+        book = _Book(copy.deepcopy(portfolio))
+        for symbol in book.portfolio:
+            self._set_position(username, book, symbol)
+        self._books[username] = book
+        while len(self._books) > self.max_users:
+            self._drop(next(iter(self._books)))
+        return book
+
+    def _drop(self, username):
+        book = self._books.pop(username, None)
+        if book is not None:
+            for symbol in book.positions:
+                self._holders.get(symbol, set()).discard(username)
+
+    def summary(self, username, portfolio):
+        """Return (positions, market_value, cost_basis), both in cents, for the user's stored portfolio"""
+        with self._lock:
+            book = self._books.get(username)
+            if book is None or book.portfolio != portfolio:
+                book = self._build(username, portfolio)
+            else:
+                self._books.move_to_end(username)
+            return list(book.positions.values()), book.market_value, micros_to_cents(book.cost_micros)
+
+    def apply_fill(self, username, trade_type, symbol, quantity, price_cents):
+        """Update the user's book for an executed trade, touching only that symbol"""
+        with self._lock:
+            book = self._books.get(username)
+            if book is None:
+                return  # built lazily on the next summary()
+            try:
+                update_position(book.portfolio, trade_type, symbol, quantity, price_cents)
+            except KeyError:
+                self._drop(username)  # book was stale; rebuild on next view
+                return
+            self._set_position(username, book, symbol)
+
+    def update_price(self, symbol, price):
+        """Revalue every loaded book that holds symbol (price in dollars)"""
+        with self._lock:
+            if symbol in self._names:
+                self._reprice(symbol, to_cents(price))
+
+    def update_prices(self, prices):
+        """Apply a {symbol: dollar price} batch, revaluing only held symbols that moved"""
+        cents = {symbol: to_cents(price) for symbol, price in prices.items() if symbol in self._names}
+        with self._lock:
+            moved = [symbol for symbol in self._holders
+                     if symbol in cents and cents[symbol] != self._prices.get(symbol)]
+            self._prices.update(cents)
+            for symbol in moved:
+                self._reprice(symbol, cents[symbol])
+
+    def _reprice(self, symbol, price_cents):
+        self._prices[symbol] = price_cents
+        for username in list(self._holders.get(symbol, ())):
+            self._set_position(username, self._books[username], symbol)